@@ -0,0 +1,306 @@
+from array import array
+from heapq import heappush, heappushpop
+from math import sqrt
+from conversions import hex2rgb, hex2rgb_many, rgb2lab_many, rgb2oklab_many
+from kmeans import _METRICS, nearest_centroids, sq_euclid_dist
+from pixels import as_rgb_array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Largest number of colors in a KD-tree leaf, which is scanned directly
+_LEAF = 8
+
+# Largest color list that batched queries compare against all at once with
+# NumPy. Past about a thousand colors, walking the tree once per distinct
+# color is faster, and its cost barely grows with the list.
+_BLOCKED_MAX = 1024
+
+# Color spaces that colors can be indexed in, with their batched conversions
+_SPACES = {
+    'rgb': None,
+    'lab': rgb2lab_many,
+    'oklab': rgb2oklab_many,
+}
+
+
+class ColorIndex(object):
+    """An index for finding the nearest colors in a color list.
+
+    The colors are parsed once into a packed array of coordinates, which is
+    arranged as a KD-tree: each node splits its colors at the median of the
+    axis along which they are most spread out. A query descends towards its
+    own side of each split first and skips any subtree that lies further
+    away than the nearest colors found so far, so only a handful of colors
+    are compared against instead of the whole list.
+
+    Subtrees are skipped using a lower bound on the distance to anything
+    across a split. For redmean and CIE94, whose distances are not plain
+    Euclidean ones, the bound is the smallest weight the metric can give
+    that axis. CIEDE2000 has no such bound, so its queries compare against
+    every color, all at once when NumPy is installed.
+
+    http://en.wikipedia.org/wiki/K-d_tree
+    """
+
+    def __init__(self, colors, metric='sqeuclidean', space=None):
+        """Initializes ColorIndex by parsing colors and building the tree.
+
+        Args:
+            colors: A dict of color names to Hex strings or RGB tuples (such
+                as color_lists.css3), or a list of Hex strings or RGB tuples,
+                in which case the names are their indices.
+            metric: Optional string for distance metric selection, either
+                'sqeuclidean' (the default), 'redmean', 'cie76', 'cie94' or
+                'ciede2000'.
+            space: Optional string for the color space that distances are
+                measured in, either 'rgb', 'lab' or 'oklab'. Defaults to
+                the metric's color space, which is 'lab' for the CIE metrics
+                and 'rgb' otherwise.
+
+        Raises:
+            ValueError: If an empty color list is passed, if an invalid
+                metric or color space is selected, or if the metric is
+                measured in another color space.
+        """
+        if len(colors) == 0:
+            raise ValueError('An empty color list has been passed')
+        elif metric not in _METRICS:
+            raise ValueError('Invalid metric selected')
+        elif space is not None and space not in _SPACES:
+            raise ValueError('Invalid color space selected')
+
+        # The metrics are shared with KMeans, where None is Euclidean
+        dist, self._dist_array, metric_space = _METRICS[metric]
+        self._dist = dist or sq_euclid_dist
+        if space is None:
+            space = metric_space or 'rgb'
+        elif metric_space not in (None, space):
+            raise ValueError('The {} metric is measured in the {} color space'
+                             .format(metric, metric_space))
+
+        if isinstance(colors, dict):
+            self.names = list(colors)
+            values = list(colors.values())
+        else:
+            self.names = list(range(0, len(colors)))
+            values = list(colors)
+
+        self.metric = metric
+        self.space = space
+        if all(isinstance(value, str) for value in values):
+            self.colors = hex2rgb_many(values)
+        else:
+            self.colors = [tuple(value[:3]) for value in values]
+
+        pts = self._to_space(self.colors)
+        self._bound = self._bound_weights(pts)
+        self._build(pts)
+
+        # Coordinates in list order, for batched queries
+        self._pts = None if np is None else np.array(pts, dtype=np.float64)
+
+    def __len__(self):
+        """Returns the number of colors in the index."""
+
+        return len(self.names)
+
+    def nearest(self, color):
+        """Returns the name of the color nearest to a given color.
+
+        Args:
+            color: An RGB tuple or Hex string.
+
+        Returns:
+            The name of the nearest color. Ties go to the color that comes
+            first in the color list.
+        """
+        return self.k_nearest(color, 1)[0][0]
+
+    def k_nearest(self, color, k):
+        """Returns the k colors nearest to a given color.
+
+        Args:
+            color: An RGB tuple or Hex string.
+            k: The number of colors to return.
+
+        Returns:
+            A list of up to k tuples of a color name and its distance from
+            the given color, nearest first.
+
+        Raises:
+            ValueError: If k is less than one.
+        """
+        if k < 1:
+            raise ValueError('The number of colors must be at least one')
+
+        if isinstance(color, str):
+            color = hex2rgb(color)
+        q = self._to_space([tuple(color[:3])])[0]
+
+        return [(self.names[i], sqrt(max(d, 0)))
+                for d, i in self._search(q, k)]
+
+    def nearest_many(self, im):
+        """Returns the names of the colors nearest to many colors at once.
+
+        The colors are converted into the index's color space together. With
+        NumPy and a color list of up to 1024 colors (or any length for
+        CIEDE2000), the distances from every color to the whole list are
+        then computed in blocks, which is faster than walking the tree for
+        short lists. Otherwise, each distinct color is looked up in the tree
+        once, which takes about as long for a list of 50000 colors as for
+        one of 1000.
+
+        Args:
+            im: Colors as a list of RGB tuples, a PixelBuffer or an (N, 3)
+                NumPy array.
+
+        Returns:
+            A list of the names of the nearest colors, in the same order.
+        """
+        if np is not None:
+            if self._bound is not None and len(self) > _BLOCKED_MAX:
+                im = as_rgb_array(im).tolist()
+            else:
+                pts = as_rgb_array(im, np.float64)
+                if _SPACES[self.space] is not None:
+                    pts = _SPACES[self.space](pts, None)
+                labels, _ = nearest_centroids(pts, self._pts,
+                                              dist=self._dist_array)
+                return [self.names[i] for i in labels.tolist()]
+
+        distinct = list(dict.fromkeys(tuple(px[:3]) for px in im))
+        found = {px: self.names[self._search(q, 1)[0][1]]
+                 for px, q in zip(distinct, self._to_space(distinct))}
+        return [found[tuple(px[:3])] for px in im]
+
+    def _to_space(self, rgb):
+        """Converts a list of RGB tuples into the index's color space.
+
+        Returns:
+            A list of coordinate tuples.
+        """
+        to_space = _SPACES[self.space]
+        if to_space is None:
+            return [tuple(float(x) for x in px) for px in rgb]
+
+        pts = to_space(rgb, None)
+        if np is not None:
+            pts = pts.tolist()
+        return [tuple(pt) for pt in pts]
+
+    def _bound_weights(self, pts):
+        """Finds the per-axis weights that bound the metric from below.
+
+        A color differing from a query by x along one axis is at least
+        weight * x ** 2 away under the metric.
+
+        Args:
+            pts: The indexed colors as coordinate tuples.
+
+        Returns:
+            A tuple of three weights, or None if the metric has no bound.
+        """
+        if self.metric == 'redmean':
+            return 2, 4, 2
+        elif self.metric == 'cie94':
+            # a* and b* differences are divided by the indexed color's
+            # chroma weight, which is largest for the most saturated color
+            sc = 1 + 0.045 * max(sqrt(pt[1] ** 2 + pt[2] ** 2) for pt in pts)
+            w = (1 - 1e-9) / sc ** 2    # Leaves room for rounding error
+            return 1, w, w
+        elif self.metric == 'ciede2000':
+            return None
+        return 1, 1, 1
+
+    def _build(self, pts):
+        """Arranges the colors into a KD-tree.
+
+        The tree is stored implicitly: the colors are reordered so that the
+        splitting color of every range of positions sits at its middle, with
+        the colors on either side of the split to its left and right.
+
+        Args:
+            pts: The indexed colors as coordinate tuples.
+        """
+        n = len(pts)
+        order = list(range(0, n))
+        axes = array('b', [-1]) * n
+        ranges = [(0, n)]
+        while ranges:
+            lo, hi = ranges.pop()
+            if hi - lo <= _LEAF:
+                continue
+
+            idx = order[lo:hi]
+            spreads = [max(pts[i][x] for i in idx) -
+                       min(pts[i][x] for i in idx) for x in range(0, 3)]
+            axis = spreads.index(max(spreads))
+            idx.sort(key=lambda i: pts[i][axis])
+            order[lo:hi] = idx
+
+            mid = (lo + hi) // 2
+            axes[mid] = axis
+            ranges.append((lo, mid))
+            ranges.append((mid + 1, hi))
+
+        self._order = array('l', order)
+        self._axes = axes
+        self._coords = array('d', [x for i in order for x in pts[i]])
+
+    def _search(self, q, k):
+        """Finds the k indexed colors nearest to a query.
+
+        Args:
+            q: The query as a coordinate tuple in the index's color space.
+            k: The number of colors to find.
+
+        Returns:
+            A list of up to k tuples of a squared distance and a color's
+            index in the color list, nearest first.
+        """
+        coords, axes, order = self._coords, self._axes, self._order
+        dist, w = self._dist, self._bound
+        n = len(order)
+
+        # Without a bound every color is compared, which NumPy does at once
+        if w is None and self._pts is not None:
+            d = self._dist_array(self._pts, q)
+            top = np.argsort(d, kind='stable')[:k].tolist()
+            return [(float(d[i]), i) for i in top]
+
+        # Max-heap of the nearest colors found so far. Ties go to the color
+        # with the lower index, as they would in a scan of the list.
+        best = []
+        ranges = [(0, n, 0.0)]
+        while ranges:
+            lo, hi, bound = ranges.pop()
+            if len(best) == k and bound > -best[0][0]:
+                continue    # Nothing in this range can be nearer
+
+            if w is None or hi - lo <= _LEAF:
+                positions = range(lo, hi)
+            else:
+                mid = (lo + hi) // 2
+                axis = axes[mid]
+                diff = q[axis] - coords[3 * mid + axis]
+                far_bound = max(bound, w[axis] * (diff * diff))
+                if diff < 0:
+                    ranges.append((mid + 1, hi, far_bound))
+                    ranges.append((lo, mid, bound))
+                else:
+                    ranges.append((lo, mid, far_bound))
+                    ranges.append((mid + 1, hi, bound))
+                positions = (mid,)
+
+            for p in positions:
+                item = (-dist(coords[3 * p:3 * p + 3], q), -order[p])
+                if len(best) < k:
+                    heappush(best, item)
+                elif item > best[0]:
+                    heappushpop(best, item)
+
+        return sorted((-d, -i) for d, i in best)
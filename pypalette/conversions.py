@@ -1,4 +1,44 @@
-from math import acos, cos, pi, radians, sqrt
+from array import array
+from itertools import chain
+from math import acos, atan2, cos, degrees, hypot, pi, radians, sin, sqrt
+from pixels import PixelBuffer
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Two digit lowercase hex string for every byte value
+_HEX_BYTES = ['{:02x}'.format(i) for i in range(256)]
+
+# Linear light value of every 8-bit sRGB value
+_SRGB_LINEAR = [v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+                for v in (i / 255 for i in range(0, 256))]
+_SRGB_LINEAR_ARRAY = None if np is None else np.array(_SRGB_LINEAR)
+
+# Linear sRGB to CIE XYZ matrix and its inverse, for the D65 white point
+_RGB2XYZ = ((0.4124564, 0.3575761, 0.1804375),
+            (0.2126729, 0.7151522, 0.0721750),
+            (0.0193339, 0.1191920, 0.9503041))
+_XYZ2RGB = ((3.2404542, -1.5371385, -0.4985314),
+            (-0.9692660, 1.8760108, 0.0415560),
+            (0.0556434, -0.2040259, 1.0572252))
+_WHITE = (95.047, 100.0, 108.883)    # D65 white point XYZ values
+_LAB_D = 6 / 29    # Threshold of the linear segment of the Lab function
+
+# Matrices between linear sRGB, OKLab's cone responses (LMS) and OKLab
+_RGB2LMS = ((0.4122214708, 0.5363325363, 0.0514459929),
+            (0.2119034982, 0.6806995451, 0.1073969566),
+            (0.0883024619, 0.2817188376, 0.6299787005))
+_LMS2OKLAB = ((0.2104542553, 0.7936177850, -0.0040720468),
+              (1.9779984951, -2.4285922050, 0.4505937099),
+              (0.0259040371, 0.7827717662, -0.8086757660))
+_OKLAB2LMS = ((1.0, 0.3963377774, 0.2158037573),
+              (1.0, -0.1055613458, -0.0638541728),
+              (1.0, -0.0894841775, -1.2914855480))
+_LMS2RGB = ((4.0767416621, -3.3077115913, 0.2309699292),
+            (-1.2684380046, 2.6097574011, -0.3413193965),
+            (-0.0041960863, -0.7034186147, 1.7076147010))
 
 
 def cmyk2rgb(cmyk, prec=0):
@@ -153,6 +193,97 @@ def hsv2rgb(hsv, prec=0):
     return round(255 * r, prec), round(255 * g, prec), round(255 * b, prec)
 
 
+def lab2rgb(lab, prec=0):
+    """Converts a CIE L*a*b* triplet into an RGB triplet.
+
+    L* values are expected to be on the interval [0, 100].
+    RGB values are given on the interval [0, 255].
+
+    Colors outside of the sRGB gamut are clipped to it.
+
+    Args:
+        lab: A Lab tuple.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0. None leaves the values unrounded.
+
+    Returns:
+        An RGB tuple.
+    """
+    return _round_each(_xyz2rgb(_lab2xyz(lab)), prec)
+
+
+def lch2rgb(lch, prec=0):
+    """Converts a CIE LCh triplet into an RGB triplet.
+
+    LCh is the cylindrical form of L*a*b*, with C being the chroma and h the
+    hue angle in degrees. RGB values are given on the interval [0, 255].
+
+    Colors outside of the sRGB gamut are clipped to it.
+
+    Args:
+        lch: An LCh tuple.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0. None leaves the values unrounded.
+
+    Returns:
+        An RGB tuple.
+    """
+    h = radians(lch[2])
+    lab = lch[0], lch[1] * cos(h), lch[1] * sin(h)
+
+    return _round_each(_xyz2rgb(_lab2xyz(lab)), prec)
+
+
+def linear2rgb(lin, prec=0):
+    """Converts a linear RGB triplet into an sRGB triplet.
+
+    Linear RGB values are expected to be on the interval [0, 1].
+    RGB values are given on the interval [0, 255].
+
+    http://en.wikipedia.org/wiki/SRGB
+
+    Args:
+        lin: A linear RGB tuple.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0. None leaves the values unrounded.
+
+    Returns:
+        An RGB tuple.
+
+    Raises:
+        ValueError: If one or more linear RGB values are outside [0, 1].
+    """
+    for value in lin:
+        if not 0 <= value <= 1:
+            raise ValueError('One or more linear RGB values are outside '
+                             '[0, 1]')
+
+    return _round_each(map(_gamma, lin), prec)
+
+
+def oklab2rgb(oklab, prec=0):
+    """Converts an OKLab triplet into an RGB triplet.
+
+    L values are expected to be on the interval [0, 1].
+    RGB values are given on the interval [0, 255].
+
+    Colors outside of the sRGB gamut are clipped to it.
+
+    http://bottosson.github.io/posts/oklab/
+
+    Args:
+        oklab: An OKLab tuple.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0. None leaves the values unrounded.
+
+    Returns:
+        An RGB tuple.
+    """
+    lms = [v ** 3 for v in _mat_mul(_OKLAB2LMS, oklab)]
+
+    return _round_each(map(_gamma, _mat_mul(_LMS2RGB, lms)), prec)
+
+
 def rgb2cmyk(rgb, prec=3):
     """Converts an RGB triplet into a CMYK quadruplet.
 
@@ -327,3 +458,1029 @@ def rgb2hsv(rgb, h_prec=0, sv_prec=3):
     v = c_max
 
     return round(h, h_prec), round(s, sv_prec), round(v, sv_prec)
+
+
+def rgb2lab(rgb, prec=3):
+    """Converts an RGB triplet into a CIE L*a*b* triplet.
+
+    RGB values are expected to be on the interval [0, 255].
+    L* values are given on the interval [0, 100]. Unlike RGB, equal distances
+    in Lab are roughly equal differences in perceived color.
+
+    The D65 white point is used.
+
+    http://en.wikipedia.org/wiki/Lab_color_space
+
+    Args:
+        rgb: An RGB tuple.
+        prec: An optional int for Lab value decimal precision,
+            defaults to 3. None leaves the values unrounded.
+
+    Returns:
+        A Lab tuple.
+
+    Raises:
+        ValueError: If the given RGB values are outside [0, 255].
+    """
+    return _round_each(_xyz2lab(_rgb2xyz(_check_rgb(rgb))), prec)
+
+
+def rgb2lch(rgb, prec=3):
+    """Converts an RGB triplet into a CIE LCh triplet.
+
+    RGB values are expected to be on the interval [0, 255].
+    L values are given on the interval [0, 100] and h values on the interval
+    [0, 360).
+
+    Args:
+        rgb: An RGB tuple.
+        prec: An optional int for LCh value decimal precision,
+            defaults to 3. None leaves the values unrounded.
+
+    Returns:
+        An LCh tuple.
+
+    Raises:
+        ValueError: If the given RGB values are outside [0, 255].
+    """
+    l, a, b = _xyz2lab(_rgb2xyz(_check_rgb(rgb)))
+
+    return _round_each((l, hypot(a, b), degrees(atan2(b, a)) % 360), prec)
+
+
+def rgb2linear(rgb, prec=3):
+    """Converts an sRGB triplet into a linear RGB triplet.
+
+    RGB values are expected to be on the interval [0, 255].
+    Linear RGB values are given on the interval [0, 1], proportional to
+    light intensity. Integer RGB values are linearized by table lookup.
+
+    http://en.wikipedia.org/wiki/SRGB
+
+    Args:
+        rgb: An RGB tuple.
+        prec: An optional int for linear RGB value decimal precision,
+            defaults to 3. None leaves the values unrounded.
+
+    Returns:
+        A linear RGB tuple.
+
+    Raises:
+        ValueError: If the given RGB values are outside [0, 255].
+    """
+    return _round_each(map(_linearize, _check_rgb(rgb[:3])), prec)
+
+
+def rgb2oklab(rgb, prec=3):
+    """Converts an RGB triplet into an OKLab triplet.
+
+    RGB values are expected to be on the interval [0, 255].
+    L values are given on the interval [0, 1]. OKLab is more perceptually
+    uniform than CIE Lab, particularly in hue.
+
+    http://bottosson.github.io/posts/oklab/
+
+    Args:
+        rgb: An RGB tuple.
+        prec: An optional int for OKLab value decimal precision,
+            defaults to 3. None leaves the values unrounded.
+
+    Returns:
+        An OKLab tuple.
+
+    Raises:
+        ValueError: If the given RGB values are outside [0, 255].
+    """
+    lin = [_linearize(v) for v in _check_rgb(rgb)]
+    lms = [v ** (1 / 3) for v in _mat_mul(_RGB2LMS, lin)]
+
+    return _round_each(_mat_mul(_LMS2OKLAB, lms), prec)
+
+
+def rgb2xyz(rgb, prec=3):
+    """Converts an RGB triplet into a CIE XYZ triplet.
+
+    RGB values are expected to be on the interval [0, 255].
+    XYZ values are given relative to a Y of 100 for the D65 white point.
+
+    http://en.wikipedia.org/wiki/CIE_1931_color_space
+
+    Args:
+        rgb: An RGB tuple.
+        prec: An optional int for XYZ value decimal precision,
+            defaults to 3. None leaves the values unrounded.
+
+    Returns:
+        An XYZ tuple.
+
+    Raises:
+        ValueError: If the given RGB values are outside [0, 255].
+    """
+    return _round_each(_rgb2xyz(_check_rgb(rgb)), prec)
+
+
+def xyz2rgb(xyz, prec=0):
+    """Converts a CIE XYZ triplet into an RGB triplet.
+
+    XYZ values are expected relative to a Y of 100 for the D65 white point.
+    RGB values are given on the interval [0, 255].
+
+    Colors outside of the sRGB gamut are clipped to it.
+
+    Args:
+        xyz: An XYZ tuple.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0. None leaves the values unrounded.
+
+    Returns:
+        An RGB tuple.
+    """
+    return _round_each(_xyz2rgb(xyz), prec)
+
+
+def cmyk2rgb_many(im, prec=0):
+    """Converts many CMYK quadruplets into RGB triplets at once.
+
+    This is the batched version of cmyk2rgb, whose results it matches
+    exactly. Values are range checked once for the whole batch and rounded
+    in bulk.
+
+    Args:
+        im: CMYK values as a 4-channel PixelBuffer, an (N, 4) NumPy array
+            or a list of CMYK tuples.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0.
+
+    Returns:
+        RGB values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+
+    Raises:
+        ValueError: If one or more CMYK values are outside the interval [0, 1].
+    """
+    if np is None:
+        return _convert_each(cmyk2rgb, im, 3, prec)
+
+    cmyk = _as_float_array(im, 4)
+    if len(cmyk) and (cmyk.min() < 0 or cmyk.max() > 1):
+        raise ValueError('One or more CMYK values are outside [0, 1]')
+
+    c, m, y, k = cmyk.T
+    r = 255 * (1 - c) * (1 - k)
+    g = 255 * (1 - m) * (1 - k)
+    b = 255 * (1 - y) * (1 - k)
+
+    return _wrap_result(im, _round_many(np.stack([r, g, b], axis=1), prec))
+
+
+def hex2rgb_many(hxs, alpha=False, out='tuples'):
+    """Converts many RGB Hexadecimals into RGB triplets at once.
+
+    Hex values can be given in the forms '#xxx', '#xxxxxx' or '#xxxxxxxx'
+    (with alpha), with or without the '#'. All of the hex digits are decoded
+    together with a single bytes.fromhex call.
+
+    Args:
+        hxs: A list of RGB Hex strings.
+        alpha: Optional bool for keeping the alpha channel, defaults to
+            False. Hex values without alpha are given an alpha of 255.
+        out: Optional string for the output format, either 'tuples' (the
+            default) for a list of RGB tuples, 'packed' for a list of
+            24-bit ints (32-bit with alpha), or 'buffer' for a PixelBuffer.
+
+    Returns:
+        The colors in the selected output format, with RGB values on the
+        interval [0, 255].
+
+    Raises:
+        ValueError: If a hex value is malformed or if an invalid output
+            format is selected.
+    """
+    if out not in ('tuples', 'packed', 'buffer'):
+        raise ValueError('Invalid output format selected')
+
+    # Fast path for the common '#xxxxxx' form
+    if not alpha and set(map(len, hxs)) <= {7}:
+        joined = ''.join(hxs)
+        if joined.count('#') != len(hxs) or joined[::7] != '#' * len(hxs):
+            raise ValueError('Malformed hex value')
+        data = bytes.fromhex(joined.replace('#', ''))
+        channels = 3
+    else:
+        data = bytes.fromhex(''.join(map(_expand_hex, hxs)))
+        channels = 4
+        if not alpha:
+            data = bytearray(data)
+            del data[3::4]
+            channels = 3
+
+    if out == 'buffer':
+        return PixelBuffer(bytearray(data), channels=channels)
+    elif out == 'packed':
+        return [int.from_bytes(data[i:i + channels], 'big')
+                for i in range(0, len(data), channels)]
+    return list(zip(*[data[x::channels] for x in range(0, channels)]))
+
+
+def hsl2rgb_many(im, prec=0):
+    """Converts many HSL triplets into RGB triplets at once.
+
+    This is the batched version of hsl2rgb, whose results it matches
+    exactly. Values are range checked once for the whole batch and rounded
+    in bulk.
+
+    Args:
+        im: HSL values as a PixelBuffer, an (N, 3) NumPy array or a list of
+            HSL tuples.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0.
+
+    Returns:
+        RGB values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+
+    Raises:
+        ValueError: If one or more H values are outside [0, 360),
+            or if one or more S and/or L values are outside [0, 1].
+    """
+    if np is None:
+        return _convert_each(hsl2rgb, im, 3, prec)
+
+    hsl = _as_float_array(im, 3)
+    h, s, l = hsl[:, 0] / 60, hsl[:, 1], hsl[:, 2]
+    _check_hue_range(h, hsl[:, 1:], 'S and/or L')
+
+    c = (1 - np.abs(2 * l - 1)) * s
+    m = l - c / 2
+
+    return _wrap_result(im, _round_many(255 * (_hue_sectors(h, c) +
+                                               m[:, np.newaxis]), prec))
+
+
+def hsv2rgb_many(im, prec=0):
+    """Converts many HSV triplets into RGB triplets at once.
+
+    This is the batched version of hsv2rgb, whose results it matches
+    exactly. Values are range checked once for the whole batch and rounded
+    in bulk.
+
+    Args:
+        im: HSV values as a PixelBuffer, an (N, 3) NumPy array or a list of
+            HSV tuples.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0.
+
+    Returns:
+        RGB values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+
+    Raises:
+        ValueError: If one or more H values are outside [0, 360),
+            or if one or more S and/or V values are outside [0, 1].
+    """
+    if np is None:
+        return _convert_each(hsv2rgb, im, 3, prec)
+
+    hsv = _as_float_array(im, 3)
+    h, s, v = hsv[:, 0] / 60, hsv[:, 1], hsv[:, 2]
+    _check_hue_range(h, hsv[:, 1:], 'S and/or V')
+
+    c = v * s
+    m = v - c
+
+    return _wrap_result(im, _round_many(255 * (_hue_sectors(h, c) +
+                                               m[:, np.newaxis]), prec))
+
+
+def lab2rgb_many(im, prec=0):
+    """Converts many CIE L*a*b* triplets into RGB triplets at once.
+
+    This is the batched version of lab2rgb, whose results it matches up to
+    floating point error.
+
+    Args:
+        im: Lab values as a PixelBuffer, an (N, 3) NumPy array or a list of
+            Lab tuples.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0. None leaves the values unrounded.
+
+    Returns:
+        RGB values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+    """
+    if np is None:
+        return _convert_each(lab2rgb, im, 3, prec)
+
+    xyz = _lab2xyz_many(_as_float_array(im, 3))
+
+    return _wrap_result(im, _round_many(_xyz2rgb_many(xyz), prec))
+
+
+def lch2rgb_many(im, prec=0):
+    """Converts many CIE LCh triplets into RGB triplets at once.
+
+    This is the batched version of lch2rgb, whose results it matches up to
+    floating point error.
+
+    Args:
+        im: LCh values as a PixelBuffer, an (N, 3) NumPy array or a list of
+            LCh tuples.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0. None leaves the values unrounded.
+
+    Returns:
+        RGB values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+    """
+    if np is None:
+        return _convert_each(lch2rgb, im, 3, prec)
+
+    lch = _as_float_array(im, 3)
+    h = np.radians(lch[:, 2])
+    lab = np.stack([lch[:, 0], lch[:, 1] * np.cos(h), lch[:, 1] * np.sin(h)],
+                   axis=1)
+
+    return _wrap_result(im, _round_many(_xyz2rgb_many(_lab2xyz_many(lab)),
+                                        prec))
+
+
+def linear2rgb_many(im, prec=0):
+    """Converts many linear RGB triplets into sRGB triplets at once.
+
+    This is the batched version of linear2rgb, whose results it matches up to
+    floating point error. Values are range checked once for the whole batch.
+
+    Args:
+        im: Linear RGB values as a PixelBuffer, an (N, 3) NumPy array or a
+            list of linear RGB tuples.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0. None leaves the values unrounded.
+
+    Returns:
+        RGB values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+
+    Raises:
+        ValueError: If one or more linear RGB values are outside [0, 1].
+    """
+    if np is None:
+        return _convert_each(linear2rgb, im, 3, prec)
+
+    lin = _as_float_array(im, 3)
+    if len(lin) and (lin.min() < 0 or lin.max() > 1):
+        raise ValueError('One or more linear RGB values are outside [0, 1]')
+
+    return _wrap_result(im, _round_many(_gamma_many(lin), prec))
+
+
+def oklab2rgb_many(im, prec=0):
+    """Converts many OKLab triplets into RGB triplets at once.
+
+    This is the batched version of oklab2rgb, whose results it matches up to
+    floating point error.
+
+    Args:
+        im: OKLab values as a PixelBuffer, an (N, 3) NumPy array or a list
+            of OKLab tuples.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0. None leaves the values unrounded.
+
+    Returns:
+        RGB values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+    """
+    if np is None:
+        return _convert_each(oklab2rgb, im, 3, prec)
+
+    lms = _mat_mul_many(_OKLAB2LMS, _as_float_array(im, 3)) ** 3
+    rgb = _gamma_many(_mat_mul_many(_LMS2RGB, lms))
+
+    return _wrap_result(im, _round_many(rgb, prec))
+
+
+def rgb2cmyk_many(im, prec=3):
+    """Converts many RGB triplets into CMYK quadruplets at once.
+
+    This is the batched version of rgb2cmyk, whose results it matches
+    exactly. Values are range checked once for the whole batch and rounded
+    in bulk.
+
+    Args:
+        im: An image as a PixelBuffer, an (N, 3) NumPy array or a list of
+            RGB tuples.
+        prec: An optional int for CMYK value decimal precision,
+            defaults to 3.
+
+    Returns:
+        CMYK values as a 4-channel PixelBuffer of doubles if a PixelBuffer
+        was given, otherwise as an (N, 4) NumPy array.
+
+    Raises:
+        ValueError: If one or more RGB values are outside [0, 255].
+    """
+    if np is None:
+        return _convert_each(rgb2cmyk, im, 4, prec)
+
+    r, g, b = _rgb_unit_channels(im)
+
+    k = 1 - np.maximum(np.maximum(r, g), b)
+    black = k == 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cmy = [np.where(black, 0, (1 - x - k) / (1 - k)) for x in (r, g, b)]
+
+    return _wrap_result(im, _round_many(np.stack(cmy + [k], axis=1), prec))
+
+
+def rgb2hex_many(im):
+    """Converts many RGB triplets or packed colors into RGB Hexadecimals.
+
+    Colors are packed into one bytes object, which doubles as a bulk range
+    check, and formatted through a precomputed two digit hex string for
+    each byte value. Four channel colors are given alpha, as '#xxxxxxxx'.
+
+    Args:
+        im: A list of RGB (or RGBA) tuples, a PixelBuffer, an (N, 3) NumPy
+            array, RGB bytes, or a list or NumPy array of 24-bit packed
+            colors (r << 16 | g << 8 | b). Values must be integers, though
+            they may be given as floats.
+
+    Returns:
+        A list of RGB Hex strings in the form '#xxxxxx'.
+
+    Raises:
+        ValueError: If one or more RGB values are outside [0, 255] or are
+            not integers.
+    """
+    if np is not None and isinstance(im, np.ndarray):
+        im = im.tolist()
+
+    if isinstance(im, PixelBuffer):
+        data, channels = im.data, im.channels
+        if data.format != 'B':
+            data = bytes(_byte_values(data))
+    elif isinstance(im, (bytes, bytearray, memoryview)):
+        data, channels = im, 3
+    elif len(im) and isinstance(im[0], int):
+        if min(im) < 0 or max(im) > 0xffffff:
+            raise ValueError('One or more RGB values are outside [0, 255]')
+        return ['#%06x' % px for px in im]
+    else:
+        channels = len(im[0]) if len(im) else 3
+        try:
+            data = bytes(chain.from_iterable(im))
+        except (TypeError, ValueError):
+            data = bytes(_byte_values(chain.from_iterable(im)))
+
+    hx = _HEX_BYTES
+    if channels == 3:
+        return ['#' + hx[r] + hx[g] + hx[b]
+                for r, g, b in zip(data[0::3], data[1::3], data[2::3])]
+    return ['#' + ''.join(hx[v] for v in data[i:i + channels])
+            for i in range(0, len(data), channels)]
+
+
+def rgb2hsl_many(im, h_prec=0, sl_prec=3):
+    """Converts many RGB triplets into HSL triplets at once.
+
+    This is the batched version of rgb2hsl, whose results it matches
+    exactly. Values are range checked once for the whole batch and rounded
+    in bulk.
+
+    Args:
+        im: An image as a PixelBuffer, an (N, 3) NumPy array or a list of
+            RGB tuples.
+        h_prec: An optional int for H value decimal precision,
+            defaults to 0.
+        sl_prec: An optional int for S and L value decimal precision,
+            defaults to 3.
+
+    Returns:
+        HSL values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+
+    Raises:
+        ValueError: If one or more RGB values are outside [0, 255].
+    """
+    if np is None:
+        return _convert_each(rgb2hsl, im, 3, h_prec, sl_prec)
+
+    r, g, b = _rgb_unit_channels(im)
+    h, c_max, c_min, delta = _hue_many(r, g, b)
+
+    l = (c_max + c_min) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(delta == 0, 0, delta / (1 - np.abs(2 * l - 1)))
+
+    return _wrap_result(im, np.stack([_round_many(h, h_prec),
+                                      _round_many(s, sl_prec),
+                                      _round_many(l, sl_prec)], axis=1))
+
+
+def rgb2hsv_many(im, h_prec=0, sv_prec=3):
+    """Converts many RGB triplets into HSV triplets at once.
+
+    This is the batched version of rgb2hsv, whose results it matches
+    exactly. Values are range checked once for the whole batch and rounded
+    in bulk.
+
+    Args:
+        im: An image as a PixelBuffer, an (N, 3) NumPy array or a list of
+            RGB tuples.
+        h_prec: An optional int for H value decimal precision,
+            defaults to 0.
+        sv_prec: An optional int for S and V value decimal precision,
+            defaults to 3.
+
+    Returns:
+        HSV values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+
+    Raises:
+        ValueError: If one or more RGB values are outside [0, 255].
+    """
+    if np is None:
+        return _convert_each(rgb2hsv, im, 3, h_prec, sv_prec)
+
+    r, g, b = _rgb_unit_channels(im)
+    h, c_max, _, delta = _hue_many(r, g, b)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(c_max == 0, 0, delta / c_max)
+
+    return _wrap_result(im, np.stack([_round_many(h, h_prec),
+                                      _round_many(s, sv_prec),
+                                      _round_many(c_max, sv_prec)], axis=1))
+
+
+def rgb2lab_many(im, prec=3):
+    """Converts many RGB triplets into CIE L*a*b* triplets at once.
+
+    This is the batched version of rgb2lab, whose results it matches up to
+    floating point error. Integer RGB values are linearized by table lookup.
+
+    Args:
+        im: An image as a PixelBuffer, an (N, 3) NumPy array or a list of
+            RGB tuples.
+        prec: An optional int for Lab value decimal precision,
+            defaults to 3. None leaves the values unrounded.
+
+    Returns:
+        Lab values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+
+    Raises:
+        ValueError: If one or more RGB values are outside [0, 255].
+    """
+    if np is None:
+        return _convert_each(rgb2lab, im, 3, prec)
+
+    lab = _xyz2lab_many(_rgb2xyz_many(_rgb_array(im)))
+
+    return _wrap_result(im, _round_many(lab, prec))
+
+
+def rgb2lch_many(im, prec=3):
+    """Converts many RGB triplets into CIE LCh triplets at once.
+
+    This is the batched version of rgb2lch, whose results it matches up to
+    floating point error. Integer RGB values are linearized by table lookup.
+
+    Args:
+        im: An image as a PixelBuffer, an (N, 3) NumPy array or a list of
+            RGB tuples.
+        prec: An optional int for LCh value decimal precision,
+            defaults to 3. None leaves the values unrounded.
+
+    Returns:
+        LCh values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+
+    Raises:
+        ValueError: If one or more RGB values are outside [0, 255].
+    """
+    if np is None:
+        return _convert_each(rgb2lch, im, 3, prec)
+
+    lab = _xyz2lab_many(_rgb2xyz_many(_rgb_array(im)))
+    a, b = lab[:, 1], lab[:, 2]
+    lch = np.stack([lab[:, 0], np.hypot(a, b),
+                    np.degrees(np.arctan2(b, a)) % 360], axis=1)
+
+    return _wrap_result(im, _round_many(lch, prec))
+
+
+def rgb2linear_many(im, prec=3):
+    """Converts many sRGB triplets into linear RGB triplets at once.
+
+    This is the batched version of rgb2linear, whose results it matches up to
+    floating point error. Integer RGB values are linearized by table lookup.
+
+    Args:
+        im: An image as a PixelBuffer, an (N, 3) NumPy array or a list of
+            RGB tuples.
+        prec: An optional int for linear RGB value decimal precision,
+            defaults to 3. None leaves the values unrounded.
+
+    Returns:
+        Linear RGB values as a PixelBuffer of doubles if a PixelBuffer was
+        given, otherwise as an (N, 3) NumPy array.
+
+    Raises:
+        ValueError: If one or more RGB values are outside [0, 255].
+    """
+    if np is None:
+        return _convert_each(rgb2linear, im, 3, prec)
+
+    return _wrap_result(im, _round_many(_linearize_many(_rgb_array(im)),
+                                        prec))
+
+
+def rgb2oklab_many(im, prec=3):
+    """Converts many RGB triplets into OKLab triplets at once.
+
+    This is the batched version of rgb2oklab, whose results it matches up to
+    floating point error. Integer RGB values are linearized by table lookup.
+
+    Args:
+        im: An image as a PixelBuffer, an (N, 3) NumPy array or a list of
+            RGB tuples.
+        prec: An optional int for OKLab value decimal precision,
+            defaults to 3. None leaves the values unrounded.
+
+    Returns:
+        OKLab values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+
+    Raises:
+        ValueError: If one or more RGB values are outside [0, 255].
+    """
+    if np is None:
+        return _convert_each(rgb2oklab, im, 3, prec)
+
+    lin = _linearize_many(_rgb_array(im))
+    lms = _mat_mul_many(_RGB2LMS, lin) ** (1 / 3)
+
+    return _wrap_result(im, _round_many(_mat_mul_many(_LMS2OKLAB, lms),
+                                        prec))
+
+
+def rgb2xyz_many(im, prec=3):
+    """Converts many RGB triplets into CIE XYZ triplets at once.
+
+    This is the batched version of rgb2xyz, whose results it matches up to
+    floating point error. Integer RGB values are linearized by table lookup.
+
+    Args:
+        im: An image as a PixelBuffer, an (N, 3) NumPy array or a list of
+            RGB tuples.
+        prec: An optional int for XYZ value decimal precision,
+            defaults to 3. None leaves the values unrounded.
+
+    Returns:
+        XYZ values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+
+    Raises:
+        ValueError: If one or more RGB values are outside [0, 255].
+    """
+    if np is None:
+        return _convert_each(rgb2xyz, im, 3, prec)
+
+    return _wrap_result(im, _round_many(_rgb2xyz_many(_rgb_array(im)), prec))
+
+
+def xyz2rgb_many(im, prec=0):
+    """Converts many CIE XYZ triplets into RGB triplets at once.
+
+    This is the batched version of xyz2rgb, whose results it matches up to
+    floating point error.
+
+    Args:
+        im: XYZ values as a PixelBuffer, an (N, 3) NumPy array or a list of
+            XYZ tuples.
+        prec: An optional int for RGB value decimal precision,
+            defaults to 0. None leaves the values unrounded.
+
+    Returns:
+        RGB values as a PixelBuffer of doubles if a PixelBuffer was given,
+        otherwise as an (N, 3) NumPy array.
+    """
+    if np is None:
+        return _convert_each(xyz2rgb, im, 3, prec)
+
+    return _wrap_result(im, _round_many(_xyz2rgb_many(_as_float_array(im, 3)),
+                                        prec))
+
+
+def _as_float_array(im, channels):
+    """Returns color values as an (N, channels) float64 NumPy array.
+
+    Any extra channels, such as alpha, are dropped.
+    """
+    if isinstance(im, PixelBuffer):
+        arr = im.as_array()
+    else:
+        arr = np.asarray(im)
+    arr = arr.reshape(-1, arr.shape[-1] if arr.ndim > 1 else channels)
+    return arr[:, :channels].astype(np.float64, copy=False)
+
+
+def _rgb_array(im):
+    """Range checks RGB values and returns them as a float64 NumPy array.
+
+    Raises:
+        ValueError: If one or more RGB values are outside [0, 255].
+    """
+    rgb = _as_float_array(im, 3)
+    if len(rgb) and (rgb.min() < 0 or rgb.max() > 255):
+        raise ValueError('One or more RGB values are outside [0, 255]')
+    return rgb
+
+
+def _rgb_unit_channels(im):
+    """Range checks RGB values and scales them to the interval [0, 1].
+
+    Returns:
+        A tuple of the R, G and B channels as float64 NumPy arrays.
+
+    Raises:
+        ValueError: If one or more RGB values are outside [0, 255].
+    """
+    rgb = _rgb_array(im)
+    return rgb[:, 0] / 255, rgb[:, 1] / 255, rgb[:, 2] / 255
+
+
+def _linearize_many(rgb):
+    """Linearizes sRGB values, by table lookup if they are all integers."""
+
+    idx = rgb.astype(np.intp)
+    if (idx == rgb).all():
+        return _SRGB_LINEAR_ARRAY[idx]
+
+    v = rgb / 255
+    return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+
+def _gamma_many(lin):
+    """Gamma encodes linear values, clipped to [0, 1], onto [0, 255]."""
+
+    v = np.clip(lin, 0, 1)
+    return np.where(v <= 0.0031308, 255 * (12.92 * v),
+                    255 * (1.055 * v ** (1 / 2.4) - 0.055))
+
+
+def _mat_mul_many(m, x):
+    """Multiplies a 3x3 matrix by each row of an (N, 3) array.
+
+    The products are summed in the same order as in _mat_mul, so that the
+    results match it exactly.
+    """
+    return np.stack([row[0] * x[:, 0] + row[1] * x[:, 1] + row[2] * x[:, 2]
+                     for row in m], axis=1)
+
+
+def _rgb2xyz_many(rgb):
+    """Converts an array of RGB values into XYZ values."""
+
+    return 100 * _mat_mul_many(_RGB2XYZ, _linearize_many(rgb))
+
+
+def _xyz2rgb_many(xyz):
+    """Converts an array of XYZ values into clipped RGB values."""
+
+    return _gamma_many(_mat_mul_many(_XYZ2RGB, xyz / 100))
+
+
+def _xyz2lab_many(xyz):
+    """Converts an array of XYZ values into Lab values."""
+
+    t = xyz / np.array(_WHITE)
+    f = np.where(t > _LAB_D ** 3, np.abs(t) ** (1 / 3),
+                 t / (3 * _LAB_D ** 2) + 4 / 29)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]),
+                     200 * (f[:, 1] - f[:, 2])], axis=1)
+
+
+def _lab2xyz_many(lab):
+    """Converts an array of Lab values into XYZ values."""
+
+    fy = (lab[:, 0] + 16) / 116
+    f = np.stack([fy + lab[:, 1] / 500, fy, fy - lab[:, 2] / 200], axis=1)
+    t = np.where(f > _LAB_D, f ** 3, 3 * _LAB_D ** 2 * (f - 4 / 29))
+    return t * np.array(_WHITE)
+
+
+def _check_hue_range(h, rest, names):
+    """Range checks hue (as sixths of a turn) and the other two channels.
+
+    Raises:
+        ValueError: If one or more H values are outside [0, 360), or if the
+            other values are outside [0, 1].
+    """
+    if len(h) and (h.min() < 0 or h.max() >= 6):
+        raise ValueError('One or more H values are outside [0, 360)')
+    elif len(rest) and (rest.min() < 0 or rest.max() > 1):
+        raise ValueError('One or more {} values are outside [0, 1]'
+                         .format(names))
+
+
+def _hue_many(r, g, b):
+    """Calculates hue the same way as rgb2hsl and rgb2hsv.
+
+    Returns:
+        A tuple of the hue, maximum, minimum and delta arrays.
+    """
+    c_max = np.maximum(np.maximum(r, g), b)
+    c_min = np.minimum(np.minimum(r, g), b)
+    delta = c_max - c_min
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h = np.select([delta == 0, c_max == r, c_max == g],
+                      [0, 60 * (((g - b) / delta) % 6),
+                       60 * ((b - r) / delta + 2)],
+                      60 * ((r - g) / delta + 4))
+
+    return h, c_max, c_min, delta
+
+
+def _hue_sectors(h, c):
+    """Spreads chroma over RGB by hue sector, as in hsl2rgb and hsv2rgb.
+
+    Returns:
+        An (N, 3) array of RGB values before the lightness offset is added.
+    """
+    x = c * (1 - np.abs(h % 2 - 1))
+    zero = np.zeros_like(c)
+    sector = np.minimum(h.astype(np.intp), 5)
+    choices = [(c, x, zero), (x, c, zero), (zero, c, x),
+               (zero, x, c), (x, zero, c), (c, zero, x)]
+
+    rgb = np.empty((len(h), 3))
+    for i in range(0, 3):
+        rgb[:, i] = np.choose(sector, [choice[i] for choice in choices])
+    return rgb
+
+
+def _round_many(x, prec):
+    """Rounds an array the same way the built-in round rounds each value.
+
+    The scaled values are rounded half to even. Values lying so close to a
+    halfway point that scaling may have moved them across it are rounded
+    again with the built-in round.
+
+    Args:
+        x: A NumPy array of floats.
+        prec: An int for decimal precision, or None to leave the values
+            unrounded.
+
+    Returns:
+        The rounded NumPy array.
+    """
+    if prec is None:
+        return x
+    elif prec == 0:
+        return np.rint(x)
+    elif prec < 0:
+        return np.array([round(v, prec) for v in x.ravel().tolist()],
+                        dtype=np.float64).reshape(x.shape)
+
+    scale = 10.0 ** prec
+    y = x * scale
+    out = np.rint(y) / scale
+
+    near = np.abs(np.abs(y - np.floor(y)) - 0.5) <= 1e-9 * (1 + np.abs(y))
+    if near.any():
+        out[near] = [round(v, prec) for v in x[near].tolist()]
+    return out
+
+
+def _byte_values(values):
+    """Checks color values that are not all ints on [0, 255].
+
+    Returns:
+        The values as a list of ints.
+
+    Raises:
+        ValueError: If one or more values are not integers or are outside
+            [0, 255].
+    """
+    out = []
+    for value in values:
+        if value != int(value):
+            raise ValueError('One or more RGB values are not integers')
+        elif not 0 <= value <= 255:
+            raise ValueError('One or more RGB values are outside [0, 255]')
+        out.append(int(value))
+    return out
+
+
+def _check_rgb(rgb):
+    """Range checks an RGB triplet and returns it.
+
+    Raises:
+        ValueError: If the given RGB values are outside [0, 255].
+    """
+    for value in rgb:
+        if not 0 <= value <= 255:
+            raise ValueError('One or more RGB values are outside [0, 255]')
+    return rgb
+
+
+def _linearize(v):
+    """Linearizes an sRGB value on the interval [0, 255]."""
+
+    if v == int(v):
+        return _SRGB_LINEAR[int(v)]
+    v /= 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _gamma(v):
+    """Gamma encodes a linear value, clipped to [0, 1], onto [0, 255]."""
+
+    v = min(max(v, 0), 1)
+    if v <= 0.0031308:
+        return 255 * (12.92 * v)
+    return 255 * (1.055 * v ** (1 / 2.4) - 0.055)
+
+
+def _mat_mul(m, v):
+    """Multiplies a 3x3 matrix by a vector."""
+
+    return [row[0] * v[0] + row[1] * v[1] + row[2] * v[2] for row in m]
+
+
+def _rgb2xyz(rgb):
+    """Converts RGB values into XYZ values without rounding."""
+
+    lin = [_linearize(v) for v in rgb]
+    return [100 * v for v in _mat_mul(_RGB2XYZ, lin)]
+
+
+def _xyz2rgb(xyz):
+    """Converts XYZ values into clipped RGB values without rounding."""
+
+    lin = _mat_mul(_XYZ2RGB, [v / 100 for v in xyz])
+    return [_gamma(v) for v in lin]
+
+
+def _xyz2lab(xyz):
+    """Converts XYZ values into Lab values without rounding."""
+
+    fx, fy, fz = [t ** (1 / 3) if t > _LAB_D ** 3 else
+                  t / (3 * _LAB_D ** 2) + 4 / 29
+                  for t in (v / w for v, w in zip(xyz, _WHITE))]
+    return 116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)
+
+
+def _lab2xyz(lab):
+    """Converts Lab values into XYZ values without rounding."""
+
+    fy = (lab[0] + 16) / 116
+    fs = fy + lab[1] / 500, fy, fy - lab[2] / 200
+    return [w * (f ** 3 if f > _LAB_D else 3 * _LAB_D ** 2 * (f - 4 / 29))
+            for f, w in zip(fs, _WHITE)]
+
+
+def _round_each(values, prec):
+    """Rounds each value to prec, unless prec is None, as a tuple."""
+
+    if prec is None:
+        return tuple(values)
+    return tuple(round(v, prec) for v in values)
+
+
+def _expand_hex(hx):
+    """Normalizes a hex value to eight digits, without the '#'.
+
+    Raises:
+        ValueError: If the hex value does not have 3, 6 or 8 digits.
+    """
+    if hx[:1] == '#':
+        hx = hx[1:]
+    if len(hx) == 6:
+        return hx + 'ff'
+    elif len(hx) == 8:
+        return hx
+    elif len(hx) == 3:
+        return hx[0] * 2 + hx[1] * 2 + hx[2] * 2 + 'ff'
+    raise ValueError('Malformed hex value')
+
+
+def _wrap_result(im, arr):
+    """Returns a result array in the same kind of container as the input."""
+
+    if isinstance(im, PixelBuffer):
+        return PixelBuffer(np.ascontiguousarray(arr), im.width, im.height,
+                           arr.shape[1])
+    return arr
+
+
+def _convert_each(func, im, channels, *args):
+    """Converts colors one at a time, for when NumPy is not installed."""
+
+    out = [func(px, *args) for px in im]
+    if isinstance(im, PixelBuffer):
+        return PixelBuffer(array('d', chain.from_iterable(out)), im.width,
+                           im.height, channels)
+    return out
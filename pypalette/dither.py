@@ -0,0 +1,300 @@
+from collections import OrderedDict
+from color_index import ColorIndex
+from lut import PaletteLUT
+from palette import Palette
+from pixels import PixelBuffer
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Error diffusion kernels, each with the (dx, dy, weight) of every pixel the
+# error is spread to, and the weights' divisor
+_KERNELS = {
+    'none': ((), 1),
+    'floyd-steinberg': (((1, 0, 7), (-1, 1, 3), (0, 1, 5), (1, 1, 1)), 16),
+    'atkinson': (((1, 0, 1), (2, 0, 1), (-1, 1, 1), (0, 1, 1), (1, 1, 1),
+                  (0, 2, 1)), 8),
+    'sierra': (((1, 0, 4), (2, 0, 3), (-2, 1, 1), (-1, 1, 2), (0, 1, 3),
+                (1, 1, 2), (2, 1, 1)), 16),
+    'sierra-lite': (((1, 0, 2), (-1, 1, 1), (0, 1, 1)), 4),
+}
+
+# Largest distance a kernel spreads error sideways, which pads error rows
+_PAD = 2
+
+# Largest number of nearest colors remembered from ColorIndex searches
+_CACHE = 1 << 16
+
+# Number of ColorIndex searches after which a PaletteLUT is built instead,
+# about as long as building the table takes for a hundred colors
+_BUILD_AFTER = 1 << 16
+
+# PaletteLUTs built in this process, by palette, most recently used last
+_TABLES = OrderedDict()
+_MAX_TABLES = 4
+
+
+def dither_rows(rows, palette, method='floyd-steinberg', serpentine=False,
+                indices=False, cache_dir=False):
+    """Remaps the rows of an image to a palette, one row at a time.
+
+    Each pixel is replaced with its nearest palette color, and with error
+    diffusion the difference is spread to the pixels after it and in the
+    next rows, so that areas keep their average color. Only one row of
+    accumulated error per row the kernel reaches is kept (two for
+    Floyd-Steinberg and Sierra, three for Atkinson), so memory stays
+    proportional to the image width and rows can be streamed from and to
+    disk.
+
+    Nearest colors are searched for in a ColorIndex, remembering the
+    results. With NumPy, a PaletteLUT is built for the palette once so many
+    distinct colors have been searched for that the table is quicker (a few
+    seconds' worth), and each color then takes one or two lookups. Tables are
+    kept for later calls with the same palette, a table can be passed in
+    place of the palette, and tables can be cached on disk. All of these
+    give the same colors.
+
+    http://www.tannerhelland.com/4660/dithering-eleven-algorithms-source-code/
+
+    Args:
+        rows: An iterable of image rows of equal width, each a list of RGB
+            tuples or a (W, 3) NumPy array with values on [0, 255].
+        palette: A Palette, a dict of color names to Hex strings or RGB
+            tuples (such as color_lists.sp_pbt), a list of Hex strings or
+            RGB tuples, or a prebuilt PaletteLUT.
+        method: Optional string for dithering method selection, either
+            'none', 'floyd-steinberg' (the default), 'atkinson', 'sierra'
+            (two-row Sierra) or 'sierra-lite'.
+        serpentine: Optional bool for scanning every other row from right to
+            left, which avoids some diagonal artifacts, defaults to False.
+        indices: Optional bool for yielding palette indices instead of
+            colors, defaults to False.
+        cache_dir: Optional directory to cache the palette's PaletteLUT in,
+            which is then loaded (or built) up front, defaults to False (not
+            cached). Pass None for lut.default_cache_dir(). Two files are
+            written per palette and are never removed.
+
+    Yields:
+        Each remapped row as a list of RGB tuples, or of palette indices.
+
+    Raises:
+        ValueError: If an empty palette is passed, if an invalid dithering
+            method is selected, or if the rows are not all the same width.
+    """
+    if method not in _KERNELS:
+        raise ValueError('Invalid dithering method selected')
+    if isinstance(palette, PaletteLUT):
+        colors = [tuple(c) for c in palette.colors.tolist()]
+        nearest = _table_function(palette)
+    else:
+        if not isinstance(palette, Palette):
+            palette = Palette(palette)
+        if len(palette) == 0:
+            raise ValueError('An empty palette has been passed')
+        colors = palette.colors
+        nearest = _nearest_function(colors, cache_dir)
+    kernel, divisor = _KERNELS[method]
+    depth = 1 + max((dy for _, dy, _ in kernel), default=0)
+
+    width = None
+    for y, row in enumerate(rows):
+        values = _row_values(row)
+        if width is None:
+            width = len(values) // 3
+            errors = [[0.0] * (3 * (width + 2 * _PAD))
+                      for _ in range(0, depth)]
+        elif len(values) != 3 * width:
+            raise ValueError('The rows are not all the same width')
+
+        sign = -1 if serpentine and y % 2 else 1
+        xs = range(0, width) if sign == 1 else range(width - 1, -1, -1)
+        err = errors[0]
+        out = [0] * width
+        for x in xs:
+            i, j = 3 * x, 3 * (x + _PAD)
+            r = values[i] + err[j]
+            g = values[i + 1] + err[j + 1]
+            b = values[i + 2] + err[j + 2]
+            r = 0 if r < 0 else 255 if r > 255 else int(r + 0.5)
+            g = 0 if g < 0 else 255 if g > 255 else int(g + 0.5)
+            b = 0 if b < 0 else 255 if b > 255 else int(b + 0.5)
+
+            idx = out[x] = nearest(r, g, b)
+            if not kernel:
+                continue
+
+            c = colors[idx]
+            er = (r - c[0]) / divisor
+            eg = (g - c[1]) / divisor
+            eb = (b - c[2]) / divisor
+            for dx, dy, w in kernel:
+                k = j + 3 * sign * dx
+                buf = errors[dy]
+                buf[k] += er * w
+                buf[k + 1] += eg * w
+                buf[k + 2] += eb * w
+
+        # The next row's error becomes the current one, and a cleared row
+        # is reused for the furthest one down
+        err[:] = [0.0] * len(err)
+        errors = errors[1:] + errors[:1]
+
+        yield out if indices else [colors[i] for i in out]
+
+
+def remap(im, palette, method='floyd-steinberg', width=None,
+          serpentine=False, cache_dir=False):
+    """Remaps an image to a palette, with optional dithering.
+
+    The image is processed a row at a time by dither_rows.
+
+    Args:
+        im: An image as a list of RGB tuples, a PixelBuffer or an (H, W, 3)
+            NumPy array, with values on the interval [0, 255].
+        palette: A Palette, a dict of color names to Hex strings or RGB
+            tuples (such as color_lists.sp_pbt), a list of Hex strings or
+            RGB tuples, or a prebuilt PaletteLUT.
+        method: Optional string for dithering method selection, either
+            'none', 'floyd-steinberg' (the default), 'atkinson', 'sierra' or
+            'sierra-lite'.
+        width: Optional int for the width of an image given as a list,
+            defaults to the PixelBuffer's width, or otherwise to the number
+            of pixels (a single row).
+        serpentine: Optional bool for scanning every other row from right to
+            left, defaults to False.
+        cache_dir: Optional directory to cache the palette's PaletteLUT in,
+            as for dither_rows, defaults to False (not cached).
+
+    Returns:
+        The remapped image as a 3-channel PixelBuffer of the same size if a
+        PixelBuffer was given, otherwise as a list of RGB tuples.
+
+    Raises:
+        ValueError: If an empty image or palette is passed, if an invalid
+            dithering method is selected, or if the number of pixels is not
+            a multiple of the width.
+    """
+    if len(im) == 0:
+        raise ValueError('An empty image has been passed')
+
+    if isinstance(im, PixelBuffer):
+        width = im.width
+    elif np is not None and isinstance(im, np.ndarray) and im.ndim == 3:
+        width = im.shape[1]
+        im = im.reshape(-1, im.shape[2])
+    elif width is None:
+        width = len(im)
+
+    if len(im) % width:
+        raise ValueError('The number of pixels is not a multiple of the '
+                         'width')
+
+    rows = (im[y:y + width] for y in range(0, len(im), width))
+    remapped = dither_rows(rows, palette, method, serpentine,
+                           cache_dir=cache_dir)
+
+    if isinstance(im, PixelBuffer):
+        data = bytearray()
+        for row in remapped:
+            data += bytes(x for px in row for x in px)
+        return PixelBuffer(data, im.width, im.height)
+
+    return [px for row in remapped for px in row]
+
+
+def _row_values(row):
+    """Returns a row of pixels as a flat list of RGB values."""
+
+    if np is not None and isinstance(row, np.ndarray):
+        return row[:, :3].ravel().tolist()
+    return [x for px in row for x in px[:3]]
+
+
+def _nearest_function(colors, cache_dir):
+    """Makes a function that finds the index of the nearest palette color.
+
+    Colors are first searched for in a ColorIndex, remembering the results.
+    Once enough distinct colors have been searched for that a PaletteLUT
+    would have been quicker, one is built (with NumPy) and used for the rest.
+    Tables are kept for the next calls with the same palette, and tables
+    that are cached on disk, or already built, are used from the start.
+
+    Args:
+        colors: The palette colors as a list of RGB tuples.
+        cache_dir: The directory to cache the PaletteLUT tables in, None for
+            the default one or False to build them in memory.
+
+    Returns:
+        A function of integer red, green and blue values on [0, 255]. Ties go
+        to the color that comes first in the palette.
+    """
+    if np is not None and (cache_dir is not False or
+                           tuple(colors) in _TABLES):
+        return _table_function(_palette_table(colors, cache_dir))
+
+    index = ColorIndex(colors)
+    cache = {}
+    table = None
+    searches = 0
+
+    def nearest(r, g, b):
+        nonlocal table, searches
+        if table is not None:
+            return table(r, g, b)
+
+        key = r << 16 | g << 8 | b
+        if key in cache:
+            return cache[key]
+
+        searches += 1
+        if np is not None and searches > _BUILD_AFTER:
+            table = _table_function(_palette_table(colors, cache_dir))
+            return table(r, g, b)
+
+        if len(cache) >= _CACHE:
+            cache.clear()
+        i = cache[key] = index.nearest((r, g, b))
+        return i
+
+    return nearest
+
+
+def _palette_table(colors, cache_dir):
+    """Returns a palette's PaletteLUT, reusing the ones built recently."""
+
+    key = tuple(colors)
+    if key in _TABLES:
+        _TABLES.move_to_end(key)
+    else:
+        _TABLES[key] = PaletteLUT(colors, cache_dir=cache_dir)
+        if len(_TABLES) > _MAX_TABLES:
+            _TABLES.popitem(last=False)
+    return _TABLES[key]
+
+
+def _table_function(table):
+    """Makes a function that finds the nearest palette color in a PaletteLUT.
+
+    Args:
+        table: A PaletteLUT.
+
+    Returns:
+        A function of integer red, green and blue values on [0, 255] that
+        returns the index of the nearest palette color.
+    """
+    cells, blocks = memoryview(table.cells), memoryview(table.blocks)
+    bits, k = table.bits, len(table.colors)
+    shift = 8 - bits
+    mask = (1 << shift) - 1
+
+    def nearest(r, g, b):
+        i = cells[(r >> shift) << (2 * bits) | (g >> shift) << bits |
+                  (b >> shift)]
+        if i < k:
+            return i
+        return blocks[(i - k) << (3 * shift) | (r & mask) << (2 * shift) |
+                      (g & mask) << shift | (b & mask)]
+
+    return nearest
@@ -1,6 +1,55 @@
+from bisect import bisect_right
+from collections import Counter
 from copy import copy
+from functools import partial
+from heapq import nlargest
+from itertools import accumulate
 from math import sqrt
+from multiprocessing import Pool
 import random
+import time
+from conversions import (lab2rgb_many, linear2rgb_many, oklab2rgb_many,
+                         rgb2lab_many, rgb2linear_many, rgb2oklab_many,
+                         rgb2xyz_many, xyz2rgb_many)
+from metrics import (sq_cie94, sq_cie94_array, sq_ciede2000,
+                     sq_ciede2000_array, sq_redmean, sq_redmean_array)
+from palette import Palette
+from pixels import PixelBuffer, as_rgb_array
+from quantize import WuQuantizer
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Number of point and centroid pairs per block in batched distance
+# computations, which keeps the temporary (block, k, 3) arrays small
+# regardless of image size and k.
+_BLOCK = 1 << 18
+
+# Number of oversampling rounds for k-means|| initialization
+_PARALLEL_ROUNDS = 5
+
+# Color spaces that clustering can be run in, each with its conversions from
+# and back to RGB and a default tolerance of about half an 8-bit RGB step
+_SPACES = {
+    'rgb': (None, None, 0.5),
+    'linear': (rgb2linear_many, linear2rgb_many, 0.002),
+    'xyz': (rgb2xyz_many, xyz2rgb_many, 0.2),
+    'lab': (rgb2lab_many, lab2rgb_many, 0.2),
+    'oklab': (rgb2oklab_many, oklab2rgb_many, 0.002),
+}
+
+# Distance metrics, each with its squared distance between two points and
+# from many points to one (None for the blocked Euclidean computation), and
+# the color space it is measured in (None for any)
+_METRICS = {
+    'sqeuclidean': (None, None, None),
+    'cie76': (None, None, 'lab'),
+    'cie94': (sq_cie94, sq_cie94_array, 'lab'),
+    'ciede2000': (sq_ciede2000, sq_ciede2000_array, 'lab'),
+    'redmean': (sq_redmean, sq_redmean_array, 'rgb'),
+}
 
 
 def euclid_dist(c, pt):
@@ -13,8 +62,382 @@ def euclid_dist(c, pt):
     Returns:
         The Euclidean distance between the two points.
     """
-    return sqrt((c[0] - pt[0]) ** 2 + (c[1] - pt[1]) ** 2 +
-                (c[2] - pt[2]) ** 2)
+    return sqrt(sq_euclid_dist(c, pt))
+
+
+def sq_euclid_dist(c, pt):
+    """Calculates the squared 3D Euclidean distance between two points.
+
+    Args:
+        c: A cluster centroid as an RGB tuple.
+        pt: A selected image point as an RGB tuple.
+
+    Returns:
+        The squared Euclidean distance between the two points.
+    """
+    dx, dy, dz = c[0] - pt[0], c[1] - pt[1], c[2] - pt[2]
+    return dx * dx + dy * dy + dz * dz
+
+
+def sq_euclid_dist_array(pts, c):
+    """Calculates the squared Euclidean distance from many points to one.
+
+    Args:
+        pts: An (N, 3) NumPy array of points.
+        c: A single point as an RGB tuple or array.
+
+    Returns:
+        An (N,) array of squared distances.
+    """
+    diff = pts - np.asarray(c, dtype=np.float64)
+    return (diff ** 2).sum(axis=1)
+
+
+def _weighted_index(cum, rng=random):
+    """Picks an index with probability proportional to its weight.
+
+    Args:
+        cum: The cumulative sums of the weights, as a list.
+        rng: An optional random.Random instance, defaults to the random
+            module's global generator.
+
+    Returns:
+        The chosen index, found by a binary search over the sums.
+    """
+    r = rng.uniform(0, cum[-1])
+    return min(bisect_right(cum, r), len(cum) - 1)
+
+
+def kmeans_pp(pts, k, w=None, first=None, rng=random, dist=sq_euclid_dist):
+    """Picks k points as initial cluster centroids with k-means++ seeding.
+
+    A running minimum squared distance to the chosen seeds is kept for every
+    point and only updated against the newest seed, so seeding costs O(N*k).
+    Each seed is drawn with a binary search over the cumulative sum of the
+    (weighted) minimum squared distances.
+
+    Args:
+        pts: A list of RGB tuples.
+        k: The number of seeds to pick.
+        w: An optional list of point weights, defaults to None (all ones).
+        first: An optional index of the first seed, which is otherwise
+            drawn proportional to the point weights.
+        rng: An optional random.Random instance, defaults to the random
+            module's global generator.
+        dist: An optional function for the squared distance between two
+            points, defaults to sq_euclid_dist.
+
+    Returns:
+        A list of k indices of the chosen points.
+    """
+    if first is None:
+        first = (rng.randrange(len(pts)) if w is None else
+                 _weighted_index(list(accumulate(w)), rng))
+
+    seeds = [first]
+    d = [dist(pts[first], pt) for pt in pts]
+    while len(seeds) < k:
+        if w is None:
+            cum = list(accumulate(d))
+        else:
+            cum = list(accumulate(di * wi for di, wi in zip(d, w)))
+        seeds.append(_weighted_index(cum, rng))
+        c = pts[seeds[-1]]
+        d = [min(di, dist(c, pt)) for di, pt in zip(d, pts)]
+
+    return seeds
+
+
+def kmeans_pp_array(pts, k, w=None, first=None, rng=random,
+                    dist=sq_euclid_dist_array):
+    """The NumPy version of kmeans_pp.
+
+    Args:
+        pts: An (N, 3) NumPy array of points.
+        k: The number of seeds to pick.
+        w: An optional (N,) array of point weights, defaults to None.
+        first: An optional index of the first seed, which is otherwise
+            drawn proportional to the point weights.
+        rng: An optional random.Random instance, defaults to the random
+            module's global generator.
+        dist: An optional function for the squared distances from many
+            points to one, defaults to sq_euclid_dist_array.
+
+    Returns:
+        A list of k indices of the chosen points.
+    """
+    if first is None:
+        first = (rng.randrange(len(pts)) if w is None else
+                 _weighted_index(np.cumsum(w), rng))
+
+    seeds = [first]
+    d = dist(pts, pts[first])
+    while len(seeds) < k:
+        cum = np.cumsum(d if w is None else d * w)
+        r = rng.uniform(0, cum[-1])
+        seeds.append(min(int(np.searchsorted(cum, r, side='right')),
+                         len(cum) - 1))
+        np.minimum(d, dist(pts, pts[seeds[-1]]), out=d)
+
+    return seeds
+
+
+def nearest_centroids(pts, cc, exact=True, dist=None):
+    """Finds the nearest centroid for every point in an array of points.
+
+    Distances are computed in blocks of points at a time, so memory use
+    stays proportional to the number of points rather than points times k.
+    With a distance function, distances are instead computed one centroid at
+    a time while keeping a running minimum.
+
+    Args:
+        pts: An (N, 3) NumPy array of points.
+        cc: A (k, 3) NumPy array of cluster centroids.
+        exact: Optional bool, defaults to True. When False, distances are
+            expanded into a matrix product, which is much faster for many
+            centroids but may differ from the exact ones by rounding error.
+        dist: An optional function for the squared distances from many
+            points to one, defaults to None (squared Euclidean distance).
+
+    Returns:
+        A tuple of an (N,) array of nearest centroid indices and an (N,)
+        array of squared distances to those centroids.
+    """
+    labels = np.empty(len(pts), dtype=np.intp)
+    min_d = np.empty(len(pts), dtype=np.float64)
+    cc = np.asarray(cc, dtype=np.float64)
+
+    if dist is not None:
+        labels.fill(0)
+        min_d[:] = dist(pts, cc[0])
+        for i in range(1, len(cc)):
+            d = dist(pts, cc[i])
+            closer = d < min_d    # Ties go to the earlier centroid
+            labels[closer] = i
+            min_d[closer] = d[closer]
+        return labels, min_d
+    step = max(1, _BLOCK // len(cc))
+
+    if not exact:
+        cc_sq = (cc ** 2).sum(axis=1)
+
+    for start in range(0, len(pts), step):
+        block = pts[start:start + step]
+        if exact:
+            diff = block[:, np.newaxis, :] - cc[np.newaxis, :, :]
+            d = (diff ** 2).sum(axis=2)
+        else:
+            block = block.astype(np.float64)
+            d = block @ (-2 * cc.T)
+            d += cc_sq
+            d += (block ** 2).sum(axis=1)[:, np.newaxis]
+            np.maximum(d, 0, out=d)
+        labels[start:start + step] = d.argmin(axis=1)
+        min_d[start:start + step] = d.min(axis=1)
+
+    return labels, min_d
+
+
+def _distance_matrix(pts, cc):
+    """Calculates the Euclidean distance from every point to every centroid.
+
+    Args:
+        pts: An (N, 3) NumPy array of points.
+        cc: A (k, 3) NumPy array of cluster centroids.
+
+    Returns:
+        An (N, k) array of distances.
+    """
+    d = np.empty((len(pts), len(cc)), dtype=np.float64)
+    step = max(1, _BLOCK // len(cc))
+    for start in range(0, len(pts), step):
+        block = pts[start:start + step]
+        diff = block[:, np.newaxis, :] - cc[np.newaxis, :, :]
+        d[start:start + step] = np.sqrt((diff ** 2).sum(axis=2))
+    return d
+
+
+def _two_nearest(pts, cc):
+    """Finds the nearest and second nearest centroid distances for points.
+
+    Args:
+        pts: An (N, 3) NumPy array of points.
+        cc: A (k, 3) NumPy array of cluster centroids.
+
+    Returns:
+        A tuple of an (N,) array of nearest centroid indices, an (N,) array
+        of distances to those centroids, and an (N,) array of distances to
+        the second nearest centroids.
+    """
+    labels = np.empty(len(pts), dtype=np.intp)
+    d1 = np.empty(len(pts), dtype=np.float64)
+    d2 = np.empty(len(pts), dtype=np.float64)
+    step = max(1, _BLOCK // len(cc))
+
+    for start in range(0, len(pts), step):
+        d = _distance_matrix(pts[start:start + step], cc)
+        rows = np.arange(len(d))
+        a = d.argmin(axis=1)
+        labels[start:start + step] = a
+        d1[start:start + step] = d[rows, a]
+        d[rows, a] = np.inf
+        d2[start:start + step] = d.min(axis=1)
+
+    return labels, d1, d2
+
+
+def color_histogram(im, bits=8):
+    """Compacts an image into its distinct colors and their pixel counts.
+
+    With fewer than 8 bits per channel, colors are first quantized by
+    dropping their low bits, and each quantized color is represented by the
+    mean of the pixels that fall into it.
+
+    Args:
+        im: An image as a list of RGB tuples.
+        bits: An optional int for the number of bits kept per channel,
+            on the interval [1, 8], defaults to 8 (no quantization).
+
+    Returns:
+        A tuple of a list of distinct RGB tuples and a list of their counts,
+        both sorted by color.
+
+    Raises:
+        ValueError: If the given number of bits is outside [1, 8].
+    """
+    if not 1 <= bits <= 8:
+        raise ValueError('The number of bits is outside [1, 8]')
+
+    if bits == 8:
+        hist = sorted(Counter(tuple(px) for px in im).items())
+        return [h[0] for h in hist], [h[1] for h in hist]
+
+    shift = 8 - bits
+    bins = {}
+    for px in im:
+        key = (int(px[0]) >> shift, int(px[1]) >> shift, int(px[2]) >> shift)
+        if key in bins:
+            b = bins[key]
+            b[0] += 1
+            b[1] += px[0]
+            b[2] += px[1]
+            b[3] += px[2]
+        else:
+            bins[key] = [1, px[0], px[1], px[2]]
+
+    bins = [bins[key] for key in sorted(bins)]
+    colors = [(b[1] / b[0], b[2] / b[0], b[3] / b[0]) for b in bins]
+    return colors, [b[0] for b in bins]
+
+
+def color_histogram_array(pts, bits=8):
+    """The NumPy version of color_histogram.
+
+    Args:
+        pts: An (N, 3) NumPy array of RGB values on the interval [0, 255].
+        bits: An optional int for the number of bits kept per channel,
+            on the interval [1, 8], defaults to 8 (no quantization).
+
+    Returns:
+        A tuple of an (M, 3) float32 array of distinct colors and an (M,)
+        array of their counts, both sorted by color.
+
+    Raises:
+        ValueError: If the given number of bits is outside [1, 8].
+    """
+    if not 1 <= bits <= 8:
+        raise ValueError('The number of bits is outside [1, 8]')
+
+    shift = 8 - bits
+    q = np.asarray(pts).astype(np.int64) >> shift
+    keys = (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+    _, inverse, counts = np.unique(keys, return_inverse=True,
+                                   return_counts=True)
+    inverse = inverse.reshape(-1)
+
+    colors = np.stack([np.bincount(inverse, weights=pts[:, x])
+                       for x in range(0, 3)], axis=1)
+    colors /= counts[:, np.newaxis]
+
+    return colors.astype(np.float32), counts
+
+
+def _pairwise_array(dist, pts, c):
+    """Applies a distance function of two points from many points to one.
+
+    Args:
+        dist: A function of a cluster centroid and a point.
+        pts: An (N, 3) NumPy array of points.
+        c: A single point as a tuple or array.
+
+    Returns:
+        An (N,) array of distances.
+    """
+    c = tuple(np.asarray(c, dtype=np.float64).tolist())
+    return np.array([dist(c, tuple(pt)) for pt in pts.tolist()],
+                    dtype=np.float64)
+
+
+def _as_tuples(pts):
+    """Returns points given as a NumPy array or a sequence as tuples."""
+
+    if np is not None and isinstance(pts, np.ndarray):
+        pts = pts.tolist()
+    return [tuple(pt) for pt in pts]
+
+
+def _as_8bit(im, backend):
+    """Rounds an image's values to integers on [0, 255], for WuQuantizer.
+
+    Args:
+        im: An image as a list of RGB tuples, a PixelBuffer or an (N, 3)
+            NumPy array.
+        backend: The selected backend, either 'numpy' or 'python'.
+
+    Returns:
+        An (N, 3) uint8 NumPy array for the 'numpy' backend, otherwise a list
+        of RGB tuples.
+    """
+    if backend == 'numpy':
+        rgb = as_rgb_array(im)
+        if rgb.dtype == np.uint8:
+            return rgb
+        return np.clip(np.rint(rgb), 0, 255).astype(np.uint8)
+
+    return [tuple(min(max(int(round(x)), 0), 255) for x in px[:3])
+            for px in im]
+
+
+class KMeansStats(object):
+    """Statistics for a single k-means run.
+
+    Attributes:
+        n_iter: The number of Lloyd iterations run.
+        converged: True if the run stopped because the cluster centroids
+            moved less than the tolerance, False if it hit max_iter.
+        shift: The largest distance moved by a cluster centroid in the last
+            iteration.
+        n_empty: The number of times an empty cluster was re-seeded.
+        inertia: The weighted sum of squared distances from each point to
+            its nearest cluster centroid.
+        times: A dict of seconds spent in each phase of the run, keyed by
+            'init', 'assign', 'update' and 'inertia'.
+    """
+
+    def __init__(self):
+        """Initializes KMeansStats for a run that has not started yet."""
+
+        self.n_iter = 0
+        self.converged = False
+        self.shift = None
+        self.n_empty = 0
+        self.inertia = None
+        self.times = {'init': 0.0, 'assign': 0.0, 'update': 0.0,
+                      'inertia': 0.0}
+
+    def __repr__(self):
+        return ('KMeansStats(n_iter={}, converged={}, inertia={})'
+                .format(self.n_iter, self.converged, self.inertia))
 
 
 class KMeans(object):
@@ -25,34 +448,210 @@ class KMeans(object):
     represent the colors in the image, the resulting cluster centroids are
     declared to be the image's most representative colors. To improve results,
     k-means++ initialization is used so that initial cluster centroid seeding
-    is less random and more consistent.
+    is less random and more consistent. Runs are reproducible given a seed,
+    and several restarts can be made, keeping the one with the lowest inertia
+    (the weighted sum of squared distances from points to their centroids).
+
+    Point assignment can be accelerated with the triangle inequality. Elkan's
+    algorithm keeps an upper bound on each point's distance to its cluster
+    centroid and a lower bound on its distance to every other centroid, while
+    Hamerly's algorithm keeps a single lower bound for the second nearest
+    centroid. Whenever the bounds prove that a point cannot change clusters,
+    its distances are not computed at all. Both give the same cluster
+    centroids as Lloyd's algorithm. Elkan's algorithm skips the most work but
+    stores k bounds per point, so Hamerly's is better suited to large images.
 
     http://en.wikipedia.org/wiki/K-means_clustering
     http://en.wikipedia.org/wiki/K-means%2B%2B
+    http://cseweb.ucsd.edu/~elkan/kmeansicml03.pdf
+    http://cs.baylor.edu/~hamerly/papers/sdm_2010.pdf
     """
 
-    def __init__(self, im, k):
+    def __init__(self, im, k, backend='auto', histogram=False, bits=8,
+                 algorithm='lloyd', init='k-means++', seed=None, n_init=1,
+                 n_jobs=1, max_iter=300, tol=None, space=None,
+                 metric='sqeuclidean'):
         """Initializes KMeans with an image and initial cluster data.
 
+        Two backends are available: 'numpy', which keeps the image in a
+        single (N, 3) float32 array and assigns every point in one batched
+        distance computation, and 'python', the dependency-free fallback.
+        Both backends return the same colors for the same random seed.
+
+        With histogram enabled, the image is first compacted into its distinct
+        colors (optionally quantized to fewer bits per channel) and their
+        counts, and weighted k-means is run over that much smaller set.
+
+        Clustering can be run in a perceptual color space such as CIE Lab or
+        OKLab, where distances better match perceived color differences. The
+        image is converted into the space once, and only the final cluster
+        centroids are converted back to RGB.
+
+        Points are assigned to clusters by squared distance, which orders
+        them just like distance without taking any square roots. Besides
+        squared Euclidean distance, the "redmean" weighted RGB distance, the
+        CIE76, CIE94 and CIEDE2000 color differences in Lab, or any function
+        of two colors can be used. Built-in metrics are computed for all
+        points at once on the 'numpy' backend, while a function is called on
+        one pair of colors at a time. Cluster centroids are always the mean
+        of their members.
+
         Args:
-            im: An image as a list of RGB tuples.
+            im: An image as a list of RGB tuples, a PixelBuffer or an (N, 3)
+                NumPy array.
             k: The number of clusters to generate.
+            backend: Optional string for backend selection, either 'numpy',
+                'python', or 'auto' (the default), which uses NumPy when it
+                is installed.
+            histogram: Optional bool for clustering over the image's color
+                histogram instead of every pixel, defaults to False.
+            bits: Optional int for the number of bits kept per channel in
+                the color histogram, defaults to 8 (no quantization).
+            algorithm: Optional string for point assignment selection,
+                either 'lloyd' (the default), 'elkan', or 'hamerly'.
+            init: Optional string for initialization selection, either
+                'k-means++' (the default), 'k-means||', which needs far
+                fewer passes over the image for large k, or 'wu', which
+                starts from the colors of WuQuantizer, usually close to
+                converged ones (every restart then starts from them). Wu's
+                quantizer is given the image rounded and clipped to 8-bit
+                values.
+            seed: Optional int or random.Random instance used as the source
+                of randomness, defaults to None (seeded from the system).
+            n_init: Optional int for the number of restarts with different
+                initial centroids, defaults to 1.
+            n_jobs: Optional int for the number of processes that restarts
+                are run in, defaults to 1. Results do not depend on it.
+                Restarts are run serially when metric is a function, which
+                may not be picklable.
+            max_iter: Optional int for the maximum number of Lloyd
+                iterations per run, defaults to 300.
+            tol: Optional float for convergence, which happens once no
+                cluster centroid moves further than tol in an iteration,
+                defaults to about half an 8-bit RGB step in the color space
+                (0.5 in RGB, so colors rounded to integers have settled).
+            space: Optional string for the color space clustering is run
+                in, either 'rgb', 'linear' (linear RGB), 'xyz', 'lab' or
+                'oklab'. Defaults to the metric's color space, which is 'lab'
+                for the CIE metrics and 'rgb' otherwise. Inertia and
+                tolerance are measured in this space.
+            metric: Optional string for distance metric selection, either
+                'sqeuclidean' (the default), 'redmean', 'cie76', 'cie94' or
+                'ciede2000', or a function of a cluster centroid and a point
+                that returns their squared distance. A function metric runs
+                restarts in this process, whatever n_jobs is.
 
         Raises:
-            ValueError: If an empty image is passed (i.e. []) or if the desired
-                amount of clusters is less than two.
+            ValueError: If an empty image is passed (i.e. []), if the desired
+                amount of clusters is less than two, if an invalid backend,
+                algorithm, initialization, color space or metric is selected,
+                if the metric is measured in another color space, if Elkan's
+                or Hamerly's algorithm is used with a non-Euclidean metric,
+                if bits is outside [1, 8], or if n_init, n_jobs or max_iter
+                is less than one.
+            ImportError: If the 'numpy' backend is selected but NumPy is not
+                installed.
         """
         if len(im) == 0:
             raise ValueError('An empty image has been passed')
         elif k < 2:
             raise ValueError('The number of clusters must be at least two')
+        elif backend not in ('auto', 'numpy', 'python'):
+            raise ValueError('Invalid backend selected')
+        elif algorithm not in ('lloyd', 'elkan', 'hamerly'):
+            raise ValueError('Invalid algorithm selected')
+        elif init not in ('k-means++', 'k-means||', 'wu'):
+            raise ValueError('Invalid initialization selected')
+        elif space is not None and space not in _SPACES:
+            raise ValueError('Invalid color space selected')
+        elif not callable(metric) and metric not in _METRICS:
+            raise ValueError('Invalid metric selected')
+        elif (algorithm != 'lloyd' and
+              metric not in ('sqeuclidean', 'cie76')):
+            raise ValueError('Elkan and Hamerly need a Euclidean metric')
+        elif n_init < 1 or n_jobs < 1 or max_iter < 1:
+            raise ValueError('The number of restarts, jobs and iterations '
+                             'must be at least one')
+        elif backend == 'numpy' and np is None:
+            raise ImportError('The numpy backend requires NumPy')
+
+        if backend == 'auto':
+            backend = 'python' if np is None else 'numpy'
+
+        dist, dist_array, metric_space = _METRICS.get(metric,
+                                                      (metric, None, None))
+        if space is None:
+            space = metric_space or 'rgb'
+        elif metric_space not in (None, space):
+            raise ValueError('The {} metric is measured in the {} color space'
+                             .format(metric, metric_space))
+        if callable(metric):
+            dist_array = partial(_pairwise_array, metric)
 
         self.im = im
         self.k = k
-        self.d = []    # Empty distances list for use later on
+        self.backend = backend
+        self.algorithm = algorithm
+        self.init = init
+        self.n_init = n_init
+        self.n_jobs = n_jobs
+        self.max_iter = max_iter
+        self.space = space
+        self.metric = metric
+        self.tol = _SPACES[space][2] if tol is None else tol
+        self.inertia = None
+        self.stats = None    # Statistics of the kept run
+        self.run_stats = []    # Statistics of every run, in restart order
+        self.clusters = []
+        self._weights = None    # Pixel fractions of the kept run's clusters
+        if isinstance(seed, random.Random):
+            self._rng = seed
+        else:
+            self._rng = random.Random(seed)
+        self.w = None    # Point weights, only used with histogram
+
+        # Squared distance functions. The one on arrays is None for squared
+        # Euclidean distance, so that its faster blocked computation is used.
+        self._dist = dist or sq_euclid_dist
+        self._dist_array = dist_array
+
+        # Point assignments and distance bounds for Elkan and Hamerly
+        self._labels = None
+        self._upper = None
+        self._lower = None
+        self._bound_cc = None
 
-        # First initial cluster centroid is chosen uniformly at random
-        self.clusters = [{'cc': copy(random.choice(self.im)), 'pts': []}]
+        # Wu's quantizer needs the 8-bit image, so its colors are found
+        # before any compaction or conversion, from rounded values
+        self._wu_colors = None
+        if init == 'wu':
+            wu = WuQuantizer(_as_8bit(im, backend), k, backend)
+            wu.get_colors()
+            self._wu_colors = [cc for _, cc in wu.boxes]
+
+        if backend == 'numpy':
+            self._pts = as_rgb_array(im, np.float32)
+            if histogram:
+                self._pts, self.w = color_histogram_array(self._pts, bits)
+        else:
+            self._pts = None
+            if isinstance(im, PixelBuffer) and im.channels != 3:
+                self.im = [px[:3] for px in im]
+            if histogram:
+                self.im, self.w = color_histogram(self.im, bits)
+
+        # Points are converted once, after histogram compaction, and are kept
+        # in double precision so that both backends agree
+        to_space = _SPACES[space][0]
+        if to_space is not None:
+            if self._pts is not None:
+                self._pts = to_space(self._pts, None)
+            else:
+                self.im = _as_tuples(to_space(self.im, None))
+            if self._wu_colors is not None:
+                self._wu_colors = _as_tuples(to_space(self._wu_colors, None))
+        if self._pts is not None and self._dist_array is not None:
+            self._pts = self._pts.astype(np.float64, copy=False)
 
     def get_colors(self, prec=0):
         """Returns a list of k colors that are most representative of the image.
@@ -64,29 +663,125 @@ class KMeans(object):
         Returns:
             A list of k RGB tuples.
         """
+        seeds = [self._rng.getrandbits(64) for _ in range(self.n_init)]
+
+        if self.n_init == 1:
+            runs = [self._run(seeds[0])]
+            self.stats, _, self._weights = runs[0]
+        else:
+            # Function metrics such as lambdas cannot be sent to processes
+            if self.n_jobs == 1 or callable(self.metric):
+                runs = [self._run(seed) for seed in seeds]
+            else:
+                with Pool(min(self.n_jobs, self.n_init)) as pool:
+                    runs = pool.map(self._run, seeds)
+
+            # Ties go to the earliest restart, whatever the number of jobs
+            self.stats, ccs, self._weights = min(
+                runs, key=lambda run: run[0].inertia)
+            self.clusters = [{'cc': cc, 'pts': []} for cc in ccs]
+
+        self.run_stats = [run[0] for run in runs]
+        self.inertia = self.stats.inertia
+
+        return [tuple(round(x, prec) for x in c)
+                for c in self._rgb_centroids()]
+
+    def get_palette(self):
+        """Returns the k most representative colors as a weighted Palette.
+
+        Each color is weighted by the fraction of the image's pixels nearest
+        to its final centroid. The colors of the last get_colors call are
+        used, and the image is only clustered if it has not been yet.
+
+        Returns:
+            A Palette of k colors, in the same order as get_colors.
+        """
+        if self._weights is None:
+            self.get_colors()
+
+        return Palette(self._rgb_centroids(), self._weights)
+
+    def _run(self, seed):
+        """Runs initialization and Lloyd's algorithm once.
+
+        Args:
+            seed: The seed for this run's random number generator.
+
+        Returns:
+            A tuple of the run's KMeansStats, its cluster centroids and the
+            fractions of the pixels nearest to each of them.
+        """
+        self._rng = random.Random(seed)
+        self._labels = self._upper = self._lower = self._bound_cc = None
+        stats = KMeansStats()
+
+        start = time.perf_counter()
         self._kpp_init()
-        self._lloyd()
-        return [c['cc'] for c in self.clusters]
+        stats.times['init'] = time.perf_counter() - start
+
+        self._lloyd(stats)
+
+        start = time.perf_counter()
+        stats.inertia, weights = self._inertia()
+        stats.times['inertia'] = time.perf_counter() - start
+
+        return stats, [c['cc'] for c in self.clusters], weights
+
+    def _rgb_centroids(self):
+        """Returns the current cluster centroids as unrounded RGB tuples."""
 
-    def _has_converged(self, occ):
+        ccs = [c['cc'] for c in self.clusters]
+        from_space = _SPACES[self.space][1]
+        if from_space is not None:
+            ccs = _as_tuples(from_space(ccs, None))
+        return ccs
+
+    def _inertia(self):
+        """Calculates the weighted sum of squared distances from each point
+        to its nearest cluster centroid.
+
+        Returns:
+            A tuple of the inertia of the current cluster centroids and the
+            fraction of the pixels nearest to each of them.
+        """
+        cc = [c['cc'] for c in self.clusters]
+
+        if self._pts is not None:
+            labels, d = nearest_centroids(self._pts, cc,
+                                          dist=self._dist_array)
+            counts = np.bincount(labels, weights=self.w,
+                                 minlength=self.k).tolist()
+            inertia = float(d.sum() if self.w is None else d @ self.w)
+        else:
+            counts = [0] * self.k
+            inertia = 0
+            w = [1] * len(self.im) if self.w is None else self.w
+            for pt, wi in zip(self.im, w):
+                d = [self._dist(c, pt) for c in cc]
+                nearest = min(d)
+                counts[d.index(nearest)] += wi
+                inertia += wi * nearest
+
+        total = sum(counts)
+        return inertia, [n / total for n in counts]
+
+    def _has_converged(self, occ, stats):
         """Determines whether the cluster centroids have converged.
 
-        The cluster centroids are said to have converged when the rounded
-        cluster centroids remain the same after an iteration of updating.
+        The cluster centroids are said to have converged when none of them
+        moved further than the tolerance in an iteration of updating.
 
         Args:
             occ: The cluster centroids from the previous iteration.
+            stats: The run's KMeansStats, which records the largest shift.
 
         Returns:
             True is the cluster centroids have converged, False otherwise.
         """
-        for i in range(0, len(self.clusters)):
-            for x in range(0, 3):    # Have to compare RGB values separately
-                if (round(occ[i][x]) !=
-                        round([c['cc'] for c in self.clusters][i][x])):
-                    return False
-                else:
-                    return True
+        stats.shift = max(euclid_dist(o, c['cc'])
+                          for o, c in zip(occ, self.clusters))
+        return stats.shift <= self.tol
 
     def _kpp_init(self):
         """Uses k-means++ initialization to generate initial cluster centroids.
@@ -96,70 +791,613 @@ class KMeans(object):
         to each point's squared distance to the nearest cluster. This helps
         in spreading out the initial clusters and avoiding weird results that
         can occur with all random cluster centroids.
+
+        With k-means|| initialization, a handful of sampling rounds first
+        oversample candidate centroids from the whole image, and k-means++
+        then picks the k initial cluster centroids from those candidates.
+
+        With Wu initialization, the colors of Wu's quantizer are used. If it
+        found fewer than k, its last color is repeated, and the clusters
+        that end up empty are re-seeded as usual.
         """
-        while self.k - 1 > 0:
-            # No point in calculating minimum distances with one cluster
-            if len(self.clusters) == 1:
-                for pt in self.im:
-                    self.d.append(euclid_dist(self.clusters[0]['cc'], pt))
-            # Assigns each point to the nearest cluster
-            else:
-                for pt in self.im:
-                    min_dist = float('inf')    # For first comparison
-                    for c in self.clusters:
-                        if euclid_dist(c['cc'], pt) < min_dist:
-                            min_dist = euclid_dist(c['cc'], pt)
-                    self.d.append(min_dist)
-
-            # Probability distrubution proportional to squared distance
-            self.d = [dist ** 2 for dist in self.d]
-            total = sum(self.d)
-            r = random.uniform(0, total)
-
-            # Generates a new cluster using the above probability distribution
-            b = 0
-            for i, c in enumerate(self.d):
-                if b + c > r:
-                    self.clusters.append({'cc': copy(self.im[i]), 'pts': []})
+        if self.init == 'wu':
+            ccs = self._wu_colors
+            ccs = ccs + ccs[-1:] * (self.k - len(ccs))
+            self.clusters = [{'cc': tuple(cc), 'pts': []} for cc in ccs]
+            return
+
+        # First initial cluster centroid is chosen uniformly at random from
+        # the pixels, which means proportional to weight with a histogram
+        if self.w is None:
+            first = self._rng.randrange(len(self.im if self._pts is None
+                                            else self._pts))
+        else:
+            first = _weighted_index(list(accumulate(self.w)), self._rng)
+
+        if self.init == 'k-means||':
+            seeds = self._kmeans_parallel(first)
+        elif self._pts is not None:
+            seeds = kmeans_pp_array(self._pts, self.k, self.w, first,
+                                    self._rng,
+                                    self._dist_array or sq_euclid_dist_array)
+        else:
+            seeds = kmeans_pp(self.im, self.k, self.w, first, self._rng,
+                              self._dist)
+
+        if self._pts is not None:
+            self.clusters = [{'cc': tuple(self._pts[i].tolist()), 'pts': []}
+                             for i in seeds]
+        else:
+            self.clusters = [{'cc': copy(self.im[i]), 'pts': []}
+                             for i in seeds]
+
+    def _kmeans_parallel(self, first):
+        """Picks initial cluster centroids with k-means|| oversampling.
+
+        Each sampling round keeps every point independently with probability
+        proportional to its weighted squared distance to the nearest
+        candidate, expecting 2k new candidates per round. The candidates are
+        then weighted by the number of pixels nearest to them and reduced to
+        k centroids with k-means++.
+
+        http://vldb.org/pvldb/vol5/p622_bahmani_vldb2012.pdf
+
+        Args:
+            first: The index of the first centroid.
+
+        Returns:
+            A list of k indices of the points chosen as centroids.
+        """
+        ell = 2 * self.k
+
+        if self._pts is not None:
+            w = np.ones(len(self._pts)) if self.w is None else self.w
+            cands = [first]
+            dist_array = self._dist_array or sq_euclid_dist_array
+            d = dist_array(self._pts, self._pts[first])
+            for _ in range(_PARALLEL_ROUNDS):
+                cost = (d * w).sum()
+                if cost == 0:
                     break
-                b += c
+                # Uniforms come from the shared generator, one per point in
+                # order, so both backends keep the same candidates
+                u = np.array([self._rng.random() for _ in range(len(d))])
+                new = np.flatnonzero(u < ell * d * w / cost)
+                if new.size:
+                    _, d_new = nearest_centroids(self._pts, self._pts[new],
+                                                 False, self._dist_array)
+                    np.minimum(d, d_new, out=d)
+                cands.extend(new.tolist())
 
-            self.d.clear()
-            self.k -= 1
+            labels, _ = nearest_centroids(self._pts, self._pts[cands],
+                                          False, self._dist_array)
+            cw = np.bincount(labels, weights=w, minlength=len(cands))
+            seeds = kmeans_pp([tuple(pt) for pt in self._pts[cands].tolist()],
+                              self.k, cw.tolist(), rng=self._rng,
+                              dist=self._dist)
+            return [cands[i] for i in seeds]
 
-    def _lloyd(self):
+        w = [1] * len(self.im) if self.w is None else self.w
+        cands = [first]
+        d = [self._dist(self.im[first], pt) for pt in self.im]
+        for _ in range(_PARALLEL_ROUNDS):
+            cost = sum(di * wi for di, wi in zip(d, w))
+            if cost == 0:
+                break
+            new = [i for i, (di, wi) in enumerate(zip(d, w))
+                   if self._rng.random() < ell * di * wi / cost]
+            if new:
+                d = [min(di, min(self._dist(self.im[i], pt) for i in new))
+                     for di, pt in zip(d, self.im)]
+            cands.extend(new)
+
+        cw = [0] * len(cands)
+        for pt, wi in zip(self.im, w):
+            dists = [self._dist(self.im[i], pt) for i in cands]
+            cw[min(range(len(cands)), key=dists.__getitem__)] += wi
+        seeds = kmeans_pp([self.im[i] for i in cands], self.k, cw,
+                          rng=self._rng, dist=self._dist)
+        return [cands[i] for i in seeds]
+
+    def _lloyd(self, stats):
         """The standard k-means algorithm / Lloyd's algorithm.
 
         The few steps to Lloyd's algorithm are as follows:
             1. Reassign each point in the image to its nearest cluster.
             2. Update cluster centroids by taking the mean of their members.
-            3. Repeat Steps 1 and 2 until convergence.
+            3. Repeat Steps 1 and 2 until convergence or max_iter iterations.
+
+        Args:
+            stats: The run's KMeansStats, which records iterations and times.
         """
-        while True:
+        for stats.n_iter in range(1, self.max_iter + 1):
             occ = [c['cc'] for c in self.clusters]
+
+            start = time.perf_counter()
             self._reassign_points()
-            self._update_centroids()
-            if self._has_converged(occ):
+            stats.times['assign'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            stats.n_empty += self._update_centroids()
+            stats.times['update'] += time.perf_counter() - start
+
+            if self._has_converged(occ, stats):
+                stats.converged = True
                 break
 
     def _reassign_points(self):
         """Reassigns each point in the image to its nearest cluster."""
 
+        if self.algorithm != 'lloyd':
+            if self._pts is not None:
+                cc = np.array([c['cc'] for c in self.clusters],
+                              dtype=np.float64)
+                if self.algorithm == 'elkan':
+                    self._reassign_points_elkan_numpy(cc)
+                else:
+                    self._reassign_points_hamerly_numpy(cc)
+                self._bound_cc = cc
+            else:
+                cc = [c['cc'] for c in self.clusters]
+                if self.algorithm == 'elkan':
+                    self._reassign_points_elkan(cc)
+                else:
+                    self._reassign_points_hamerly(cc)
+                self._bound_cc = cc
+                self._assign_members()
+            return
+
+        if self._pts is not None:
+            self._labels, _ = nearest_centroids(
+                self._pts, [c['cc'] for c in self.clusters],
+                dist=self._dist_array)
+            return
+
         for c in self.clusters:
             c['pts'].clear()    # Gets rid of old cluster members
-        for pt in self.im:
+            c['w'] = []
+        self._labels = []
+        for j, pt in enumerate(self.im):
             min_dist = float('inf')    # For first comparison
             min_index = 0
             for i, c in enumerate(self.clusters):
-                if euclid_dist(c['cc'], pt) < min_dist:
-                    min_dist = euclid_dist(c['cc'], pt)
+                dist = self._dist(c['cc'], pt)
+                if dist < min_dist:
+                    min_dist = dist
                     min_index = i
             self.clusters[min_index]['pts'].append(pt)
+            self._labels.append(min_index)
+            if self.w is not None:
+                self.clusters[min_index]['w'].append(self.w[j])
+
+    def _assign_members(self):
+        """Rebuilds cluster member lists from the point assignments."""
+
+        for c in self.clusters:
+            c['pts'].clear()    # Gets rid of old cluster members
+            c['w'] = []
+        for j, (pt, i) in enumerate(zip(self.im, self._labels)):
+            self.clusters[i]['pts'].append(pt)
+            if self.w is not None:
+                self.clusters[i]['w'].append(self.w[j])
+
+    def _centroid_gaps(self, cc):
+        """Calculates half the distance from each centroid to its nearest one.
+
+        Args:
+            cc: The current cluster centroids.
+
+        Returns:
+            A tuple of the (k, k) centroid to centroid distances and a list
+            of half of each centroid's distance to its nearest centroid.
+        """
+        ccd = [[euclid_dist(a, b) for b in cc] for a in cc]
+        s = [0.5 * min((d for j, d in enumerate(row) if j != i),
+                       default=float('inf')) for i, row in enumerate(ccd)]
+        return ccd, s
+
+    def _reassign_points_elkan(self, cc):
+        """Reassigns points to their nearest cluster with Elkan's algorithm.
+
+        Args:
+            cc: The current cluster centroids.
+        """
+        k = len(cc)
+        ccd, s = self._centroid_gaps(cc)
+
+        if self._upper is None:
+            self._labels, self._upper, self._lower = [], [], []
+            for pt in self.im:
+                d = [euclid_dist(c, pt) for c in cc]
+                a = min(range(k), key=d.__getitem__)
+                self._labels.append(a)
+                self._upper.append(d[a])
+                self._lower.append(d)
+            return
+
+        p = [euclid_dist(a, b) for a, b in zip(self._bound_cc, cc)]
+        for i, pt in enumerate(self.im):
+            a = self._labels[i]
+            u = self._upper[i] + p[a]
+            lower = [max(l - pj, 0) for l, pj in zip(self._lower[i], p)]
+            if u > s[a]:
+                stale = True
+                for j in range(k):
+                    if j == a or u <= lower[j] or u <= 0.5 * ccd[a][j]:
+                        continue
+                    if stale:
+                        u = lower[a] = euclid_dist(cc[a], pt)
+                        stale = False
+                        if u <= lower[j] or u <= 0.5 * ccd[a][j]:
+                            continue
+                    lower[j] = euclid_dist(cc[j], pt)
+                    if lower[j] < u:
+                        a, u = j, lower[j]
+            self._labels[i] = a
+            self._upper[i] = u
+            self._lower[i] = lower
+
+    def _reassign_points_hamerly(self, cc):
+        """Reassigns points to their nearest cluster with Hamerly's algorithm.
+
+        Args:
+            cc: The current cluster centroids.
+        """
+        k = len(cc)
+        _, s = self._centroid_gaps(cc)
+
+        if self._upper is None:
+            self._labels, self._upper, self._lower = [], [], []
+            for pt in self.im:
+                d = [euclid_dist(c, pt) for c in cc]
+                a = min(range(k), key=d.__getitem__)
+                self._labels.append(a)
+                self._upper.append(d[a])
+                self._lower.append(min((d[j] for j in range(k) if j != a),
+                                       default=float('inf')))
+            return
+
+        # Lower bounds drop by the largest shift of any other centroid
+        p = [euclid_dist(a, b) for a, b in zip(self._bound_cc, cc)]
+        p_max = max(range(k), key=p.__getitem__)
+        p_next = max((p[j] for j in range(k) if j != p_max), default=0)
+
+        for i, pt in enumerate(self.im):
+            a = self._labels[i]
+            u = self._upper[i] + p[a]
+            l = self._lower[i] - (p_next if a == p_max else p[p_max])
+            m = max(s[a], l)
+            if u > m:
+                u = euclid_dist(cc[a], pt)
+                if u > m:
+                    d = [euclid_dist(c, pt) for c in cc]
+                    a = min(range(k), key=d.__getitem__)
+                    u = d[a]
+                    l = min((d[j] for j in range(k) if j != a),
+                            default=float('inf'))
+            self._labels[i] = a
+            self._upper[i] = u
+            self._lower[i] = l
+
+    def _reassign_points_elkan_numpy(self, cc):
+        """The NumPy backend version of _reassign_points_elkan.
+
+        Points whose bounds cannot rule out a closer centroid are gathered
+        into one array, which is then checked against each centroid in turn.
+
+        Args:
+            cc: A (k, 3) NumPy array of the current cluster centroids.
+        """
+        if self._upper is None:
+            self._lower = _distance_matrix(self._pts, cc)
+            self._labels = self._lower.argmin(axis=1)
+            self._upper = self._lower[np.arange(len(self._pts)),
+                                      self._labels]
+            return
+
+        k = len(cc)
+        ccd = np.sqrt(((cc[:, np.newaxis] - cc[np.newaxis]) ** 2).sum(axis=2))
+        s = 0.5 * (ccd + np.diag(np.full(k, np.inf))).min(axis=1)
+        p = np.sqrt(((cc - self._bound_cc) ** 2).sum(axis=1))
+
+        self._upper += p[self._labels]
+        self._lower -= p
+        np.maximum(self._lower, 0, out=self._lower)
+
+        idx = np.flatnonzero(self._upper > s[self._labels])
+        if idx.size == 0:
+            return
+
+        pts = self._pts[idx]
+        a = self._labels[idx]
+        u = self._upper[idx]
+        lower = self._lower[idx]
+        stale = np.ones(len(idx), dtype=bool)
+
+        for j in range(k):
+            mask = (a != j) & (u > lower[:, j]) & (u > 0.5 * ccd[a, j])
+            r = np.flatnonzero(mask & stale)
+            if r.size:
+                u[r] = np.sqrt(((pts[r] - cc[a[r]]) ** 2).sum(axis=1))
+                lower[r, a[r]] = u[r]
+                stale[r] = False
+                mask &= (u > lower[:, j]) & (u > 0.5 * ccd[a, j])
+            r = np.flatnonzero(mask)
+            if r.size == 0:
+                continue
+            d = np.sqrt(((pts[r] - cc[j]) ** 2).sum(axis=1))
+            lower[r, j] = d
+            closer = d < u[r]
+            a[r[closer]] = j
+            u[r[closer]] = d[closer]
+
+        self._labels[idx] = a
+        self._upper[idx] = u
+        self._lower[idx] = lower
+
+    def _reassign_points_hamerly_numpy(self, cc):
+        """The NumPy backend version of _reassign_points_hamerly.
+
+        Args:
+            cc: A (k, 3) NumPy array of the current cluster centroids.
+        """
+        if self._upper is None:
+            self._labels, self._upper, self._lower = _two_nearest(self._pts,
+                                                                  cc)
+            return
+
+        k = len(cc)
+        ccd = np.sqrt(((cc[:, np.newaxis] - cc[np.newaxis]) ** 2).sum(axis=2))
+        s = 0.5 * (ccd + np.diag(np.full(k, np.inf))).min(axis=1)
+        p = np.sqrt(((cc - self._bound_cc) ** 2).sum(axis=1))
+
+        # Lower bounds drop by the largest shift of any other centroid
+        order = np.argsort(p)[::-1]
+        p_next = p[order[1]] if k > 1 else 0
+        self._upper += p[self._labels]
+        self._lower -= np.where(self._labels == order[0], p_next, p[order[0]])
+
+        m = np.maximum(s[self._labels], self._lower)
+        idx = np.flatnonzero(self._upper > m)
+        if idx.size == 0:
+            return
+
+        a = self._labels[idx]
+        self._upper[idx] = np.sqrt(((self._pts[idx] - cc[a]) ** 2).sum(axis=1))
+        idx = idx[self._upper[idx] > m[idx]]
+        if idx.size:
+            (self._labels[idx], self._upper[idx],
+             self._lower[idx]) = _two_nearest(self._pts[idx], cc)
 
     def _update_centroids(self):
-        """Updates cluster centroids by taking the mean of their members."""
+        """Updates cluster centroids by taking the mean of their members.
+
+        A cluster that has lost all of its members is re-seeded at the point
+        farthest from its own cluster centroid, so that the run can carry on
+        instead of dividing by zero. With several empty clusters, they take
+        the farthest points in turn.
+
+        Returns:
+            The number of empty clusters that were re-seeded.
+        """
+        if self._pts is not None:
+            k = len(self.clusters)
+            occ = np.array([c['cc'] for c in self.clusters])
+            if self.w is None:
+                counts = np.bincount(self._labels, minlength=k)
+                pts = self._pts
+            else:
+                counts = np.bincount(self._labels, weights=self.w,
+                                     minlength=k)
+                pts = self._pts * self.w[:, np.newaxis]
+            sums = np.stack([np.bincount(self._labels, weights=pts[:, x],
+                                         minlength=k)
+                             for x in range(0, 3)], axis=1)
+            cc = np.divide(sums, counts[:, np.newaxis], out=occ.copy(),
+                           where=counts[:, np.newaxis] > 0)
+
+            empty = np.flatnonzero(counts == 0)
+            if empty.size:
+                if self._dist_array is None:
+                    d = ((self._pts - occ[self._labels]) ** 2).sum(axis=1)
+                else:
+                    d = np.empty(len(self._pts))
+                    for i in range(0, k):
+                        own = self._labels == i
+                        d[own] = self._dist_array(self._pts[own], occ[i])
+                far = np.argsort(-d, kind='stable')[:empty.size]
+                cc[empty] = self._pts[far]
+
+            for i, c in enumerate(self.clusters):
+                c['cc'] = tuple(cc[i].tolist())
+            return len(empty)
+
+        empty = [c for c in self.clusters if not c['pts']]
+        if empty:
+            occ = [c['cc'] for c in self.clusters]
+            d = [self._dist(occ[i], pt)
+                 for pt, i in zip(self.im, self._labels)]
+            far = nlargest(len(empty), range(len(d)), key=d.__getitem__)
+            for c, i in zip(empty, far):
+                c['cc'] = tuple(float(x) for x in self.im[i])
 
         for c in self.clusters:
-            c['cc'] = (sum(pt[0] for pt in c['pts']) / len(c['pts']),
-                       sum(pt[1] for pt in c['pts']) / len(c['pts']),
-                       sum(pt[2] for pt in c['pts']) / len(c['pts']))
+            if not c['pts']:
+                continue
+            elif self.w is not None:
+                members = list(zip(c['pts'], c['w']))
+                total = sum(c['w'])
+                c['cc'] = tuple(sum(pt[x] * w for pt, w in members) / total
+                                for x in range(0, 3))
+            else:
+                c['cc'] = (sum(pt[0] for pt in c['pts']) / len(c['pts']),
+                           sum(pt[1] for pt in c['pts']) / len(c['pts']),
+                           sum(pt[2] for pt in c['pts']) / len(c['pts']))
+
+        return len(empty)
+
+
+class MiniBatchKMeans(object):
+    """A class for performing mini-batch k-means clustering on an image.
+
+    Mini-batch k-means bounds the cost of clustering very large images. Rather
+    than passing over every point in the image on every iteration, cluster
+    centroids are updated from small random samples of points, with each
+    centroid's learning rate shrinking as it absorbs more points. Initial
+    cluster centroids are seeded with k-means++ on a random sample of the
+    image, so no step of the algorithm needs a full pass over the image.
+
+    http://www.eecs.tufts.edu/~dsculley/papers/fastkmeans.pdf
+    """
+
+    def __init__(self, im, k, batch_size=1024, max_iter=100, tol=0.5,
+                 backend='auto', seed=None):
+        """Initializes MiniBatchKMeans with an image and clustering options.
+
+        Args:
+            im: An image as a list of RGB tuples, a PixelBuffer or an (N, 3)
+                NumPy array.
+            k: The number of clusters to generate.
+            batch_size: Optional int for the number of points sampled per
+                iteration, defaults to 1024.
+            max_iter: Optional int for the maximum number of iterations,
+                defaults to 100.
+            tol: Optional float for early stopping, which happens once no
+                cluster centroid moves further than tol in an iteration,
+                defaults to 0.5.
+            backend: Optional string for backend selection, either 'numpy',
+                'python', or 'auto' (the default), which uses NumPy when it
+                is installed.
+            seed: Optional int or random.Random instance used as the source
+                of randomness, defaults to None (seeded from the system).
+
+        Raises:
+            ValueError: If an empty image is passed (i.e. []), if the desired
+                amount of clusters is less than two, if batch_size or
+                max_iter are less than one, or if an invalid backend is
+                selected.
+            ImportError: If the 'numpy' backend is selected but NumPy is not
+                installed.
+        """
+        if len(im) == 0:
+            raise ValueError('An empty image has been passed')
+        elif k < 2:
+            raise ValueError('The number of clusters must be at least two')
+        elif batch_size < 1 or max_iter < 1:
+            raise ValueError('The batch size and maximum number of '
+                             'iterations must be at least one')
+        elif backend not in ('auto', 'numpy', 'python'):
+            raise ValueError('Invalid backend selected')
+        elif backend == 'numpy' and np is None:
+            raise ImportError('The numpy backend requires NumPy')
+
+        if backend == 'auto':
+            backend = 'python' if np is None else 'numpy'
+
+        self.im = im
+        self.k = k
+        self.batch_size = batch_size
+        self.max_iter = max_iter
+        self.tol = tol
+        self.backend = backend
+        self.n_iter = 0
+        self.clusters = []
+        if isinstance(seed, random.Random):
+            self._rng = seed
+        else:
+            self._rng = random.Random(seed)
+
+        if backend == 'numpy':
+            self._pts = as_rgb_array(im, np.float32)
+        else:
+            self._pts = None
+            if isinstance(im, PixelBuffer) and im.channels != 3:
+                self.im = [px[:3] for px in im]
+
+    def get_colors(self, prec=0):
+        """Returns a list of k colors that are most representative of the image.
+
+        Args:
+            prec: An optional int for RGB value decimal precision,
+                defaults to 0.
+
+        Returns:
+            A list of k RGB tuples.
+        """
+        self._init_centroids()
+        for self.n_iter in range(1, self.max_iter + 1):
+            if self._step() <= self.tol:
+                break
+
+        return [tuple(round(x, prec) for x in c['cc']) for c in self.clusters]
+
+    def _init_centroids(self):
+        """Seeds cluster centroids with k-means++ on a random sample."""
+
+        n = len(self.im)
+        if n <= 3 * self.batch_size:
+            sample = list(range(n))
+        else:
+            sample = [self._rng.randrange(n)
+                      for _ in range(3 * self.batch_size)]
+
+        if self._pts is not None:
+            seeder = KMeans(self._pts[sample], self.k, backend='numpy',
+                            seed=self._rng)
+        else:
+            seeder = KMeans([self.im[i] for i in sample], self.k,
+                            backend='python', seed=self._rng)
+        seeder._kpp_init()
+
+        self.clusters = [{'cc': tuple(c['cc']), 'count': 0}
+                         for c in seeder.clusters]
+
+    def _step(self):
+        """Updates cluster centroids from one random batch of points.
+
+        Each cluster centroid moves to the running mean of every point it has
+        been assigned so far, which is the same as giving the centroid a
+        learning rate of one over its point count for each new point.
+
+        Returns:
+            The largest distance moved by a cluster centroid.
+        """
+        n = len(self.im)
+        batch = [self._rng.randrange(n) for _ in range(self.batch_size)]
+        k = len(self.clusters)
+
+        if self._pts is not None:
+            pts = self._pts[batch]
+            labels, _ = nearest_centroids(pts,
+                                          [c['cc'] for c in self.clusters])
+            counts = np.bincount(labels, minlength=k).tolist()
+            sums = np.stack([np.bincount(labels, weights=pts[:, x],
+                                         minlength=k)
+                             for x in range(0, 3)], axis=1).tolist()
+        else:
+            counts = [0] * k
+            sums = [[0, 0, 0] for _ in range(k)]
+            for i in batch:
+                pt = self.im[i]
+                min_dist = float('inf')    # For first comparison
+                min_index = 0
+                for j, c in enumerate(self.clusters):
+                    dist = sq_euclid_dist(c['cc'], pt)
+                    if dist < min_dist:
+                        min_dist = dist
+                        min_index = j
+                counts[min_index] += 1
+                for x in range(0, 3):
+                    sums[min_index][x] += pt[x]
+
+        shift = 0
+        for c, m, s in zip(self.clusters, counts, sums):
+            if m == 0:
+                continue
+            occ = c['cc']
+            c['count'] += m
+            c['cc'] = tuple(occ[x] + (s[x] - m * occ[x]) / c['count']
+                            for x in range(0, 3))
+            shift = max(shift, euclid_dist(occ, c['cc']))
+
+        return shift
@@ -0,0 +1,490 @@
+import hashlib
+import os
+import tempfile
+from conversions import (hex2rgb_many, rgb2cmyk_many, rgb2hsl_many,
+                         rgb2hsv_many)
+from pixels import PixelBuffer, as_rgb_array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Bumped whenever the conversions or the table layout change, so that stale
+# tables cached on disk are never loaded.
+_LUT_VERSION = 1
+
+# Number of colors converted at a time while building a table
+_CHUNK = 1 << 20
+
+# Number of cell and palette entry pairs, or of color and candidate pairs,
+# compared at a time while building a palette table
+_PAIRS = 1 << 20
+
+# For each color space: the batched conversion, and the scale each channel
+# is stored at. Values are kept as integers at the conversions' default
+# precisions (whole degrees of hue, thousandths otherwise) in a uint16.
+_SPACES = {
+    'cmyk': (rgb2cmyk_many, (1000, 1000, 1000, 1000)),
+    'hsl': (rgb2hsl_many, (1, 1000, 1000)),
+    'hsv': (rgb2hsv_many, (1, 1000, 1000)),
+}
+
+
+def default_cache_dir():
+    """Returns the directory that lookup tables are cached in by default.
+
+    The PYPALETTE_CACHE_DIR environment variable takes precedence over
+    ~/.cache/pypalette.
+    """
+    return os.environ.get('PYPALETTE_CACHE_DIR', os.path.join(
+        os.path.expanduser('~'), '.cache', 'pypalette'))
+
+
+class ColorLUT(object):
+    """A lookup table for converting 8-bit RGB colors into another space.
+
+    With 8 bits per channel there are only 2^24 RGB colors, so every
+    conversion can be computed ahead of time and stored in a table indexed
+    by the packed color (r << 16 | g << 8 | b). Converting an image is then
+    a single gather from the table. Results match rgb2hsl, rgb2hsv and
+    rgb2cmyk at their default precisions exactly.
+
+    A full table is written to disk under a versioned filename the first
+    time it is built, and afterwards memory-mapped, so that worker processes
+    share one read-only copy instead of rebuilding it. A lazy table instead
+    converts each color the first time it is looked up, and is stored in
+    blocks of 512 neighbouring colors (8 per channel) that are only
+    allocated once one of their colors is, so its memory grows with the
+    colors actually seen rather than all 2^24. This suits short-lived
+    processes that only see a few images.
+
+    Note: rgb2hex needs no 2^24 entry table, see rgb2hex_many.
+    """
+
+    def __init__(self, space, lazy=False, cache_dir=None):
+        """Initializes ColorLUT by loading, building or allocating its table.
+
+        Args:
+            space: The color space to convert into, one of 'hsl', 'hsv' or
+                'cmyk'.
+            lazy: Optional bool for filling the table on demand, in memory,
+                instead of all at once, defaults to False.
+            cache_dir: Optional directory for the cached table file,
+                defaults to default_cache_dir(). Pass False to neither read
+                nor write a cached table.
+
+        Raises:
+            ValueError: If an invalid color space is selected.
+            ImportError: If NumPy is not installed.
+        """
+        if space not in _SPACES:
+            raise ValueError('Invalid color space selected')
+        elif np is None:
+            raise ImportError('ColorLUT requires NumPy')
+
+        self.space = space
+        self.lazy = lazy
+        self._convert, scales = _SPACES[space]
+        self._scales = np.array(scales, dtype=np.float64)
+
+        if lazy:
+            self.table = None
+            self._slots = np.full(1 << 15, -1, dtype=np.int64)
+            self._data = np.empty((0, len(scales)), dtype=np.uint16)
+            self._filled = np.empty(0, dtype=bool)
+            self._used = 0    # Number of blocks allocated
+        elif cache_dir is False:
+            self.table = self._build()
+        else:
+            self.table = self._load(cache_dir or default_cache_dir())
+
+    def convert(self, im):
+        """Converts an image's colors with table lookups.
+
+        Args:
+            im: An image as a PixelBuffer, an (N, 3) NumPy array or a list
+                of RGB tuples, with integer values on the interval [0, 255].
+
+        Returns:
+            The converted colors as a PixelBuffer of doubles if a
+            PixelBuffer was given, otherwise as an (N, C) NumPy array, the
+            same as the matching batched conversion function.
+
+        Raises:
+            ValueError: If one or more RGB values are outside [0, 255] or
+                are not integers.
+        """
+        keys = pack_rgb(im)
+
+        if self.lazy:
+            out = self._lookup_lazy(keys) / self._scales
+        else:
+            out = self.table[keys] / self._scales
+        if isinstance(im, PixelBuffer):
+            return PixelBuffer(out, im.width, im.height, out.shape[1])
+        return out
+
+    def _lookup_lazy(self, keys):
+        """Looks up packed colors in the lazy table, filling it as needed.
+
+        Args:
+            keys: An array of packed colors.
+
+        Returns:
+            An (N, C) uint16 NumPy array of the colors' table entries.
+        """
+        keys = keys.astype(np.int64)
+        r, g, b = keys >> 16, keys >> 8 & 255, keys & 255
+        blocks = (r >> 3) << 10 | (g >> 3) << 5 | (b >> 3)
+
+        new = np.unique(blocks[self._slots[blocks] < 0])
+        if new.size:
+            self._grow(self._used + new.size)
+            self._slots[new] = np.arange(self._used, self._used + new.size)
+            self._used += new.size
+
+        rows = self._slots[blocks] << 9 | (r & 7) << 6 | (g & 7) << 3 | (b & 7)
+        missing = ~self._filled[rows]
+        if missing.any():
+            rows_missing, first = np.unique(rows[missing], return_index=True)
+            self._data[rows_missing] = self._encode(
+                unpack_rgb(keys[missing][first]))
+            self._filled[rows_missing] = True
+
+        return self._data[rows]
+
+    def _grow(self, n_blocks):
+        """Makes room for at least n_blocks blocks in the lazy table."""
+
+        capacity = len(self._filled) >> 9
+        if n_blocks <= capacity:
+            return
+
+        size = max(n_blocks, 2 * capacity) << 9
+        data = np.empty((size, self._data.shape[1]), dtype=np.uint16)
+        filled = np.zeros(size, dtype=bool)
+        data[:len(self._data)] = self._data
+        filled[:len(self._filled)] = self._filled
+        self._data, self._filled = data, filled
+
+    def _encode(self, rgb):
+        """Converts colors and scales them to the table's integer format."""
+
+        return np.rint(self._convert(rgb) * self._scales).astype(np.uint16)
+
+    def _build(self):
+        """Converts all 2^24 RGB colors into a new table."""
+
+        table = np.empty((1 << 24, len(self._scales)), dtype=np.uint16)
+        for start in range(0, 1 << 24, _CHUNK):
+            keys = np.arange(start, start + _CHUNK, dtype=np.uint32)
+            table[start:start + _CHUNK] = self._encode(unpack_rgb(keys))
+        return table
+
+    def _load(self, cache_dir):
+        """Memory-maps the cached table, building and saving it if needed."""
+
+        path = os.path.join(cache_dir, 'pypalette-{}-lut-v{}.npy'.format(
+            self.space, _LUT_VERSION))
+        return _load_cached(path, self._build)
+
+
+class PaletteLUT(object):
+    """A lookup table from 8-bit RGB colors to their nearest palette entry.
+
+    For a fixed palette, the nearest entry to a color (by Euclidean distance
+    in RGB) depends only on the color, so it can be looked up instead of
+    searched for. This inverse colormap divides the RGB cube into cells of
+    2^(3 * (8 - bits)) colors each, 2^15 cells with 5 bits or 2^18 with 6.
+
+    Each cell is resolved while building the table. The distance from every
+    palette entry to the nearest and farthest corner of the cell is found,
+    and only entries whose nearest corner is closer than some entry's
+    farthest one can be nearest to anything in the cell. When a single
+    candidate is left, the whole cell maps to it. Otherwise every color in
+    the cell is compared against the candidates exactly, and the cell keeps
+    a block of per-color entries if they turn out to differ. Mapping a color
+    then costs one lookup, or two in a cell with a block.
+
+    Like ColorLUT's, the tables are cached on disk, keyed by the palette colors
+    and bits, and memory-mapped.
+
+    http://www.cs.cmu.edu/~ph/ciq_thesis
+    """
+
+    def __init__(self, colors, bits=6, cache_dir=None):
+        """Initializes PaletteLUT by loading or building its tables.
+
+        Args:
+            colors: A dict of color names to Hex strings or RGB tuples (such
+                as color_lists.sp_pbt), or a list of Hex strings or RGB
+                tuples, in which case the names are their indices.
+            bits: Optional int for the number of bits per channel that
+                select a cell, defaults to 6 (2^18 cells).
+            cache_dir: Optional directory for the cached table files,
+                defaults to default_cache_dir(). Pass False to neither read
+                nor write cached tables.
+
+        Raises:
+            ValueError: If an empty palette is passed or if bits is outside
+                [1, 8].
+            ImportError: If NumPy is not installed.
+        """
+        if len(colors) == 0:
+            raise ValueError('An empty palette has been passed')
+        elif not 1 <= bits <= 8:
+            raise ValueError('The number of bits must be on [1, 8]')
+        elif np is None:
+            raise ImportError('PaletteLUT requires NumPy')
+
+        if isinstance(colors, dict):
+            self.names = list(colors)
+            values = list(colors.values())
+        else:
+            self.names = list(range(0, len(colors)))
+            values = list(colors)
+
+        if all(isinstance(value, str) for value in values):
+            values = hex2rgb_many(values)
+        self.colors = np.array([value[:3] for value in values],
+                               dtype=np.uint8)
+        self.bits = bits
+
+        if cache_dir is False:
+            self.cells, self.blocks = self._build()
+        else:
+            digest = hashlib.sha1(self.colors.tobytes()).hexdigest()
+            prefix = os.path.join(cache_dir or default_cache_dir(),
+                                  'pypalette-palette-{}-{}-lut-v{}'.format(
+                                      digest[:16], bits, _LUT_VERSION))
+
+            # Both tables come from one build, which is only run if needed
+            built = []
+
+            def build(i):
+                if not built:
+                    built.extend(self._build())
+                return built[i]
+
+            self.cells = _load_cached(prefix + '-cells.npy',
+                                      lambda: build(0))
+            self.blocks = _load_cached(prefix + '-blocks.npy',
+                                       lambda: build(1))
+
+    def lookup(self, im):
+        """Finds the index of the nearest palette entry for every color.
+
+        Args:
+            im: An image as a PixelBuffer, an (N, 3) NumPy array or a list
+                of RGB tuples, with integer values on the interval [0, 255].
+
+        Returns:
+            An (N,) NumPy array of palette indices. Ties go to the entry
+            that comes first in the palette.
+
+        Raises:
+            ValueError: If one or more RGB values are outside [0, 255] or
+                are not integers.
+        """
+        keys = pack_rgb(im).astype(np.int64)
+        bits, shift = self.bits, 8 - self.bits
+        r, g, b = keys >> 16, (keys >> 8) & 255, keys & 255
+
+        # Each channel's high bits select the cell, and its low bits the
+        # color within the cell's block
+        idx = self.cells[(r >> shift) << (2 * bits) | (g >> shift) << bits |
+                         (b >> shift)].astype(np.int64)
+
+        k = len(self.colors)
+        amb = np.flatnonzero(idx >= k)
+        if amb.size:
+            m = (1 << shift) - 1
+            sub = ((r[amb] & m) << (2 * shift) | (g[amb] & m) << shift |
+                   (b[amb] & m))
+            idx[amb] = self.blocks[(idx[amb] - k) << (3 * shift) | sub]
+
+        return idx
+
+    def nearest_many(self, im):
+        """Returns the names of the nearest palette entries to many colors.
+
+        Args:
+            im: An image as a PixelBuffer, an (N, 3) NumPy array or a list
+                of RGB tuples, with integer values on the interval [0, 255].
+
+        Returns:
+            A list of the names of the nearest palette entries.
+        """
+        return [self.names[i] for i in self.lookup(im).tolist()]
+
+    def remap(self, im):
+        """Replaces every color in an image with its nearest palette entry.
+
+        Args:
+            im: An image as a PixelBuffer, an (N, 3) NumPy array or a list
+                of RGB tuples, with integer values on the interval [0, 255].
+
+        Returns:
+            The remapped image as a 3-channel PixelBuffer of the same size
+            if a PixelBuffer was given, otherwise as an (N, 3) uint8 NumPy
+            array.
+        """
+        out = self.colors[self.lookup(im)]
+        if isinstance(im, PixelBuffer):
+            return PixelBuffer(out, im.width, im.height, 3)
+        return out
+
+    def _build(self):
+        """Resolves every cell into a palette entry or a block of entries.
+
+        Returns:
+            A tuple of a uint32 NumPy array of the cells, and a flat array
+            of the blocks. A cell holds either its palette index, or k plus
+            the index of its block.
+        """
+        bits, shift = self.bits, 8 - self.bits
+        side = 1 << shift
+        pal = self.colors.astype(np.int64)
+        k = len(pal)
+
+        ids = np.arange(1 << (3 * bits))
+        mask = (1 << bits) - 1
+        lows = np.stack([ids >> (2 * bits), (ids >> bits) & mask, ids & mask],
+                        axis=1) * side
+        offsets = np.indices((side, side, side)).reshape(3, -1).T
+
+        cells = np.empty(len(ids), dtype=np.uint32)
+        blocks = []
+        step = max(1, _PAIRS // k)
+        for start in range(0, len(ids), step):
+            lo = lows[start:start + step, np.newaxis, :]
+            hi = lo + side - 1
+
+            # Squared distances to the nearest and farthest cell corners
+            gap = np.maximum(lo - pal, 0) + np.maximum(pal - hi, 0)
+            near = (gap ** 2).sum(axis=2)
+            far = (np.maximum(np.abs(pal - lo), np.abs(pal - hi)) ** 2)
+            cand = near <= far.sum(axis=2).min(axis=1)[:, np.newaxis]
+
+            count = cand.sum(axis=1)
+            single = np.flatnonzero(count == 1)
+            cells[start + single] = cand[single].argmax(axis=1)
+
+            multi = np.flatnonzero(count > 1)
+            if multi.size:
+                labels = self._refine(lows[start + multi], cand[multi],
+                                      pal, offsets)
+                uniform = (labels == labels[:, :1]).all(axis=1)
+                cells[start + multi[uniform]] = labels[uniform, 0]
+                mixed = multi[~uniform]
+                cells[start + mixed] = k + sum(map(len, blocks)) + np.arange(
+                    len(mixed))
+                blocks.append(labels[~uniform])
+
+        # Blocks only hold palette indices, so they take the smallest type
+        blocks = (np.concatenate(blocks).ravel() if blocks else
+                  np.empty(0, dtype=np.int64))
+        return cells, blocks.astype(np.min_scalar_type(k - 1))
+
+    def _refine(self, lows, cand, pal, offsets):
+        """Finds the exact nearest candidate for every color in some cells.
+
+        Args:
+            lows: An (M, 3) array of the cells' lowest corners.
+            cand: An (M, k) bool array of each cell's candidate entries.
+            pal: A (k, 3) int64 array of the palette colors.
+            offsets: An (S, 3) array of the colors' offsets within a cell.
+
+        Returns:
+            An (M, S) array of palette indices.
+        """
+        k = len(pal)
+        m = cand.sum(axis=1).max()
+
+        # Candidate indices in ascending order, padded with an entry that is
+        # never nearest, so that ties still go to the lowest index
+        idx = np.sort(np.where(cand, np.arange(k), k), axis=1)[:, :m]
+        padded = np.vstack([pal, np.full((1, 3), 1 << 20, dtype=np.int64)])
+
+        labels = np.empty((len(lows), len(offsets)), dtype=np.int64)
+        step = max(1, _PAIRS // (len(offsets) * m))
+        for start in range(0, len(lows), step):
+            colors = (lows[start:start + step, np.newaxis, np.newaxis, :] +
+                      offsets[np.newaxis, :, np.newaxis, :])
+            d = ((colors - padded[idx[start:start + step]][:, np.newaxis])
+                 ** 2).sum(axis=3)
+            labels[start:start + step] = np.take_along_axis(
+                idx[start:start + step], d.argmin(axis=2), axis=1)
+        return labels
+
+
+def pack_rgb(im):
+    """Packs 8-bit RGB colors into 24-bit integers (r << 16 | g << 8 | b).
+
+    Args:
+        im: An image as a PixelBuffer, an (N, 3) NumPy array or a list of
+            RGB tuples, with integer values on the interval [0, 255]. Any
+            alpha channel is ignored.
+
+    Returns:
+        An (N,) uint32 NumPy array of packed colors.
+
+    Raises:
+        ValueError: If one or more RGB values are outside [0, 255] or are
+            not integers.
+    """
+    if not isinstance(im, (PixelBuffer, np.ndarray)):
+        im = [px[:3] for px in im]
+    rgb = as_rgb_array(im)
+
+    if rgb.dtype != np.uint8 and len(rgb):
+        if rgb.min() < 0 or rgb.max() > 255:
+            raise ValueError('One or more RGB values are outside [0, 255]')
+        elif (rgb != np.floor(rgb)).any():
+            raise ValueError('One or more RGB values are not integers')
+
+    rgb = rgb.astype(np.uint32)
+    return (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+
+
+def unpack_rgb(keys):
+    """Unpacks 24-bit integers into 8-bit RGB colors.
+
+    Args:
+        keys: An array of packed colors.
+
+    Returns:
+        An (N, 3) uint8 NumPy array of RGB values.
+    """
+    keys = np.asarray(keys, dtype=np.uint32)
+    return np.stack([keys >> 16, (keys >> 8) & 255, keys & 255],
+                    axis=1).astype(np.uint8)
+
+
+def _load_cached(path, build):
+    """Memory-maps a cached table, building and saving it if needed.
+
+    The table is written to a temporary file that is then renamed into
+    place, so concurrent processes never load a partially written one.
+
+    Args:
+        path: The path of the cached table file.
+        build: A function that returns the table as a NumPy array.
+
+    Returns:
+        The table as a read-only memory-mapped NumPy array.
+    """
+    cache_dir = os.path.dirname(path)
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.npy')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, build())
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    return np.load(path, mmap_mode='r')
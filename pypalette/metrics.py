@@ -0,0 +1,278 @@
+from math import atan2, cos, degrees, exp, radians, sin, sqrt
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 25 ** 7, the chroma at which CIEDE2000's a* correction is halved
+_POW25_7 = 25.0 ** 7
+
+
+def redmean(c, pt):
+    """Calculates the "redmean" weighted RGB distance between two colors.
+
+    The squared channel differences are weighted by the mean red value of
+    the two colors, which is a cheap approximation of perceived difference
+    that needs no conversion out of RGB.
+
+    http://www.compuphase.com/cmetric.htm
+
+    Args:
+        c: The first color as an RGB tuple.
+        pt: The second color as an RGB tuple.
+
+    Returns:
+        The redmean distance between the two colors.
+    """
+    return sqrt(sq_redmean(c, pt))
+
+
+def cie76(c, pt):
+    """Calculates the CIE76 color difference between two Lab colors.
+
+    CIE76 is the Euclidean distance in Lab.
+
+    Args:
+        c: The first color as a Lab tuple.
+        pt: The second color as a Lab tuple.
+
+    Returns:
+        The CIE76 color difference (Delta E) between the two colors.
+    """
+    dl, da, db = c[0] - pt[0], c[1] - pt[1], c[2] - pt[2]
+    return sqrt(dl * dl + da * da + db * db)
+
+
+def cie94(c, pt):
+    """Calculates the CIE94 color difference between two Lab colors.
+
+    The graphic arts weighting factors are used. CIE94 is not symmetric, and
+    the first color is taken as the reference.
+
+    http://en.wikipedia.org/wiki/Color_difference#CIE94
+
+    Args:
+        c: The reference color as a Lab tuple.
+        pt: The sample color as a Lab tuple.
+
+    Returns:
+        The CIE94 color difference (Delta E) between the two colors.
+    """
+    return sqrt(sq_cie94(c, pt))
+
+
+def ciede2000(c, pt):
+    """Calculates the CIEDE2000 color difference between two Lab colors.
+
+    http://www2.ece.rochester.edu/~gsharma/ciede2000/ciede2000noteCRNA.pdf
+
+    Args:
+        c: The first color as a Lab tuple.
+        pt: The second color as a Lab tuple.
+
+    Returns:
+        The CIEDE2000 color difference (Delta E) between the two colors.
+    """
+    return sqrt(max(sq_ciede2000(c, pt), 0))
+
+
+def sq_redmean(c, pt):
+    """Calculates the squared redmean distance between two RGB colors.
+
+    Args:
+        c: The first color as an RGB tuple.
+        pt: The second color as an RGB tuple.
+
+    Returns:
+        The squared redmean distance between the two colors.
+    """
+    r = (c[0] + pt[0]) / 2
+    dr, dg, db = c[0] - pt[0], c[1] - pt[1], c[2] - pt[2]
+    return ((2 + r / 256) * (dr * dr) + 4 * (dg * dg) +
+            (2 + (255 - r) / 256) * (db * db))
+
+
+def sq_cie94(c, pt):
+    """Calculates the squared CIE94 color difference between two colors.
+
+    Args:
+        c: The reference color as a Lab tuple.
+        pt: The sample color as a Lab tuple.
+
+    Returns:
+        The squared CIE94 color difference.
+    """
+    c1 = sqrt(c[1] * c[1] + c[2] * c[2])
+    c2 = sqrt(pt[1] * pt[1] + pt[2] * pt[2])
+    dl, da, db = c[0] - pt[0], c[1] - pt[1], c[2] - pt[2]
+    dc = c1 - c2
+    dh_sq = max(da * da + db * db - dc * dc, 0)
+    sc = 1 + 0.045 * c1
+    sh = 1 + 0.015 * c1
+
+    return dl * dl + (dc / sc) * (dc / sc) + dh_sq / (sh * sh)
+
+
+def sq_ciede2000(c, pt):
+    """Calculates the squared CIEDE2000 color difference between two colors.
+
+    Args:
+        c: The first color as a Lab tuple.
+        pt: The second color as a Lab tuple.
+
+    Returns:
+        The squared CIEDE2000 color difference.
+    """
+    l1, a1, b1 = c[0], c[1], c[2]
+    l2, a2, b2 = pt[0], pt[1], pt[2]
+
+    # a* is stretched for low chroma colors
+    c_bar = (sqrt(a1 * a1 + b1 * b1) + sqrt(a2 * a2 + b2 * b2)) / 2
+    g = 0.5 * (1 - sqrt(_pow7(c_bar) / (_pow7(c_bar) + _POW25_7)))
+    a1, a2 = (1 + g) * a1, (1 + g) * a2
+
+    c1, c2 = sqrt(a1 * a1 + b1 * b1), sqrt(a2 * a2 + b2 * b2)
+    h1, h2 = degrees(atan2(b1, a1)) % 360, degrees(atan2(b2, a2)) % 360
+
+    # Hue difference and mean hue, taking the shorter way around the circle
+    if c1 * c2 == 0:
+        dh, h_bar = 0, h1 + h2
+    else:
+        dh = h2 - h1
+        if dh > 180:
+            dh -= 360
+        elif dh < -180:
+            dh += 360
+        if abs(h1 - h2) <= 180:
+            h_bar = (h1 + h2) / 2
+        elif h1 + h2 < 360:
+            h_bar = (h1 + h2 + 360) / 2
+        else:
+            h_bar = (h1 + h2 - 360) / 2
+
+    l_bar = (l1 + l2) / 2 - 50
+    c_bar = (c1 + c2) / 2
+    t = (1 - 0.17 * cos(radians(h_bar - 30)) +
+         0.24 * cos(radians(2 * h_bar)) +
+         0.32 * cos(radians(3 * h_bar + 6)) -
+         0.2 * cos(radians(4 * h_bar - 63)))
+    e = (h_bar - 275) / 25
+
+    sl = 1 + 0.015 * (l_bar * l_bar) / sqrt(20 + l_bar * l_bar)
+    sc = 1 + 0.045 * c_bar
+    sh = 1 + 0.015 * c_bar * t
+    rt = (-2 * sqrt(_pow7(c_bar) / (_pow7(c_bar) + _POW25_7)) *
+          sin(radians(60 * exp(-(e * e)))))
+
+    dl = (l2 - l1) / sl
+    dc = (c2 - c1) / sc
+    dh = 2 * sqrt(c1 * c2) * sin(radians(dh) / 2) / sh
+
+    return dl * dl + dc * dc + dh * dh + rt * dc * dh
+
+
+def sq_redmean_array(pts, c):
+    """The NumPy version of sq_redmean, from many points to one.
+
+    Args:
+        pts: An (N, 3) NumPy array of RGB points.
+        c: A single point as an RGB tuple or array.
+
+    Returns:
+        An (N,) array of squared redmean distances.
+    """
+    pts, c = _as_arrays(pts, c)
+    r = (c[0] + pts[:, 0]) / 2
+    dr, dg, db = c[0] - pts[:, 0], c[1] - pts[:, 1], c[2] - pts[:, 2]
+    return ((2 + r / 256) * (dr * dr) + 4 * (dg * dg) +
+            (2 + (255 - r) / 256) * (db * db))
+
+
+def sq_cie94_array(pts, c):
+    """The NumPy version of sq_cie94, from many points to one.
+
+    Args:
+        pts: An (N, 3) NumPy array of Lab points.
+        c: The reference point as a Lab tuple or array.
+
+    Returns:
+        An (N,) array of squared CIE94 color differences.
+    """
+    pts, c = _as_arrays(pts, c)
+    c1 = sqrt(c[1] * c[1] + c[2] * c[2])
+    c2 = np.sqrt(pts[:, 1] * pts[:, 1] + pts[:, 2] * pts[:, 2])
+    dl, da, db = c[0] - pts[:, 0], c[1] - pts[:, 1], c[2] - pts[:, 2]
+    dc = c1 - c2
+    dh_sq = np.maximum(da * da + db * db - dc * dc, 0)
+    sc = 1 + 0.045 * c1
+    sh = 1 + 0.015 * c1
+
+    return dl * dl + (dc / sc) * (dc / sc) + dh_sq / (sh * sh)
+
+
+def sq_ciede2000_array(pts, c):
+    """The NumPy version of sq_ciede2000, from many points to one.
+
+    Args:
+        pts: An (N, 3) NumPy array of Lab points.
+        c: A single point as a Lab tuple or array.
+
+    Returns:
+        An (N,) array of squared CIEDE2000 color differences.
+    """
+    pts, c = _as_arrays(pts, c)
+    l1, a1, b1 = c[0], c[1], c[2]
+    l2, a2, b2 = pts[:, 0], pts[:, 1], pts[:, 2]
+
+    c_bar = (sqrt(a1 * a1 + b1 * b1) + np.sqrt(a2 * a2 + b2 * b2)) / 2
+    g = 0.5 * (1 - np.sqrt(_pow7(c_bar) / (_pow7(c_bar) + _POW25_7)))
+    a1, a2 = (1 + g) * a1, (1 + g) * a2
+
+    c1, c2 = np.sqrt(a1 * a1 + b1 * b1), np.sqrt(a2 * a2 + b2 * b2)
+    h1 = np.degrees(np.arctan2(b1, a1)) % 360
+    h2 = np.degrees(np.arctan2(b2, a2)) % 360
+
+    zero = c1 * c2 == 0
+    dh = h2 - h1
+    dh = np.where(dh > 180, dh - 360, np.where(dh < -180, dh + 360, dh))
+    dh[zero] = 0
+    h_sum = h1 + h2
+    h_bar = np.where(np.abs(h1 - h2) <= 180, h_sum / 2,
+                     np.where(h_sum < 360, (h_sum + 360) / 2,
+                              (h_sum - 360) / 2))
+    h_bar[zero] = h_sum[zero]
+
+    l_bar = (l1 + l2) / 2 - 50
+    c_bar = (c1 + c2) / 2
+    t = (1 - 0.17 * np.cos(np.radians(h_bar - 30)) +
+         0.24 * np.cos(np.radians(2 * h_bar)) +
+         0.32 * np.cos(np.radians(3 * h_bar + 6)) -
+         0.2 * np.cos(np.radians(4 * h_bar - 63)))
+    e = (h_bar - 275) / 25
+
+    sl = 1 + 0.015 * (l_bar * l_bar) / np.sqrt(20 + l_bar * l_bar)
+    sc = 1 + 0.045 * c_bar
+    sh = 1 + 0.015 * c_bar * t
+    rt = (-2 * np.sqrt(_pow7(c_bar) / (_pow7(c_bar) + _POW25_7)) *
+          np.sin(np.radians(60 * np.exp(-(e * e)))))
+
+    dl = (l2 - l1) / sl
+    dc = (c2 - c1) / sc
+    dh = 2 * np.sqrt(c1 * c2) * np.sin(np.radians(dh) / 2) / sh
+
+    return dl * dl + dc * dc + dh * dh + rt * dc * dh
+
+
+def _pow7(x):
+    """Raises x to the 7th power by multiplication, for scalars and arrays."""
+
+    x2 = x * x
+    return x2 * x2 * x2 * x
+
+
+def _as_arrays(pts, c):
+    """Returns points and a single point as float64 NumPy arrays."""
+
+    return (np.asarray(pts, dtype=np.float64),
+            np.asarray(c, dtype=np.float64))
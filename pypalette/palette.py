@@ -0,0 +1,317 @@
+from array import array
+from conversions import (hex2rgb_many, rgb2cmyk_many, rgb2hex_many, rgb2hsl,
+                         rgb2hsl_many, rgb2hsv_many, rgb2lab_many,
+                         rgb2lch_many, rgb2linear_many, rgb2oklab_many,
+                         rgb2xyz_many)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Typecode of an array of unsigned ints that can hold a packed 24-bit color
+_PACKED = 'I' if array('I').itemsize >= 4 else 'L'
+
+# Color spaces that palettes can be converted into, with their batched
+# conversions from RGB
+_CONVERSIONS = {
+    'cmyk': rgb2cmyk_many,
+    'hex': rgb2hex_many,
+    'hsl': rgb2hsl_many,
+    'hsv': rgb2hsv_many,
+    'lab': rgb2lab_many,
+    'lch': rgb2lch_many,
+    'linear': rgb2linear_many,
+    'oklab': rgb2oklab_many,
+    'xyz': rgb2xyz_many,
+}
+
+# Sort keys for Palette.sort, from a color and its weight, and whether
+# they sort in descending order by default
+_SORT_KEYS = {
+    'weight': (lambda rgb, w: w, True),
+    'hue': (lambda rgb, w: rgb2hsl(rgb)[0], False),
+    'saturation': (lambda rgb, w: rgb2hsl(rgb)[1], False),
+    'lightness': (lambda rgb, w: rgb2hsl(rgb)[2], False),
+}
+
+
+class Palette(object):
+    """A weighted list of colors, such as the colors of an image and the
+    fraction of its pixels that each one represents.
+
+    Colors are stored as packed 24-bit ints (r << 16 | g << 8 | b) in an
+    array, and their weights as single precision floats in another, so a
+    palette takes a few bytes per color. Colors can optionally be named, and
+    are looked up by index or by name in constant time.
+
+    Palettes are immutable: sorting, taking the heaviest colors and merging
+    all return new palettes.
+    """
+
+    __slots__ = ('_colors', '_weights', '_names', '_index')
+
+    def __init__(self, colors, weights=None, names=None):
+        """Initializes Palette with colors and optional weights and names.
+
+        Args:
+            colors: A dict of color names to Hex strings or RGB tuples (such
+                as color_lists.css3), or a list of Hex strings or RGB tuples.
+                RGB values are rounded to integers.
+            weights: Optional list of one weight per color, such as pixel
+                counts or fractions, defaults to equal fractions of one.
+            names: Optional list of one unique name per color, which is taken
+                from the keys when a dict is given.
+
+        Raises:
+            ValueError: If the number of weights or names does not match the
+                number of colors, if the names are not unique, or if one or
+                more RGB values are outside [0, 255].
+        """
+        if isinstance(colors, dict):
+            names = list(colors)
+            colors = list(colors.values())
+        else:
+            colors = list(colors)
+
+        if colors and all(isinstance(c, str) for c in colors):
+            colors = hex2rgb_many(colors)
+        if weights is None:
+            weights = [1 / len(colors)] * len(colors) if colors else []
+
+        if len(weights) != len(colors):
+            raise ValueError('The number of weights does not match the '
+                             'number of colors')
+        elif names is not None and len(names) != len(colors):
+            raise ValueError('The number of names does not match the '
+                             'number of colors')
+
+        packed = array(_PACKED)
+        for c in colors:
+            r, g, b = int(round(c[0])), int(round(c[1])), int(round(c[2]))
+            if not (0 <= r <= 255 and 0 <= g <= 255 and 0 <= b <= 255):
+                raise ValueError('One or more RGB values are outside [0, 255]')
+            packed.append(r << 16 | g << 8 | b)
+
+        self._colors = packed
+        self._weights = array('f', weights)
+        self._names = None if names is None else list(names)
+        self._index = None
+        if names is not None:
+            self._index = {name: i for i, name in enumerate(self._names)}
+            if len(self._index) != len(self._names):
+                raise ValueError('The color names are not unique')
+
+    def __len__(self):
+        return len(self._colors)
+
+    def __getitem__(self, key):
+        """Returns a color by index or name, or a slice as a Palette."""
+
+        if isinstance(key, slice):
+            return self._take(range(*key.indices(len(self))))
+        return _unpack(self._colors[self._position(key)])
+
+    def __iter__(self):
+        return (_unpack(c) for c in self._colors)
+
+    def __contains__(self, name):
+        return self._index is not None and name in self._index
+
+    def __repr__(self):
+        return 'Palette({})'.format(', '.join(
+            '{} {:.3g}'.format(hx, w)
+            for hx, w in zip(self.hex(), self._weights)))
+
+    @property
+    def colors(self):
+        """The colors as a list of RGB tuples."""
+
+        return list(self)
+
+    @property
+    def weights(self):
+        """The weights as a list of floats."""
+
+        return self._weights.tolist()
+
+    @property
+    def names(self):
+        """The names as a list, or None if the colors are not named."""
+
+        return None if self._names is None else list(self._names)
+
+    def weight(self, key):
+        """Returns the weight of a color by index or name."""
+
+        return self._weights[self._position(key)]
+
+    def hex(self):
+        """Returns the colors as a list of RGB Hex strings."""
+
+        return rgb2hex_many(self._colors.tolist())
+
+    def percentages(self, prec=1):
+        """Returns the weights as percentages of their total.
+
+        Args:
+            prec: Optional int for percentage decimal precision, defaults
+                to 1.
+
+        Returns:
+            A list of percentages, one per color.
+        """
+        total = sum(self._weights)
+        if total == 0:
+            return [0.0] * len(self)
+        return [round(100 * w / total, prec) for w in self._weights]
+
+    def convert(self, space, *args, **kwargs):
+        """Converts every color into another color space at once.
+
+        Args:
+            space: The color space, either 'cmyk', 'hex', 'hsl', 'hsv',
+                'lab', 'lch', 'linear', 'oklab' or 'xyz'.
+            *args: Optional positional arguments, such as precisions, passed
+                on to the batched conversion.
+            **kwargs: Optional keyword arguments passed on to the batched
+                conversion.
+
+        Returns:
+            The converted colors as returned by the batched conversion (such
+            as conversions.rgb2lab_many): an (N, 3) NumPy array when NumPy
+            is installed, a list of Hex strings for 'hex'.
+
+        Raises:
+            ValueError: If an invalid color space is selected.
+        """
+        if space not in _CONVERSIONS:
+            raise ValueError('Invalid color space selected')
+        elif space == 'hex':
+            return self.hex()
+
+        if np is not None:
+            packed = np.frombuffer(self._colors, dtype=np.uint32
+                                   if self._colors.itemsize == 4 else
+                                   np.uint64).astype(np.int64)
+            rgb = np.stack([packed >> 16, packed >> 8 & 255, packed & 255],
+                           axis=1)
+        else:
+            rgb = self.colors
+        return _CONVERSIONS[space](rgb, *args, **kwargs)
+
+    def sort(self, key='weight', reverse=None):
+        """Returns a copy of the palette in sorted order.
+
+        Args:
+            key: Optional string for the sort key, either 'weight' (the
+                default), 'hue', 'saturation', 'lightness' or 'name', or a
+                function of an RGB tuple and its weight.
+            reverse: Optional bool for sorting in descending order, which
+                defaults to True for weights and False otherwise.
+
+        Returns:
+            A sorted Palette. Colors that compare equal keep their order.
+
+        Raises:
+            ValueError: If an invalid sort key is selected, or if the colors
+                are sorted by name but not named.
+        """
+        if key == 'name':
+            if self._names is None:
+                raise ValueError('The colors are not named')
+            keys, descending = self._names, False
+        else:
+            if callable(key):
+                func, descending = key, False
+            elif key in _SORT_KEYS:
+                func, descending = _SORT_KEYS[key]
+            else:
+                raise ValueError('Invalid sort key selected')
+            keys = [func(rgb, w) for rgb, w in zip(self, self._weights)]
+
+        if reverse is None:
+            reverse = descending
+
+        return self._take(sorted(range(0, len(self)), key=keys.__getitem__,
+                                 reverse=reverse))
+
+    def top(self, n):
+        """Returns the n heaviest colors as a new palette.
+
+        Args:
+            n: The number of colors to keep.
+
+        Returns:
+            A Palette of up to n colors, heaviest first. Ties go to the color
+            that comes first.
+        """
+        return self.sort('weight')[:n]
+
+    def merge(self, other):
+        """Merges another palette into a copy of this one.
+
+        Colors found in both palettes have their weights added and keep this
+        palette's name, and the other palette's remaining colors follow.
+
+        Args:
+            other: Another Palette.
+
+        Returns:
+            The merged Palette, which is named only if both palettes are.
+
+        Raises:
+            ValueError: If a name is used for different colors.
+        """
+        positions = {}
+        for i, c in enumerate(self._colors):
+            positions.setdefault(c, i)
+
+        colors = self._colors.tolist()
+        weights = self._weights.tolist()
+        named = self._names is not None and other._names is not None
+        names = list(self._names) if named else None
+
+        for i, (c, w) in enumerate(zip(other._colors, other._weights)):
+            if c in positions:
+                weights[positions[c]] += w
+                continue
+            positions[c] = len(colors)
+            colors.append(c)
+            weights.append(w)
+            if named:
+                names.append(other._names[i])
+
+        return Palette([_unpack(c) for c in colors], weights, names)
+
+    def _position(self, key):
+        """Returns the position of a color given by index or name.
+
+        Raises:
+            IndexError: If an index is out of range.
+            KeyError: If a name is not in the palette.
+        """
+        if isinstance(key, int):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError('Color index out of range')
+            return key
+        elif self._index is None or key not in self._index:
+            raise KeyError(key)
+        return self._index[key]
+
+    def _take(self, positions):
+        """Returns the colors at some positions as a new palette."""
+
+        positions = list(positions)
+        return Palette([_unpack(self._colors[i]) for i in positions],
+                       [self._weights[i] for i in positions],
+                       None if self._names is None else
+                       [self._names[i] for i in positions])
+
+
+def _unpack(c):
+    """Unpacks a 24-bit packed color into an RGB tuple."""
+
+    return c >> 16, c >> 8 & 255, c & 255
@@ -0,0 +1,171 @@
+from array import array
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class PixelBuffer(object):
+    """A compact image stored as one flat buffer of channel values.
+
+    Instead of a list of tuples, which costs upwards of 72 bytes per pixel,
+    the pixels live in a single contiguous buffer: a bytes-like object, an
+    array.array or a NumPy array. 8-bit images use one byte per channel,
+    while 'f' and 'd' buffers hold float channels such as HSV values.
+    Wrapping a buffer never copies it.
+
+    A PixelBuffer behaves like a read-only list of pixel tuples, so it can be
+    passed anywhere an image as a list of RGB tuples is expected.
+    """
+
+    __slots__ = ('data', 'width', 'height', 'channels')
+
+    def __init__(self, data, width=None, height=None, channels=3):
+        """Initializes PixelBuffer with a buffer and its dimensions.
+
+        Args:
+            data: A bytes-like object, array.array or contiguous NumPy array
+                of channel values, with typecode 'B', 'f' or 'd'.
+            width: Optional int for the image width, defaults to the width
+                of a (height, width, channels) NumPy array, or otherwise to
+                the number of pixels (a single row).
+            height: Optional int for the image height, defaults to the
+                number of pixels divided by the width.
+            channels: Optional int for the number of channels per pixel,
+                either 1, 3 (the default) or 4.
+
+        Raises:
+            ValueError: If the number of channels is invalid, if the buffer
+                has an unsupported typecode, or if the buffer size does not
+                match the given dimensions.
+        """
+        mv = memoryview(data)
+        if mv.ndim == 3 and width is None:
+            height, width = mv.shape[:2]
+        if mv.ndim != 1:
+            mv = mv.cast('B').cast(mv.format)
+
+        if channels not in (1, 3, 4):
+            raise ValueError('The number of channels must be 1, 3 or 4')
+        elif mv.format not in ('B', 'f', 'd'):
+            raise ValueError('Unsupported buffer typecode')
+        elif len(mv) % channels:
+            raise ValueError('The buffer size is not a multiple of channels')
+
+        n = len(mv) // channels
+        if width is None:
+            width = n
+        if height is None:
+            height = n // width if width else 0
+        if width * height != n:
+            raise ValueError('The buffer size does not match the dimensions')
+
+        self.data = mv
+        self.width = width
+        self.height = height
+        self.channels = channels
+
+    @classmethod
+    def from_pixels(cls, im, width=None, height=None, typecode='B'):
+        """Packs an image given as a list of tuples into a PixelBuffer.
+
+        Args:
+            im: An image as a list of RGB tuples.
+            width: Optional int for the image width.
+            height: Optional int for the image height.
+            typecode: Optional array typecode, defaults to 'B' (8 bits).
+
+        Returns:
+            A PixelBuffer holding the same pixels.
+        """
+        channels = len(im[0]) if len(im) else 3
+        return cls(array(typecode, chain.from_iterable(im)), width, height,
+                   channels)
+
+    def __len__(self):
+        return len(self.data) // self.channels
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('Pixel index out of range')
+        c = self.channels
+        return tuple(self.data[i * c:i * c + c])
+
+    def __iter__(self):
+        c = self.channels
+        if c == 1:
+            return zip(self.data)
+        return zip(*[self.data[x::c] for x in range(0, c)])
+
+    def __reduce__(self):
+        return (_rebuild, (self.data.format, self.data.tobytes(), self.width,
+                           self.height, self.channels))
+
+    def __repr__(self):
+        return ('PixelBuffer(width={}, height={}, channels={}, typecode={!r})'
+                .format(self.width, self.height, self.channels,
+                        self.data.format))
+
+    def channel(self, x):
+        """Returns one channel of every pixel without copying.
+
+        Args:
+            x: The index of the channel.
+
+        Returns:
+            A memoryview of the channel's values.
+        """
+        return self.data[x::self.channels]
+
+    def as_array(self):
+        """Returns the pixels as an (N, channels) NumPy array view.
+
+        Returns:
+            A NumPy array sharing memory with the buffer.
+
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+        if np is None:
+            raise ImportError('PixelBuffer.as_array requires NumPy')
+        arr = np.frombuffer(self.data, dtype=self.data.format)
+        return arr.reshape(-1, self.channels)
+
+    def tolist(self):
+        """Returns the pixels as a list of tuples.
+
+        Returns:
+            An image as a list of tuples.
+        """
+        return list(self)
+
+
+def as_rgb_array(im, dtype=None):
+    """Returns an image as an (N, 3) NumPy array, without copying if possible.
+
+    Args:
+        im: An image as a list of RGB tuples, a PixelBuffer or a NumPy array.
+        dtype: Optional NumPy dtype for the result, defaults to None (the
+            image's own dtype).
+
+    Returns:
+        An (N, 3) NumPy array of RGB values, dropping any alpha channel.
+    """
+    if isinstance(im, PixelBuffer):
+        arr = im.as_array()
+    else:
+        arr = np.asarray(im)
+    arr = arr.reshape(-1, arr.shape[-1] if arr.ndim > 1 else 3)[:, :3]
+    return arr if dtype is None else arr.astype(dtype, copy=False)
+
+
+def _rebuild(typecode, data, width, height, channels):
+    """Rebuilds a pickled PixelBuffer."""
+
+    return PixelBuffer(array(typecode, data), width, height, channels)
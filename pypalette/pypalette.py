@@ -1,69 +1,329 @@
-from statistics import mean
+from array import array
+from multiprocessing import Pool
 from kmeans import KMeans
+from pixels import PixelBuffer, as_rgb_array
+from stats import ColorHistogram, ColorStats
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Grayscale modes, each with its integer red, green and blue weights and
+# their total (None for lightness, which averages the largest and smallest
+# values instead)
+_GRAY_MODES = {
+    'lightness': (None, 2),
+    'average': ((1, 1, 1), 3),
+    'luminosity': ((21, 72, 7), 100),
+    'rec601': ((77, 150, 29), 256),
+    'rec709': ((54, 183, 19), 256),
+}
+
+# Grayscale lookup tables, built on first use of each mode
+_GRAY_TABLES = {}
 
 
 def average_color(im, prec=0):
     """Returns the average color of an image.
 
-    The calculated average is just a simple arithmetic mean.
+    The calculated average is just a simple arithmetic mean, taken in a
+    single pass with a ColorStats accumulator, so the image can also be a
+    generator of pixels.
 
     Note:
         This function should work with HSV and HSL values too, but I wouldn't
         count on it.
 
     Args:
-        im: An image as a list of RGB tuples.
+        im: An image as an iterable of RGB tuples, a PixelBuffer or an (N, 3)
+            NumPy array.
         prec: Optional int for RGB value decimal precision,
             defaults to 0.
 
     Returns:
         The average color as an RGB tuple.
+
+    Raises:
+        ValueError: If an empty image is passed.
+    """
+    stats = ColorStats(im)
+    if stats.count == 0:
+        raise ValueError('An empty image has been passed')
+
+    return stats.mean(prec)
+
+
+def median_color(im, prec=0):
+    """Returns the median color of an image.
+
+    The median of each channel is taken on its own, from a ColorHistogram of
+    the image, so no pixels are sorted.
+
+    Args:
+        im: An image as an iterable of RGB tuples, a PixelBuffer or an (N, 3)
+            NumPy array, with integer values on the interval [0, 255].
+        prec: Optional int for RGB value decimal precision,
+            defaults to 0.
+
+    Returns:
+        The median color as an RGB tuple.
+
+    Raises:
+        ValueError: If an empty image is passed.
+    """
+    return percentile_color(im, 50, prec)
+
+
+def percentile_color(im, q, prec=0):
+    """Returns the per-channel percentile color of an image.
+
+    Args:
+        im: An image as an iterable of RGB tuples, a PixelBuffer or an (N, 3)
+            NumPy array, with integer values on the interval [0, 255].
+        q: The percentile on the interval [0, 100].
+        prec: Optional int for RGB value decimal precision,
+            defaults to 0.
+
+    Returns:
+        The percentile color as an RGB tuple.
+
+    Raises:
+        ValueError: If an empty image is passed or if q is outside [0, 100].
+    """
+    hist = ColorHistogram(im)
+    if hist.count == 0:
+        raise ValueError('An empty image has been passed')
+
+    return hist.percentile(q, prec)
+
+
+def mode_color(im):
+    """Returns the most common color of an image.
+
+    Args:
+        im: An image as an iterable of RGB tuples, a PixelBuffer or an (N, 3)
+            NumPy array, with integer values on the interval [0, 255].
+
+    Returns:
+        The most common color as an RGB tuple. Ties go to the color with the
+        smallest packed value (r << 16 | g << 8 | b).
+
+    Raises:
+        ValueError: If an empty image is passed.
+    """
+    hist = ColorHistogram(im)
+    if hist.count == 0:
+        raise ValueError('An empty image has been passed')
+
+    return hist.mode()
+
+
+def dominant_colors(im, n):
+    """Returns the n most common colors of an image by pixel count.
+
+    Args:
+        im: An image as an iterable of RGB tuples, a PixelBuffer or an (N, 3)
+            NumPy array, with integer values on the interval [0, 255].
+        n: The number of colors to return.
+
+    Returns:
+        A list of up to n tuples of an RGB tuple and its pixel count, most
+        common first.
+
+    Raises:
+        ValueError: If an empty image is passed or if n is less than one.
     """
-    r_avg = mean([px[0] for px in im])
-    g_avg = mean([px[1] for px in im])
-    b_avg = mean([px[2] for px in im])
+    if n < 1:
+        raise ValueError('The number of colors must be at least one')
+
+    hist = ColorHistogram(im)
+    if hist.count == 0:
+        raise ValueError('An empty image has been passed')
 
-    return round(r_avg, prec), round(g_avg, prec), round(b_avg, prec)
+    return hist.most_common(n)
 
 
-def grayscale(im, mode='luminosity'):
+def grayscale(im, mode='luminosity', single_channel=False, in_place=False):
     """Returns a grayscale version of an image.
 
-    The available grayscale modes are: Lightness, Average, and Luminosity.
-    The Luminosity mode is the default because it more accurately represents
-    human color perception.
+    The available grayscale modes are: Lightness, Average, Luminosity, and
+    the ITU-R BT.601 and BT.709 luma weightings. The Luminosity mode is the
+    default because it more accurately represents human color perception.
+
+    Grays are computed in integer arithmetic: each channel's weighted value
+    comes from a precomputed table, and their sum is divided by the weights'
+    total and rounded (half to even) with another table. BT.601 and BT.709
+    use the common 8-bit fixed-point weights, (77, 150, 29) and
+    (54, 183, 19) out of 256. With NumPy, PixelBuffers are converted a whole
+    channel at a time.
 
     http://www.johndcook.com/blog/2009/08/24/algorithms-convert-color-grayscale/
 
     Args:
-        im: An image as a list of RGB tuples.
-        mode: Optional string for grayscale mode selection.
+        im: An image as a list of RGB tuples or a PixelBuffer, with integer
+            values on the interval [0, 255].
+        mode: Optional string for grayscale mode selection, either
+            'lightness', 'average', 'luminosity' (the default), 'rec601' or
+            'rec709'.
+        single_channel: Optional bool for returning only the gray values, as
+            a list of ints or a 1-channel PixelBuffer, defaults to False.
+        in_place: Optional bool for writing the grays over the RGB channels
+            of a writable PixelBuffer instead of copying it, defaults to
+            False.
 
     Returns:
-        A grayscale version of the image as a list of RGB tuples.
+        A grayscale version of the image as a list of RGB tuples, or as a
+        PixelBuffer of the same shape if a PixelBuffer was given (any alpha
+        channel is kept). With in_place, the given PixelBuffer itself.
 
     Raises:
-        ValueError: If an empty image is passed or if an invalid grayscale
-            mode is selected.
+        ValueError: If an empty image is passed, if an invalid grayscale
+            mode is selected, if in_place is used without a PixelBuffer, or
+            if both in_place and single_channel are used.
     """
     if len(im) == 0:
         raise ValueError('An empty image has been passed')
+    elif mode not in _GRAY_MODES:
+        raise ValueError('Invalid grayscale mode selected')
+    elif in_place and not isinstance(im, PixelBuffer):
+        raise ValueError('In-place grayscale requires a PixelBuffer')
+    elif in_place and single_channel:
+        raise ValueError('In-place grayscale keeps every channel')
+
+    tables, rounding = _gray_tables(mode)
+    buf = isinstance(im, PixelBuffer)
 
-    gim = []    # Grayscale image list
-
-    if mode == 'lightness':
-        for px in im:
-            gray = round((max(px) + min(px)) / 2)
-            gim.append((gray, gray, gray))
-    elif mode == 'average':
-        for px in im:
-            gray = round((px[0] + px[1] + px[2]) / 3)
-            gim.append((gray, gray, gray))
-    elif mode == 'luminosity':
-        for px in im:
-            gray = round(0.21 * px[0] + 0.72 * px[1] + 0.07 * px[2])
-            gim.append((gray, gray, gray))
+    if buf and np is not None:
+        rgb = as_rgb_array(im).astype(np.int64)
+        if tables is None:
+            sums = rgb.max(axis=1) + rgb.min(axis=1)
+        else:
+            sums = rgb @ np.array(_GRAY_MODES[mode][0])
+        grays = np.frombuffer(rounding, dtype=np.uint8)[sums]
+        grays = array(im.data.format, grays.astype(im.data.format).tobytes())
     else:
-        raise ValueError('Invalid grayscale mode selected')
+        if buf:
+            pixels = zip(*[im.channel(x) for x in range(0, 3)])
+            if im.data.format != 'B':
+                pixels = ((int(r), int(g), int(b)) for r, g, b in pixels)
+        else:
+            pixels = im
+
+        if tables is None:
+            grays = [rounding[max(px[0], px[1], px[2]) +
+                              min(px[0], px[1], px[2])] for px in pixels]
+        else:
+            tr, tg, tb = tables
+            grays = [rounding[tr[px[0]] + tg[px[1]] + tb[px[2]]]
+                     for px in pixels]
+
+        if not buf:
+            if single_channel:
+                return grays
+            return [(gray, gray, gray) for gray in grays]
+        grays = array(im.data.format, grays)
+
+    if single_channel:
+        return PixelBuffer(grays, im.width, im.height, 1)
+
+    c = im.channels
+    data = im.data if in_place else array(im.data.format, im.data)
+    for x in range(0, 3):
+        data[x::c] = grays
+    return im if in_place else PixelBuffer(data, im.width, im.height, c)
+
+
+def extract_palettes(images, k, workers=None, chunksize=1, prec=0, **kwargs):
+    """Returns the k most representative colors of each image in a batch.
+
+    Images are spread across a pool of worker processes. Each image is sent
+    to its worker as a PixelBuffer of 8-bit RGB values rather than as a
+    pickled list of tuples, and workers take images in chunks of chunksize
+    so that every core stays busy on large batches.
+
+    Args:
+        images: An iterable of images, each a list of RGB tuples, a
+            PixelBuffer or an (N, 3) NumPy array with values on the
+            interval [0, 255].
+        k: The number of colors to extract from each image.
+        workers: Optional int for the number of worker processes, defaults
+            to the number of CPUs. With one worker, no processes are started.
+        chunksize: Optional int for the number of images handed to a worker
+            at a time, defaults to 1.
+        prec: Optional int for RGB value decimal precision,
+            defaults to 0.
+        **kwargs: Optional keyword arguments passed on to KMeans. Worker
+            processes cannot start processes of their own, so KMeans'
+            n_jobs is ignored unless there is one worker (results do not
+            depend on it).
+
+    Returns:
+        A list of palettes, each a list of k RGB tuples, in the same order
+        as the given images.
+    """
+    if workers != 1:
+        kwargs = dict(kwargs, n_jobs=1)
+    tasks = ((_pack_pixels(im), k, prec, kwargs) for im in images)
 
-    return gim
+    if workers == 1:
+        return [_extract_palette(task) for task in tasks]
+
+    with Pool(workers) as pool:
+        return list(pool.imap(_extract_palette, tasks, chunksize))
+
+
+def _gray_tables(mode):
+    """Returns the lookup tables for a grayscale mode.
+
+    Args:
+        mode: A key of _GRAY_MODES.
+
+    Returns:
+        A tuple of the per-channel tables of weighted values (None for
+        lightness), and a bytes table of each possible weighted sum divided
+        by the weights' total and rounded half to even.
+    """
+    if mode not in _GRAY_TABLES:
+        weights, total = _GRAY_MODES[mode]
+        tables = None
+        if weights is not None:
+            tables = tuple([w * v for v in range(0, 256)] for w in weights)
+
+        # Ties are exact here, so round() gives the nearest even gray
+        rounding = bytes(round(s / total) for s in range(0, 255 * total + 1))
+        _GRAY_TABLES[mode] = tables, rounding
+
+    return _GRAY_TABLES[mode]
+
+
+def _pack_pixels(im):
+    """Packs an image into a PixelBuffer of 8-bit RGB values.
+
+    Args:
+        im: An image as a list of RGB tuples, a PixelBuffer or an (N, 3)
+            NumPy array.
+
+    Returns:
+        The image as a PixelBuffer with 3 channels and typecode 'B'.
+    """
+    if (isinstance(im, PixelBuffer) and im.channels == 3 and
+            im.data.format == 'B'):
+        return im
+    elif np is not None and (isinstance(im, (np.ndarray, PixelBuffer))):
+        return PixelBuffer(np.ascontiguousarray(as_rgb_array(im),
+                                                dtype=np.uint8))
+    return PixelBuffer.from_pixels([px[:3] for px in im])
+
+
+def _extract_palette(task):
+    """Worker function for extract_palettes.
+
+    Args:
+        task: A tuple of a packed image, k, prec and KMeans keyword arguments.
+
+    Returns:
+        A list of k RGB tuples.
+    """
+    im, k, prec, kwargs = task
+    return KMeans(im, k, **kwargs).get_colors(prec)
@@ -0,0 +1,751 @@
+from heapq import heappop, heappush
+from itertools import islice
+from lut import pack_rgb
+from pixels import PixelBuffer, as_rgb_array
+from stats import ColorHistogram
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Number of pixels counted at a time when inserting into an octree, which
+# bounds the memory used on top of its leaves
+_CHUNK = 1 << 16
+
+# Side of Wu's moment tables: 32 bins per channel, plus a plane of zeros
+_WU_SIDE = 33
+
+
+class MedianCut(object):
+    """A class for quantizing an image's colors with the median cut method.
+
+    The image is counted once into a histogram of its colors, quantized to
+    a number of bits per channel. The histogram starts out as a single box
+    of colors, and the box with the largest total squared error (its pixel
+    count times its variance) is repeatedly cut in two along the channel it
+    varies most in, at its pixel count median, until there are k boxes. Each
+    box's color is the mean of the pixels in it.
+
+    After the one pass over the image, the cost depends only on the number
+    of histogram bins, so median cut is much faster than k-means on large
+    images. It involves no randomness: the same image always gives the same
+    colors, and both backends agree, since every cut is decided with exact
+    integer arithmetic.
+
+    http://www.leptonica.com/papers/mediancut.pdf
+    """
+
+    def __init__(self, im, k, bits=5, backend='auto'):
+        """Initializes MedianCut with an image and builds its histogram.
+
+        Args:
+            im: An image as a list of RGB tuples, a PixelBuffer or an (N, 3)
+                NumPy array, with integer values on the interval [0, 255].
+            k: The number of colors to generate.
+            bits: An optional int for the number of bits kept per channel in
+                the histogram, on the interval [1, 8], defaults to 5 (at most
+                2^15 bins).
+            backend: Optional string for backend selection, either 'numpy',
+                'python', or 'auto' (the default), which uses NumPy when it
+                is installed.
+
+        Raises:
+            ValueError: If an empty image is passed (i.e. []), if the desired
+                amount of colors is less than two, if the given number of
+                bits is outside [1, 8], if an invalid backend is selected, or
+                if one or more RGB values are outside [0, 255] or are not
+                integers.
+            ImportError: If the 'numpy' backend is selected but NumPy is not
+                installed.
+        """
+        if len(im) == 0:
+            raise ValueError('An empty image has been passed')
+        elif k < 2:
+            raise ValueError('The number of colors must be at least two')
+        elif not 1 <= bits <= 8:
+            raise ValueError('The number of bits is outside [1, 8]')
+        elif backend not in ('auto', 'numpy', 'python'):
+            raise ValueError('Invalid backend selected')
+        elif backend == 'numpy' and np is None:
+            raise ImportError('The numpy backend requires NumPy')
+
+        if backend == 'auto':
+            backend = 'python' if np is None else 'numpy'
+
+        self.im = im
+        self.k = k
+        self.bits = bits
+        self.backend = backend
+        self.boxes = []    # Pixel counts and colors of the boxes, once cut
+
+        # Histogram bins, sorted by bin: their quantized colors, pixel
+        # counts and per-channel sums of pixel values
+        if backend == 'numpy':
+            self._bins, self._w, self._sums = self._histogram_numpy()
+        else:
+            self._bins, self._w, self._sums = self._histogram()
+
+    def get_colors(self, prec=0):
+        """Returns a list of k colors that are most representative of the image.
+
+        Fewer than k colors are returned if the histogram has fewer than k
+        bins.
+
+        Args:
+            prec: An optional int for RGB value decimal precision,
+                defaults to 0.
+
+        Returns:
+            A list of RGB tuples, from the box with the most pixels to the
+            one with the fewest.
+        """
+        if self.backend == 'numpy':
+            every = np.arange(len(self._w))
+            boxes = self._cut(every, self._box_stats_numpy,
+                              self._split_numpy)
+        else:
+            every = list(range(0, len(self._w)))
+            boxes = self._cut(every, self._box_stats, self._split)
+
+        self.boxes = []
+        for members in boxes:
+            if self.backend == 'numpy':
+                w = int(self._w[members].sum())
+                sums = self._sums[members].sum(axis=0).tolist()
+            else:
+                w = sum(self._w[i] for i in members)
+                sums = [sum(self._sums[i][x] for i in members)
+                        for x in range(0, 3)]
+            self.boxes.append((w, tuple(s / w for s in sums)))
+
+        self.boxes.sort(key=lambda box: (-box[0], box[1]))
+        return [tuple(round(x, prec) for x in c) for _, c in self.boxes]
+
+    def _cut(self, every, box_stats, split):
+        """Cuts the histogram into boxes.
+
+        Args:
+            every: The indices of every histogram bin.
+            box_stats: The backend's function for a box's statistics.
+            split: The backend's function for splitting a box.
+
+        Returns:
+            A list of up to k boxes, each the indices of its bins.
+        """
+        # Max-heap of boxes by total squared error. Ties go to the box that
+        # was made first.
+        sse, axis_sse = box_stats(every)
+        heap = [(-sse, 0, every, axis_sse)]
+        made = 0
+
+        while len(heap) < self.k and -heap[0][0] > 0:
+            _, _, members, axis_sse = heappop(heap)
+            axis = axis_sse.index(max(axis_sse))
+            for half in split(members, axis):
+                made += 1
+                sse, half_sse = box_stats(half)
+                heappush(heap, (-sse, made, half, half_sse))
+
+        return [box[2] for box in sorted(heap, key=lambda box: box[1])]
+
+    def _histogram(self):
+        """Counts the image's pixels into histogram bins.
+
+        Returns:
+            A tuple of lists of the bins' quantized RGB tuples, pixel counts
+            and per-channel pixel value sums.
+        """
+        shift = 8 - self.bits
+        bins = {}
+        for key, n in ColorHistogram(self.im).counts.items():
+            r, g, b = key >> 16, key >> 8 & 255, key & 255
+            q = (r >> shift, g >> shift, b >> shift)
+            if q in bins:
+                acc = bins[q]
+                acc[0] += n
+                acc[1] += n * r
+                acc[2] += n * g
+                acc[3] += n * b
+            else:
+                bins[q] = [n, n * r, n * g, n * b]
+
+        qs = sorted(bins)
+        return (qs, [bins[q][0] for q in qs], [bins[q][1:] for q in qs])
+
+    def _histogram_numpy(self):
+        """The NumPy version of _histogram.
+
+        Returns:
+            A tuple of an (M, 3) int64 array of the bins' quantized colors,
+            an (M,) int64 array of their pixel counts and an (M, 3) int64
+            array of their per-channel pixel value sums.
+        """
+        shift = 8 - self.bits
+        keys, counts = np.unique(pack_rgb(as_rgb_array(self.im)),
+                                 return_counts=True)
+        rgb = np.stack([keys >> 16, keys >> 8 & 255, keys & 255],
+                       axis=1).astype(np.int64)
+
+        q = rgb >> shift
+        bin_keys = q[:, 0] << (2 * self.bits) | q[:, 1] << self.bits | q[:, 2]
+        _, first, inverse = np.unique(bin_keys, return_index=True,
+                                      return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        w = np.bincount(inverse, weights=counts).astype(np.int64)
+        sums = np.stack([np.bincount(inverse, weights=counts * rgb[:, x])
+                         for x in range(0, 3)], axis=1).astype(np.int64)
+        return q[first], w, sums
+
+    def _box_stats(self, members):
+        """Computes the total squared error of a box of histogram bins.
+
+        Args:
+            members: A list of the indices of the box's bins.
+
+        Returns:
+            A tuple of the box's total squared error, and a list of its pixel
+            count times its squared error along each channel (exact ints).
+        """
+        w = 0
+        s1 = [0, 0, 0]
+        s2 = [0, 0, 0]
+        for i in members:
+            n, q = self._w[i], self._bins[i]
+            w += n
+            for x in range(0, 3):
+                s1[x] += n * q[x]
+                s2[x] += n * q[x] * q[x]
+
+        return _sse(w, s1, s2)
+
+    def _box_stats_numpy(self, members):
+        """The NumPy version of _box_stats.
+
+        Args:
+            members: An array of the indices of the box's bins.
+
+        Returns:
+            A tuple of the box's total squared error, and a list of its pixel
+            count times its squared error along each channel (exact ints).
+        """
+        n = self._w[members]
+        q = self._bins[members]
+        wq = n[:, np.newaxis] * q
+
+        return _sse(int(n.sum()), wq.sum(axis=0).tolist(),
+                    (wq * q).sum(axis=0).tolist())
+
+    def _split(self, members, axis):
+        """Cuts a box in two at its pixel count median along an axis.
+
+        Bins with the same value along the axis stay in the same half.
+
+        Args:
+            members: A list of the indices of the box's bins.
+            axis: The index of the channel to cut along.
+
+        Returns:
+            A tuple of the two halves' lists of bin indices.
+        """
+        bins, w = self._bins, self._w
+        values = sorted(set(bins[i][axis] for i in members))
+        counts = dict.fromkeys(values, 0)
+        for i in members:
+            counts[bins[i][axis]] += w[i]
+
+        cut = _median_cut(values, [counts[v] for v in values])
+        return ([i for i in members if bins[i][axis] <= cut],
+                [i for i in members if bins[i][axis] > cut])
+
+    def _split_numpy(self, members, axis):
+        """The NumPy version of _split.
+
+        Args:
+            members: An array of the indices of the box's bins.
+            axis: The index of the channel to cut along.
+
+        Returns:
+            A tuple of the two halves' arrays of bin indices.
+        """
+        along = self._bins[members, axis]
+        values, inverse = np.unique(along, return_inverse=True)
+        counts = np.bincount(inverse.reshape(-1), weights=self._w[members])
+
+        cut = _median_cut(values.tolist(), counts.astype(np.int64).tolist())
+        return members[along <= cut], members[along > cut]
+
+
+class WuQuantizer(object):
+    """A class for quantizing an image's colors with Wu's method.
+
+    Like median cut, Wu's method cuts a histogram of the image into boxes,
+    but each cut is chosen to minimize the total variance of the two boxes
+    it makes. The histogram has 32 bins per channel, and for each bin it
+    keeps the pixel count, the channel sums and the sum of squared values.
+    These are turned into cumulative tables, from which the moments of any
+    box follow from eight lookups, so every possible cut is scored in
+    constant time.
+
+    The result is usually close to what k-means finds, at a fixed cost after
+    one pass over the image, which also makes it a good way to seed KMeans
+    (see KMeans' 'wu' initialization). It is deterministic, and both
+    backends agree, since the tables hold exact integers.
+
+    http://www.ece.mcmaster.ca/~xwu/cq.c
+    """
+
+    def __init__(self, im, k, backend='auto'):
+        """Initializes WuQuantizer with an image and builds its moment tables.
+
+        Args:
+            im: An image as a list of RGB tuples, a PixelBuffer or an (N, 3)
+                NumPy array, with integer values on the interval [0, 255].
+            k: The number of colors to generate.
+            backend: Optional string for backend selection, either 'numpy',
+                'python', or 'auto' (the default), which uses NumPy when it
+                is installed.
+
+        Raises:
+            ValueError: If an empty image is passed (i.e. []), if the desired
+                amount of colors is less than two, if an invalid backend is
+                selected, or if one or more RGB values are outside [0, 255]
+                or are not integers.
+            ImportError: If the 'numpy' backend is selected but NumPy is not
+                installed.
+        """
+        if len(im) == 0:
+            raise ValueError('An empty image has been passed')
+        elif k < 2:
+            raise ValueError('The number of colors must be at least two')
+        elif backend not in ('auto', 'numpy', 'python'):
+            raise ValueError('Invalid backend selected')
+        elif backend == 'numpy' and np is None:
+            raise ImportError('The numpy backend requires NumPy')
+
+        if backend == 'auto':
+            backend = 'python' if np is None else 'numpy'
+
+        self.im = im
+        self.k = k
+        self.backend = backend
+        self.boxes = []    # Pixel counts and colors of the boxes, once cut
+
+        # Cumulative tables of the pixel counts, red, green and blue sums,
+        # and sums of squared values, flattened in (r, g, b) order
+        if backend == 'numpy':
+            self._moments = self._moments_numpy()
+        else:
+            self._moments = self._moments_python()
+
+    def get_colors(self, prec=0):
+        """Returns a list of k colors that are most representative of the image.
+
+        Fewer than k colors are returned if the image cannot be cut into k
+        boxes of different colors.
+
+        Args:
+            prec: An optional int for RGB value decimal precision,
+                defaults to 0.
+
+        Returns:
+            A list of RGB tuples, from the box with the most pixels to the
+            one with the fewest.
+        """
+        side = _WU_SIDE - 1
+        boxes = [(0, side, 0, side, 0, side)]
+        variances = [0.0]
+        nxt = 0
+
+        while len(boxes) < self.k:
+            halves = self._cut(boxes[nxt])
+            if halves is None:
+                variances[nxt] = 0.0
+            else:
+                boxes[nxt] = halves[0]
+                boxes.append(halves[1])
+                variances[nxt] = self._variance(halves[0])
+                variances.append(self._variance(halves[1]))
+
+            # The box with the largest variance is cut next
+            nxt = variances.index(max(variances))
+            if variances[nxt] <= 0:
+                break
+
+        self.boxes = []
+        for box in boxes:
+            w, sr, sg, sb, _ = [_volume(box, m) for m in self._moments]
+            self.boxes.append((w, (sr / w, sg / w, sb / w)))
+
+        self.boxes.sort(key=lambda box: (-box[0], box[1]))
+        return [tuple(round(x, prec) for x in c) for _, c in self.boxes]
+
+    def _moments_python(self):
+        """Counts the image into cumulative moment tables.
+
+        Returns:
+            A list of the five tables, each a flat list of ints.
+        """
+        side = _WU_SIDE
+        tables = [[0] * side ** 3 for _ in range(0, 5)]
+        wt, mr, mg, mb, m2 = tables
+        for key, n in ColorHistogram(self.im).counts.items():
+            r, g, b = key >> 16, key >> 8 & 255, key & 255
+            i = (((r >> 3) + 1) * side + (g >> 3) + 1) * side + (b >> 3) + 1
+            wt[i] += n
+            mr[i] += n * r
+            mg[i] += n * g
+            mb[i] += n * b
+            m2[i] += n * (r * r + g * g + b * b)
+
+        # Prefix sums along blue, then green, then red
+        for stride in (1, side, side * side):
+            for i in range(0, side ** 3):
+                if i // stride % side:
+                    for t in tables:
+                        t[i] += t[i - stride]
+
+        return tables
+
+    def _moments_numpy(self):
+        """The NumPy version of _moments_python.
+
+        Returns:
+            A list of the five tables, each a flat list of ints.
+        """
+        side = _WU_SIDE
+        keys, counts = np.unique(pack_rgb(as_rgb_array(self.im)),
+                                 return_counts=True)
+        rgb = np.stack([keys >> 16, keys >> 8 & 255, keys & 255],
+                       axis=1).astype(np.int64)
+        q = (rgb >> 3) + 1
+        idx = (q[:, 0] * side + q[:, 1]) * side + q[:, 2]
+
+        tables = []
+        for weights in (counts, counts * rgb[:, 0], counts * rgb[:, 1],
+                        counts * rgb[:, 2], counts * (rgb * rgb).sum(axis=1)):
+            t = np.bincount(idx, weights=weights, minlength=side ** 3)
+            t = t.astype(np.int64).reshape(side, side, side)
+            t = t.cumsum(axis=2).cumsum(axis=1).cumsum(axis=0)
+            tables.append(t.ravel().tolist())
+
+        return tables
+
+    def _variance(self, box):
+        """Returns a box's total squared error, or 0 if it is a single bin.
+
+        Args:
+            box: A tuple of the box's exclusive lower and inclusive upper
+                bounds along red, green and blue.
+        """
+        if ((box[1] - box[0]) * (box[3] - box[2]) * (box[5] - box[4]) <= 1):
+            return 0.0
+
+        w, sr, sg, sb, s2 = [_volume(box, m) for m in self._moments]
+        return s2 - (sr * sr + sg * sg + sb * sb) / w
+
+    def _cut(self, box):
+        """Finds the cut of a box that leaves the least variance.
+
+        Minimizing the variance of the two halves is the same as maximizing
+        the sum, over both halves, of their squared channel sums divided by
+        their pixel counts.
+
+        Args:
+            box: A tuple of the box's bounds.
+
+        Returns:
+            A tuple of the two halves' bounds, or None if the box cannot be
+            cut into two halves with pixels in both.
+        """
+        whole = [_volume(box, m) for m in self._moments[:4]]
+
+        best, best_axis, best_at = 0.0, None, None
+        for axis in range(0, 3):
+            lo, hi = box[2 * axis], box[2 * axis + 1]
+            for at in range(lo + 1, hi):
+                half = list(box)
+                half[2 * axis + 1] = at
+                w, sr, sg, sb = [_volume(half, m) for m in self._moments[:4]]
+                if w == 0 or w == whole[0]:
+                    continue
+
+                rest = [x - y for x, y in zip(whole, (w, sr, sg, sb))]
+                score = ((sr * sr + sg * sg + sb * sb) / w +
+                         (rest[1] * rest[1] + rest[2] * rest[2] +
+                          rest[3] * rest[3]) / rest[0])
+                if score > best:
+                    best, best_axis, best_at = score, axis, at
+
+        if best_axis is None:
+            return None
+
+        lower, upper = list(box), list(box)
+        lower[2 * best_axis + 1] = best_at
+        upper[2 * best_axis] = best_at
+        return tuple(lower), tuple(upper)
+
+
+class OctreeQuantizer(object):
+    """A class for quantizing an image's colors with an octree.
+
+    Each level of the octree splits the RGB cube into eight, by one more bit
+    of each channel, down to single colors at level 8. Pixels are inserted
+    into the leaf whose cube contains them, which keeps their count and
+    channel sums. Whenever there are more than max_leaves leaves, the leaves
+    under the deepest parents with the fewest pixels are merged into their
+    parents, so memory stays bounded however many pixels are inserted.
+
+    Pixels can be inserted from any iterable in chunks, and trees built over
+    separate tiles, possibly in other processes, can be merged. Colors are
+    read off a reduced copy of the tree, so insertion can go on afterwards.
+
+    http://www.cubic.org/docs/octree.htm
+    """
+
+    def __init__(self, im, k, max_leaves=4096):
+        """Initializes OctreeQuantizer, optionally inserting a first image.
+
+        Args:
+            im: An image as an iterable of RGB tuples, a PixelBuffer or an
+                (N, 3) NumPy array, with integer values on the interval
+                [0, 255], or None to insert pixels later with update.
+            k: The number of colors to generate.
+            max_leaves: Optional int for the largest number of leaves kept
+                between insertions, defaults to 4096.
+
+        Raises:
+            ValueError: If the desired amount of colors is less than two, if
+                max_leaves is less than k, or if one or more RGB values are
+                outside [0, 255] or are not integers.
+        """
+        if k < 2:
+            raise ValueError('The number of colors must be at least two')
+        elif max_leaves < k:
+            raise ValueError('The number of leaves must be at least k')
+
+        self.k = k
+        self.max_leaves = max_leaves
+        self.count = 0
+
+        # Leaves by level and quantized color, each with its pixel count and
+        # channel sums, and the number of leaves on each level
+        self._leaves = {}
+        self._levels = [0] * 9
+
+        if im is not None:
+            self.update(im)
+
+    def __len__(self):
+        """Returns the number of pixels inserted."""
+
+        return self.count
+
+    def update(self, im):
+        """Inserts a chunk of pixels, reducing the tree afterwards if needed.
+
+        Args:
+            im: An image as an iterable of RGB tuples, a PixelBuffer or an
+                (N, 3) NumPy array, with integer values on the interval
+                [0, 255]. Any alpha channel is ignored.
+
+        Returns:
+            The OctreeQuantizer itself, so that calls can be chained.
+
+        Raises:
+            ValueError: If one or more RGB values are outside [0, 255] or
+                are not integers.
+        """
+        if np is not None and isinstance(im, (np.ndarray, PixelBuffer)):
+            arr = as_rgb_array(im)
+            chunks = (arr[i:i + _CHUNK] for i in range(0, len(arr), _CHUNK))
+        else:
+            pixels = iter(im)
+            chunks = iter(lambda: list(islice(pixels, _CHUNK)), [])
+
+        for chunk in chunks:
+            for key, n in ColorHistogram(chunk).counts.items():
+                r, g, b = key >> 16, key >> 8 & 255, key & 255
+                self._insert((r, g, b), n, (n * r, n * g, n * b))
+            _reduce(self._leaves, self._levels, self.max_leaves)
+
+        return self
+
+    def merge(self, other):
+        """Inserts the leaves of another OctreeQuantizer into this one.
+
+        Each of the other tree's leaves is inserted as its pixels, all at
+        their mean color, so pixel counts and channel sums are kept exactly.
+
+        Args:
+            other: Another OctreeQuantizer.
+
+        Returns:
+            The OctreeQuantizer itself, so that calls can be chained.
+        """
+        for key in sorted(other._leaves):
+            acc = other._leaves[key]
+            color = tuple(int(round(s / acc[0])) for s in acc[1:])
+            self._insert(color, acc[0], acc[1:])
+        _reduce(self._leaves, self._levels, self.max_leaves)
+
+        return self
+
+    def get_colors(self, prec=0, fractions=False):
+        """Returns up to k colors that are most representative of the image.
+
+        A copy of the tree is reduced to at most k leaves, whose mean colors
+        are returned. Fewer than k colors are returned if the image has fewer
+        colors, or if the last merge of leaves went below k.
+
+        Args:
+            prec: An optional int for RGB value decimal precision,
+                defaults to 0.
+            fractions: Optional bool for returning each color with the
+                fraction of the image's pixels that it represents, defaults
+                to False.
+
+        Returns:
+            A list of RGB tuples, or of tuples of an RGB tuple and a pixel
+            fraction with fractions, from the color with the most pixels to
+            the one with the fewest.
+
+        Raises:
+            ValueError: If no pixels have been inserted.
+        """
+        if self.count == 0:
+            raise ValueError('No pixels have been inserted')
+
+        leaves = dict(self._leaves)
+        _reduce(leaves, list(self._levels), self.k)
+
+        colors = sorted((-acc[0], tuple(s / acc[0] for s in acc[1:]))
+                        for acc in leaves.values())
+        colors = [(tuple(round(x, prec) for x in c), -n / self.count)
+                  for n, c in colors]
+        if fractions:
+            return colors
+        return [c for c, _ in colors]
+
+    def _insert(self, color, n, sums):
+        """Adds pixels to the leaf whose cube contains their color.
+
+        If no leaf does, a new one is made for the color on level 8.
+
+        Args:
+            color: The pixels' RGB tuple.
+            n: The number of pixels.
+            sums: Their per-channel sums.
+        """
+        r, g, b = color
+        for level in range(0, 9):
+            if not self._levels[level]:
+                continue
+            shift = 8 - level
+            key = (level, r >> shift, g >> shift, b >> shift)
+            if key in self._leaves:
+                acc = self._leaves[key]
+                break
+        else:
+            acc = self._leaves[(8, r, g, b)] = [0, 0, 0, 0]
+            self._levels[8] += 1
+
+        acc[0] += n
+        acc[1] += sums[0]
+        acc[2] += sums[1]
+        acc[3] += sums[2]
+        self.count += n
+
+
+def _sse(w, s1, s2):
+    """Finds the total squared error of a box from its moments.
+
+    Args:
+        w: The box's pixel count.
+        s1: The per-channel sums of its pixels' quantized values.
+        s2: The per-channel sums of their squares.
+
+    Returns:
+        A tuple of the total squared error, and a list of w times the
+        squared error along each channel.
+    """
+    axis_sse = [w * s2[x] - s1[x] * s1[x] for x in range(0, 3)]
+    return sum(axis_sse) / w, axis_sse
+
+
+def _median_cut(values, counts):
+    """Finds where to cut a sorted list of values at their weighted median.
+
+    Args:
+        values: A sorted list of at least two distinct values.
+        counts: A list of their weights.
+
+    Returns:
+        The largest value that goes into the lower half, which is never the
+        last value, so that neither half is empty.
+    """
+    total = sum(counts)
+    seen = 0
+    for i, n in enumerate(counts):
+        seen += n
+        if 2 * seen >= total:
+            return values[min(i, len(values) - 2)]
+
+
+def _reduce(leaves, levels, max_leaves):
+    """Merges octree leaves into their parents until few enough are left.
+
+    The parents of the deepest leaves are merged first, those with the
+    fewest pixels (then the smallest colors) first among them.
+
+    Args:
+        leaves: A dict of leaves by level and quantized color, each with its
+            pixel count and channel sums, which is changed in place.
+        levels: A list of the number of leaves on each level, which is also
+            changed in place.
+        max_leaves: The largest number of leaves to leave.
+    """
+    while len(leaves) > max_leaves:
+        level = max(lv for lv in range(0, 9) if levels[lv])
+
+        parents = {}
+        for key in leaves:
+            if key[0] == level:
+                parent = (level - 1, key[1] >> 1, key[2] >> 1, key[3] >> 1)
+                parents.setdefault(parent, []).append(key)
+
+        order = sorted((sum(leaves[key][0] for key in children), parent)
+                       for parent, children in parents.items())
+        for _, parent in order:
+            if len(leaves) <= max_leaves:
+                break
+            merged = [0, 0, 0, 0]
+            for key in parents[parent]:
+                acc = leaves.pop(key)
+                for x in range(0, 4):
+                    merged[x] += acc[x]
+            leaves[parent] = merged
+            levels[level] -= len(parents[parent])
+            levels[level - 1] += 1
+
+
+def _volume(box, m):
+    """Sums a moment over a box from its cumulative table.
+
+    Args:
+        box: A tuple of the box's exclusive lower and inclusive upper bounds
+            along red, green and blue.
+        m: A flat cumulative moment table.
+
+    Returns:
+        The moment's sum over the box.
+    """
+    r0, r1, g0, g1, b0, b1 = box
+    side = _WU_SIDE
+    r0, r1 = r0 * side * side, r1 * side * side
+    g0, g1 = g0 * side, g1 * side
+
+    return (m[r1 + g1 + b1] - m[r1 + g1 + b0] - m[r1 + g0 + b1] +
+            m[r1 + g0 + b0] - m[r0 + g1 + b1] + m[r0 + g1 + b0] +
+            m[r0 + g0 + b1] - m[r0 + g0 + b0])
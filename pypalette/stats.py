@@ -0,0 +1,322 @@
+from collections import Counter
+from heapq import nlargest
+from lut import pack_rgb
+from pixels import PixelBuffer, as_rgb_array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ColorStats(object):
+    """A streaming accumulator of color statistics.
+
+    Pixels are consumed in a single pass into a count and running per-channel
+    sums, so an image never has to be held in memory whole: it can be fed in
+    chunks, such as the frames of a video or the tiles of a scan, or as any
+    iterable of pixels. Integer values are summed exactly, so the result does
+    not depend on how the pixels were chunked.
+
+    Accumulators over different parts of an image can be merged, including
+    ones built in other processes (a ColorStats pickles as its sums).
+    """
+
+    def __init__(self, im=None):
+        """Initializes ColorStats, optionally with a first chunk of pixels.
+
+        Args:
+            im: Optional image as an iterable of RGB tuples, a PixelBuffer
+                or an (N, 3) NumPy array.
+        """
+        self.count = 0
+        self.sums = [0, 0, 0]
+
+        if im is not None:
+            self.update(im)
+
+    def __len__(self):
+        """Returns the number of pixels consumed."""
+
+        return self.count
+
+    def update(self, im):
+        """Consumes a chunk of pixels.
+
+        PixelBuffers and NumPy arrays are summed a channel at a time (by
+        NumPy when it is installed), while any other iterable is consumed
+        pixel by pixel, so generators are never materialized.
+
+        Args:
+            im: An image as an iterable of RGB tuples, a PixelBuffer or an
+                (N, 3) NumPy array. Any alpha channel is ignored.
+
+        Returns:
+            The ColorStats itself, so that calls can be chained.
+        """
+        if np is not None and isinstance(im, (np.ndarray, PixelBuffer)):
+            arr = as_rgb_array(im)
+            acc = np.int64 if arr.dtype.kind in 'biu' else np.float64
+            sums = arr.sum(axis=0, dtype=acc).tolist()
+            n = len(arr)
+        elif isinstance(im, PixelBuffer):
+            sums = [sum(im.channel(x)) for x in range(0, 3)]
+            n = len(im)
+        else:
+            n = r = g = b = 0
+            for px in im:
+                r += px[0]
+                g += px[1]
+                b += px[2]
+                n += 1
+            sums = r, g, b
+
+        self.count += n
+        self.sums = [s + x for s, x in zip(self.sums, sums)]
+        return self
+
+    def merge(self, other):
+        """Adds the pixels consumed by another ColorStats to this one.
+
+        Args:
+            other: Another ColorStats.
+
+        Returns:
+            The ColorStats itself, so that calls can be chained.
+        """
+        self.count += other.count
+        self.sums = [s + x for s, x in zip(self.sums, other.sums)]
+        return self
+
+    def mean(self, prec=0):
+        """Returns the average color of the pixels consumed so far.
+
+        The calculated average is just a simple arithmetic mean. With integer
+        values, each channel is correctly rounded from its exact mean.
+
+        Args:
+            prec: Optional int for RGB value decimal precision, defaults to
+                0. Pass None to leave the values unrounded.
+
+        Returns:
+            The average color as an RGB tuple.
+
+        Raises:
+            ValueError: If no pixels have been consumed.
+        """
+        if self.count == 0:
+            raise ValueError('No pixels have been consumed')
+
+        avg = tuple(s / self.count for s in self.sums)
+        if prec is None:
+            return avg
+        return tuple(round(x, prec) for x in avg)
+
+
+class ColorHistogram(object):
+    """A streaming histogram of an image's colors.
+
+    Pixels are counted in a single pass into a 256-bin histogram per channel
+    and a sparse count of every distinct 24-bit color, so memory is bounded
+    by the number of distinct colors rather than the image size. Medians and
+    other percentiles are read off the channel histograms, and the most
+    common colors off the color counts, without sorting any pixels.
+
+    Like ColorStats, histograms can be fed in chunks and merged, so tiles
+    can be counted separately, including in other processes.
+    """
+
+    def __init__(self, im=None):
+        """Initializes ColorHistogram, optionally with a first chunk of pixels.
+
+        Args:
+            im: Optional image as an iterable of RGB tuples, a PixelBuffer
+                or an (N, 3) NumPy array, with integer values on the interval
+                [0, 255].
+        """
+        self.count = 0
+        self.hists = [[0] * 256 for _ in range(0, 3)]
+        self.counts = {}    # Packed colors (r << 16 | g << 8 | b) to counts
+
+        if im is not None:
+            self.update(im)
+
+    def __len__(self):
+        """Returns the number of pixels counted."""
+
+        return self.count
+
+    def update(self, im):
+        """Counts a chunk of pixels.
+
+        Each chunk is first reduced to its distinct colors (by NumPy when it
+        is installed and a PixelBuffer or NumPy array is given), which are
+        then added to the histograms.
+
+        Args:
+            im: An image as an iterable of RGB tuples, a PixelBuffer or an
+                (N, 3) NumPy array, with integer values on the interval
+                [0, 255]. Any alpha channel is ignored.
+
+        Returns:
+            The ColorHistogram itself, so that calls can be chained.
+
+        Raises:
+            ValueError: If one or more RGB values are outside [0, 255] or
+                are not integers.
+        """
+        if np is not None and isinstance(im, (np.ndarray, PixelBuffer)):
+            keys, counts = np.unique(pack_rgb(as_rgb_array(im)),
+                                     return_counts=True)
+            chunk = zip(keys.tolist(), counts.tolist())
+        else:
+            if isinstance(im, PixelBuffer):
+                im = zip(*[im.channel(x) for x in range(0, 3)])
+            chunk = []
+            for px, n in Counter((px[0], px[1], px[2]) for px in im).items():
+                if any(not 0 <= x <= 255 for x in px):
+                    raise ValueError(
+                        'One or more RGB values are outside [0, 255]')
+                elif any(x != int(x) for x in px):
+                    raise ValueError('One or more RGB values are not integers')
+                r, g, b = int(px[0]), int(px[1]), int(px[2])
+                chunk.append((r << 16 | g << 8 | b, n))
+
+        counts, (hr, hg, hb) = self.counts, self.hists
+        for key, n in chunk:
+            counts[key] = counts.get(key, 0) + n
+            hr[key >> 16] += n
+            hg[key >> 8 & 255] += n
+            hb[key & 255] += n
+            self.count += n
+
+        return self
+
+    def merge(self, other):
+        """Adds the pixels counted by another ColorHistogram to this one.
+
+        Args:
+            other: Another ColorHistogram.
+
+        Returns:
+            The ColorHistogram itself, so that calls can be chained.
+        """
+        for key, n in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + n
+        for hist, other_hist in zip(self.hists, other.hists):
+            for x, n in enumerate(other_hist):
+                hist[x] += n
+        self.count += other.count
+        return self
+
+    def percentile(self, q, prec=0):
+        """Returns the per-channel percentiles of the pixels counted so far.
+
+        Each channel is treated on its own, interpolating linearly between
+        the two nearest ranks (as statistics.median does for the 50th
+        percentile), so the result need not be a color in the image.
+
+        Args:
+            q: The percentile on the interval [0, 100].
+            prec: Optional int for RGB value decimal precision, defaults to
+                0. Pass None to leave the values unrounded.
+
+        Returns:
+            The percentile color as an RGB tuple.
+
+        Raises:
+            ValueError: If q is outside [0, 100] or if no pixels have been
+                counted.
+        """
+        if not 0 <= q <= 100:
+            raise ValueError('The percentile must be on [0, 100]')
+        elif self.count == 0:
+            raise ValueError('No pixels have been counted')
+
+        pos = (self.count - 1) * q / 100
+        rank = int(pos)
+        frac = pos - rank
+
+        color = []
+        for hist in self.hists:
+            lo, hi = _ranked(hist, rank)
+            color.append(lo + (hi - lo) * frac if frac else lo)
+
+        if prec is None:
+            return tuple(color)
+        return tuple(round(x, prec) for x in color)
+
+    def median(self, prec=0):
+        """Returns the per-channel median of the pixels counted so far.
+
+        Args:
+            prec: Optional int for RGB value decimal precision, defaults to
+                0. Pass None to leave the values unrounded.
+
+        Returns:
+            The median color as an RGB tuple.
+
+        Raises:
+            ValueError: If no pixels have been counted.
+        """
+        return self.percentile(50, prec)
+
+    def most_common(self, n=None):
+        """Returns the most common colors and their counts.
+
+        Args:
+            n: Optional int for the number of colors to return, defaults to
+                all of them.
+
+        Returns:
+            A list of tuples of an RGB tuple and its count, most common
+            first. Ties go to the color with the smallest packed value.
+        """
+        # Negated keys make the larger of two tied items the smaller color
+        items = ((n_px, -key) for key, n_px in self.counts.items())
+        if n is None:
+            top = sorted(items, reverse=True)
+        else:
+            top = nlargest(n, items)
+        return [((key >> 16, key >> 8 & 255, key & 255), n_px)
+                for n_px, key in ((n_px, -neg) for n_px, neg in top)]
+
+    def mode(self):
+        """Returns the most common color of the pixels counted so far.
+
+        Returns:
+            The most common color as an RGB tuple. Ties go to the color with
+            the smallest packed value.
+
+        Raises:
+            ValueError: If no pixels have been counted.
+        """
+        if self.count == 0:
+            raise ValueError('No pixels have been counted')
+
+        return self.most_common(1)[0][0]
+
+
+def _ranked(hist, rank):
+    """Finds the values at a rank and the rank after it in a histogram.
+
+    Args:
+        hist: A list of 256 counts.
+        rank: A zero-based rank, less than the total count.
+
+    Returns:
+        A tuple of the two values (the second is the first if rank is last).
+    """
+    seen = 0
+    for x, n in enumerate(hist):
+        seen += n
+        if seen > rank:
+            lo = x
+            break
+
+    if seen > rank + 1:
+        return lo, lo
+    for x in range(lo + 1, 256):
+        if hist[x]:
+            return lo, x
+    return lo, lo
@@ -1,12 +1,96 @@
+import random
+import shutil
+import statistics
+import tempfile
 import unittest
 import sys
 import os
 
 sys.path.append(os.path.join('..', 'pypalette'))
+import color_index
 import color_lists
 import conversions
+import dither
 import kmeans
+import lut
+import metrics
+import palette
+import pixels
 import pypalette
+import quantize
+import stats
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class TestColorIndex(unittest.TestCase):
+    """Tests the nearest color index."""
+
+    def test_nearest(self):
+        """Tests nearest color queries on a color list."""
+
+        index = color_index.ColorIndex(color_lists.css3)
+
+        self.assertEqual(len(index), len(color_lists.css3))
+        self.assertEqual(index.nearest('#1e90fe'), 'dodgerblue')
+        self.assertEqual(index.nearest((250, 0, 0)), 'red')
+        self.assertEqual(index.k_nearest((250, 0, 0), 2),
+                         [('red', 5), ('orangered', 69.18092222571191)])
+
+        # Ties go to the color that comes first in the list
+        self.assertEqual(index.nearest((0, 255, 255)), 'aqua')
+
+    def test_nearest_matches_scan(self):
+        """Tests that tree queries match a scan of the whole list."""
+
+        rand = random.Random(1)
+        colors = [(rand.randrange(256), rand.randrange(256),
+                   rand.randrange(256)) for _ in range(300)]
+        queries = [(rand.randrange(256), rand.randrange(256),
+                    rand.randrange(256)) for _ in range(50)]
+
+        for metric in ('sqeuclidean', 'redmean', 'cie76', 'cie94',
+                       'ciede2000'):
+            index = color_index.ColorIndex(colors, metric)
+            pts = index._to_space(colors)
+            for q, name in zip(queries, index.nearest_many(queries)):
+                nearest = index.k_nearest(q, 3)
+                qpt = index._to_space([q])[0]
+                scan = sorted((index._dist(pt, qpt), i)
+                              for i, pt in enumerate(pts))[:3]
+                self.assertEqual([i for i, _ in nearest],
+                                 [i for _, i in scan])
+                self.assertEqual(name, nearest[0][0])
+
+    def test_nearest_many_large(self):
+        """Tests batched queries that walk the tree for long color lists."""
+
+        rand = random.Random(2)
+        colors = [(rand.randrange(256), rand.randrange(256),
+                   rand.randrange(256)) for _ in range(1500)]
+        queries = [(rand.randrange(256), rand.randrange(256),
+                    rand.randrange(256)) for _ in range(50)] * 2
+        if np is not None:
+            queries = np.array(queries)
+
+        for metric in ('sqeuclidean', 'redmean', 'cie94'):
+            index = color_index.ColorIndex(colors, metric)
+            self.assertEqual(index.nearest_many(queries),
+                             [index.nearest(tuple(q)) for q in queries])
+
+    def test_color_index_check(self):
+        """Tests the invalid arguments errors for ColorIndex."""
+
+        self.assertRaises(ValueError, color_index.ColorIndex, {})
+        self.assertRaises(ValueError, color_index.ColorIndex,
+                          color_lists.css3, metric='manhattan')
+        self.assertRaises(ValueError, color_index.ColorIndex,
+                          color_lists.css3, metric='cie94', space='rgb')
+        self.assertRaises(ValueError, color_index.ColorIndex(
+            color_lists.css3).k_nearest, (0, 0, 0), 0)
 
 
 class TestColorLists(unittest.TestCase):
@@ -203,6 +287,541 @@ class TestConversions(unittest.TestCase):
         self.assertEqual(conversions.rgb2hsv((215, 157, 74), sv_prec=2),
                          (35, 0.66, 0.84))
 
+    def test_rgb2linear_conv(self):
+        """Tests the RGB to linear RGB conversion and back."""
+
+        self.assertEqual(conversions.rgb2linear((215, 157, 74)),
+                         (0.68, 0.337, 0.068))
+        self.assertEqual(conversions.rgb2linear((255, 255, 255)),
+                         (1, 1, 1))
+        self.assertEqual(conversions.linear2rgb((0.5, 0.25, 1)),
+                         (188, 137, 255))
+
+    def test_linear2rgb_lin_check(self):
+        """Tests the invalid linear RGB values error for linear2rgb."""
+
+        self.assertRaises(ValueError, conversions.linear2rgb, (0, 1.1, 0))
+        self.assertRaises(ValueError, conversions.linear2rgb, (-0.1, 0, 0))
+
+    def test_rgb2xyz_conv(self):
+        """Tests the RGB to XYZ conversion."""
+
+        self.assertEqual(conversions.rgb2xyz((215, 157, 74)),
+                         (41.32, 39.059, 11.84))
+        self.assertEqual(conversions.rgb2xyz((255, 255, 255)),
+                         (95.047, 100, 108.883))
+
+    def test_rgb2lab_conv(self):
+        """Tests the RGB to Lab conversion."""
+
+        self.assertEqual(conversions.rgb2lab((215, 157, 74)),
+                         (68.794, 13.281, 50.735))
+        self.assertEqual(conversions.rgb2lab((255, 255, 255)), (100, 0, 0))
+        self.assertEqual(conversions.rgb2lab((0, 0, 0)), (0, 0, 0))
+
+    def test_rgb2lch_conv(self):
+        """Tests the RGB to LCh conversion."""
+
+        self.assertEqual(conversions.rgb2lch((215, 157, 74)),
+                         (68.794, 52.444, 75.33))
+
+    def test_rgb2oklab_conv(self):
+        """Tests the RGB to OKLab conversion."""
+
+        self.assertEqual(conversions.rgb2oklab((215, 157, 74)),
+                         (0.736, 0.034, 0.116))
+        self.assertEqual(conversions.rgb2oklab((255, 255, 255)), (1, 0, 0))
+
+    def test_perceptual_rgb_check(self):
+        """Tests the invalid RGB values error for perceptual conversions."""
+
+        for conv in (conversions.rgb2xyz, conversions.rgb2lab,
+                     conversions.rgb2lch, conversions.rgb2oklab):
+            self.assertRaises(ValueError, conv, (-1, 250, 50))
+            self.assertRaises(ValueError, conv, (255, 256, 0))
+
+    def test_perceptual_round_trip(self):
+        """Tests that perceptual conversions give back the original RGB."""
+
+        pairs = ((conversions.rgb2xyz, conversions.xyz2rgb),
+                 (conversions.rgb2lab, conversions.lab2rgb),
+                 (conversions.rgb2lch, conversions.lch2rgb),
+                 (conversions.rgb2oklab, conversions.oklab2rgb))
+
+        for to, back in pairs:
+            for rgb in ((215, 157, 74), (0, 0, 0), (255, 255, 255),
+                        (119, 53, 200)):
+                self.assertEqual(back(to(rgb, prec=None)), rgb)
+
+    def test_lab2rgb_gamut_check(self):
+        """Tests that out of gamut Lab colors are clipped to RGB."""
+
+        self.assertEqual(conversions.lab2rgb((50, -20, 30)), (102, 127, 66))
+        self.assertEqual(conversions.lab2rgb((50, -20, 30), prec=2),
+                         (101.98, 127.08, 66.26))
+        self.assertEqual(conversions.lab2rgb((100, 0, -128)), (0, 255, 255))
+
+
+class TestConversionsMany(unittest.TestCase):
+    """Tests batched color space conversion functions."""
+
+    rgb = [(0, 0, 0), (255, 255, 255), (215, 157, 74), (96, 208, 74),
+           (119, 53, 200), (89, 216, 114), (128, 128, 128)]
+
+    def test_rgb_many_conv(self):
+        """Tests that batched RGB conversions match the scalar ones."""
+
+        for many, one in ((conversions.rgb2hsl_many, conversions.rgb2hsl),
+                          (conversions.rgb2hsv_many, conversions.rgb2hsv),
+                          (conversions.rgb2cmyk_many, conversions.rgb2cmyk)):
+            self.assertEqual([tuple(px) for px in many(self.rgb)],
+                             [one(px) for px in self.rgb])
+
+    def test_rgba_many_conv(self):
+        """Tests that batched conversions ignore alpha channels."""
+
+        rgba = [px + (128,) for px in self.rgb]
+        images = [rgba, pixels.PixelBuffer.from_pixels(rgba)]
+        if np is not None:
+            images.append(np.array(rgba))
+
+        for many in (conversions.rgb2hsl_many, conversions.rgb2hsv_many,
+                     conversions.rgb2cmyk_many, conversions.rgb2linear_many,
+                     conversions.rgb2xyz_many, conversions.rgb2lab_many,
+                     conversions.rgb2lch_many, conversions.rgb2oklab_many):
+            expected = [tuple(px) for px in many(self.rgb)]
+            for im in images:
+                self.assertEqual([tuple(px) for px in many(im)], expected)
+
+    def test_to_rgb_many_conv(self):
+        """Tests that batched conversions to RGB match the scalar ones."""
+
+        hsx = [(0, 0, 0), (35.3, 0.638, 0.567), (183, 0.25, 0.67),
+               (300, 0.5, 0.5), (359.9, 1, 1)]
+        cmyk = [(0.56, 0.26, 0.82, 0.11), (0, 0, 0, 0), (1, 1, 1, 1)]
+
+        for many, one, values in ((conversions.hsl2rgb_many,
+                                   conversions.hsl2rgb, hsx),
+                                  (conversions.hsv2rgb_many,
+                                   conversions.hsv2rgb, hsx),
+                                  (conversions.cmyk2rgb_many,
+                                   conversions.cmyk2rgb, cmyk)):
+            for prec in (0, 2):
+                self.assertEqual(
+                    [tuple(px) for px in many(values, prec=prec)],
+                    [one(px, prec=prec) for px in values])
+
+    def test_perceptual_many_conv(self):
+        """Tests that batched perceptual conversions match the scalar ones."""
+
+        for many, one, back_many, back in (
+                (conversions.rgb2linear_many, conversions.rgb2linear,
+                 conversions.linear2rgb_many, conversions.linear2rgb),
+                (conversions.rgb2xyz_many, conversions.rgb2xyz,
+                 conversions.xyz2rgb_many, conversions.xyz2rgb),
+                (conversions.rgb2lab_many, conversions.rgb2lab,
+                 conversions.lab2rgb_many, conversions.lab2rgb),
+                (conversions.rgb2lch_many, conversions.rgb2lch,
+                 conversions.lch2rgb_many, conversions.lch2rgb),
+                (conversions.rgb2oklab_many, conversions.rgb2oklab,
+                 conversions.oklab2rgb_many, conversions.oklab2rgb)):
+            values = [one(px) for px in self.rgb]
+            self.assertEqual([tuple(px) for px in many(self.rgb)], values)
+            self.assertEqual([tuple(px) for px in back_many(values)],
+                             [back(px) for px in values])
+            self.assertEqual([tuple(px) for px in
+                              back_many(many(self.rgb, prec=None))],
+                             self.rgb)
+
+    def test_hex2rgb_many_conv(self):
+        """Tests the batched Hex to RGB conversion."""
+
+        hxs = ['#000000', '#808080', '#ffffff', '#59d872']
+
+        self.assertEqual(conversions.hex2rgb_many(hxs),
+                         [conversions.hex2rgb(hx) for hx in hxs])
+        self.assertEqual(conversions.hex2rgb_many(['#abc', 'a1b2c3d4']),
+                         [(170, 187, 204), (161, 178, 195)])
+        self.assertEqual(conversions.hex2rgb_many(['#abc', 'a1b2c3d4'],
+                                                  alpha=True),
+                         [(170, 187, 204, 255), (161, 178, 195, 212)])
+        self.assertEqual(conversions.hex2rgb_many(hxs, out='packed'),
+                         [0, 0x808080, 0xffffff, 0x59d872])
+        self.assertEqual(list(conversions.hex2rgb_many(hxs, out='buffer')),
+                         [conversions.hex2rgb(hx) for hx in hxs])
+
+    def test_hex2rgb_many_hex_check(self):
+        """Tests the malformed hex values errors for hex2rgb_many."""
+
+        self.assertRaises(ValueError, conversions.hex2rgb_many, ['#12345g'])
+        self.assertRaises(ValueError, conversions.hex2rgb_many, ['#1234'])
+        self.assertRaises(ValueError, conversions.hex2rgb_many, ['1234567'])
+
+    def test_rgb2hex_many_conv(self):
+        """Tests the batched RGB to Hex conversion."""
+
+        self.assertEqual(conversions.rgb2hex_many(self.rgb),
+                         [conversions.rgb2hex(px) for px in self.rgb])
+        self.assertEqual(conversions.rgb2hex_many([0x59d872, 0x80]),
+                         ['#59d872', '#000080'])
+        self.assertEqual(conversions.rgb2hex_many([(89, 216, 114, 128)]),
+                         ['#59d87280'])
+        self.assertEqual(conversions.rgb2hex_many(
+            pixels.PixelBuffer.from_pixels(self.rgb)),
+            [conversions.rgb2hex(px) for px in self.rgb])
+        self.assertRaises(ValueError, conversions.rgb2hex_many,
+                          [(255, 256, 0)])
+
+        # Integral floats and NumPy arrays are accepted, fractions are not
+        hexes = [conversions.rgb2hex(px) for px in self.rgb]
+        floats = [tuple(float(x) for x in px) for px in self.rgb]
+        self.assertEqual(conversions.rgb2hex_many(floats), hexes)
+        self.assertEqual(conversions.rgb2hex_many(
+            pixels.PixelBuffer.from_pixels(floats, typecode='d')), hexes)
+        if np is not None:
+            for dtype in (np.uint16, np.int64, np.float64):
+                self.assertEqual(conversions.rgb2hex_many(
+                    np.array(self.rgb, dtype=dtype)), hexes)
+        with self.assertRaisesRegex(ValueError, 'not integers'):
+            conversions.rgb2hex_many([(0.5, 0, 0)])
+
+    def test_many_pixel_buffer(self):
+        """Tests batched conversions of a PixelBuffer."""
+
+        buf = pixels.PixelBuffer.from_pixels(self.rgb)
+        cmyk = conversions.rgb2cmyk_many(buf)
+
+        self.assertEqual((cmyk.width, cmyk.channels), (len(self.rgb), 4))
+        self.assertEqual(list(cmyk),
+                         [conversions.rgb2cmyk(px) for px in self.rgb])
+
+    def test_many_range_check(self):
+        """Tests the invalid values errors for batched conversions."""
+
+        self.assertRaises(ValueError, conversions.rgb2hsv_many,
+                          [(0, 0, 0), (255, 256, 0)])
+        self.assertRaises(ValueError, conversions.hsl2rgb_many,
+                          [(360, 1, 1)])
+        self.assertRaises(ValueError, conversions.cmyk2rgb_many,
+                          [(0, 0, 0, 2)])
+
+
+@unittest.skipIf(np is None, 'NumPy is not installed')
+class TestColorLUT(unittest.TestCase):
+    """Tests the RGB conversion lookup tables."""
+
+    def test_pack_rgb(self):
+        """Tests packing and unpacking 24-bit colors."""
+
+        rgb = [(0, 0, 0), (1, 2, 3), (255, 128, 7)]
+        keys = lut.pack_rgb(rgb)
+
+        self.assertEqual(keys.tolist(), [0, 66051, 16744455])
+        self.assertEqual(lut.unpack_rgb(keys).tolist(), [list(px)
+                                                         for px in rgb])
+        self.assertRaises(ValueError, lut.pack_rgb, [(0, 0, 256)])
+        self.assertRaises(ValueError, lut.pack_rgb, [(0, 0, 0.5)])
+
+        # Alpha channels are ignored, including in mixed lists
+        rgba = [px + (200,) for px in rgb]
+        for im in (rgba, rgba[:1] + rgb[1:], np.array(rgba),
+                   pixels.PixelBuffer.from_pixels(rgba)):
+            self.assertEqual(lut.pack_rgb(im).tolist(), keys.tolist())
+
+        table = lut.PaletteLUT(['#000000', '#ffffff'], 4, cache_dir=False)
+        self.assertEqual(table.lookup(np.array(rgba)).tolist(), [0, 0, 1])
+
+    def test_lazy_lut(self):
+        """Tests that lazy lookup tables match the batched conversions."""
+
+        rand = random.Random(8)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(200)]
+
+        for space, many in (('hsl', conversions.rgb2hsl_many),
+                            ('hsv', conversions.rgb2hsv_many),
+                            ('cmyk', conversions.rgb2cmyk_many)):
+            table = lut.ColorLUT(space, lazy=True)
+            self.assertEqual(table.convert(im).tolist(), many(im).tolist())
+            self.assertEqual(table.convert(im[:10]).tolist(),
+                             many(im[:10]).tolist())
+
+            # Only the blocks of 512 colors that were looked up are stored
+            self.assertLessEqual(len(table._filled), 512 * len(im))
+
+    def test_lut_space_check(self):
+        """Tests the invalid color space error for ColorLUT."""
+
+        self.assertRaises(ValueError, lut.ColorLUT, 'yuv', lazy=True)
+
+    def test_palette_lut(self):
+        """Tests that palette lookups match nearest color queries."""
+
+        rand = random.Random(9)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(2000)]
+        index = color_index.ColorIndex(color_lists.sp_pbt)
+
+        for bits in (4, 5):
+            table = lut.PaletteLUT(color_lists.sp_pbt, bits, cache_dir=False)
+            self.assertEqual(table.nearest_many(im), index.nearest_many(im))
+
+        # Ties go to the color that comes first in the palette
+        table = lut.PaletteLUT([(0, 0, 0), (2, 0, 0), (1, 0, 0)], 3,
+                               cache_dir=False)
+        self.assertEqual(table.lookup([(1, 0, 0), (3, 0, 0)]).tolist(),
+                         [2, 1])
+        self.assertEqual(table.remap([(3, 9, 0)]).tolist(), [[2, 0, 0]])
+
+    def test_palette_lut_cache(self):
+        """Tests writing and loading cached palette lookup tables."""
+
+        colors = ['#000000', '#ff0000', '#00ff00', '#0000ff', '#ffffff']
+        im = pixels.PixelBuffer.from_pixels([(250, 10, 10), (10, 10, 10)])
+        cache_dir = tempfile.mkdtemp()
+
+        try:
+            built = lut.PaletteLUT(colors, cache_dir=cache_dir)
+            loaded = lut.PaletteLUT(colors, cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            self.assertEqual(loaded.lookup(im).tolist(), [1, 0])
+            self.assertEqual(loaded.remap(im).as_array().tolist(),
+                             built.remap(im).as_array().tolist())
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_palette_lut_check(self):
+        """Tests the invalid arguments errors for PaletteLUT."""
+
+        self.assertRaises(ValueError, lut.PaletteLUT, [])
+        self.assertRaises(ValueError, lut.PaletteLUT, color_lists.css3, 0)
+        self.assertRaises(ValueError, lut.PaletteLUT, color_lists.css3, 9)
+
+
+class TestColorStats(unittest.TestCase):
+    """Tests the streaming color statistics accumulator."""
+
+    def test_color_stats(self):
+        """Tests accumulating an image in chunks and merging accumulators."""
+
+        rand = random.Random(10)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(1000)]
+        whole = stats.ColorStats(im)
+
+        chunked = stats.ColorStats()
+        for i in range(0, len(im), 300):
+            chunked.update(px for px in im[i:i + 300])
+        self.assertEqual((len(chunked), chunked.sums),
+                         (len(whole), whole.sums))
+        self.assertEqual(chunked.mean(None), whole.mean(None))
+
+        buf = pixels.PixelBuffer.from_pixels(im)
+        halves = stats.ColorStats(buf[:500]).merge(
+            stats.ColorStats(pixels.PixelBuffer.from_pixels(im[500:])))
+        self.assertEqual(halves.sums, whole.sums)
+        if np is not None:
+            self.assertEqual(stats.ColorStats(np.array(im)).sums, whole.sums)
+
+        self.assertEqual(stats.ColorStats([(0, 1, 2), (1, 2, 4)]).mean(1),
+                         (0.5, 1.5, 3))
+
+    def test_color_stats_check(self):
+        """Tests the empty accumulator error for ColorStats."""
+
+        self.assertRaises(ValueError, stats.ColorStats().mean)
+        self.assertRaises(ValueError, pypalette.average_color, [])
+
+
+class TestColorHistogram(unittest.TestCase):
+    """Tests the streaming color histogram."""
+
+    def test_color_histogram(self):
+        """Tests percentiles and common colors of a color histogram."""
+
+        im = [(0, 10, 200), (4, 10, 100), (4, 30, 100), (9, 10, 0)]
+        hist = stats.ColorHistogram(im)
+
+        self.assertEqual(hist.median(None), (4, 10, 100))
+        self.assertEqual(hist.percentile(0), (0, 10, 0))
+        self.assertEqual(hist.percentile(100), (9, 30, 200))
+        self.assertEqual(hist.percentile(25, 2), (3, 10, 75))
+        self.assertEqual(hist.mode(), (0, 10, 200))
+        self.assertEqual(hist.most_common(2), [((0, 10, 200), 1),
+                                               ((4, 10, 100), 1)])
+
+    def test_color_histogram_merge(self):
+        """Tests that merged histograms match a histogram of the whole."""
+
+        rand = random.Random(11)
+        im = [(rand.randrange(256), rand.randrange(8), rand.randrange(2))
+              for _ in range(1001)]
+        whole = stats.ColorHistogram(im)
+
+        tiles = stats.ColorHistogram(iter(im[:400]))
+        tiles.merge(stats.ColorHistogram(
+            pixels.PixelBuffer.from_pixels(im[400:])))
+        self.assertEqual(len(tiles), len(im))
+        self.assertEqual(tiles.hists, whole.hists)
+        self.assertEqual(tiles.counts, whole.counts)
+        if np is not None:
+            self.assertEqual(stats.ColorHistogram(np.array(im)).counts,
+                             whole.counts)
+
+        self.assertEqual(whole.median(), tuple(
+            statistics.median(px[x] for px in im) for x in range(0, 3)))
+
+    def test_color_histogram_check(self):
+        """Tests the invalid arguments errors for ColorHistogram."""
+
+        self.assertRaises(ValueError, stats.ColorHistogram, [(0, 0, 256)])
+        self.assertRaises(ValueError, stats.ColorHistogram, [(0, 0.5, 0)])
+        self.assertRaises(ValueError, stats.ColorHistogram().median)
+        self.assertRaises(ValueError, stats.ColorHistogram(
+            [(0, 0, 0)]).percentile, 101)
+
+
+class TestDither(unittest.TestCase):
+    """Tests the streaming palette remapping functions."""
+
+    colors = ['#000000', '#ffffff', '#ff0000', '#0000ff']
+
+    def test_remap(self):
+        """Tests that remapping without dithering picks the nearest colors."""
+
+        rand = random.Random(10)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(300)]
+        index = color_index.ColorIndex(self.colors)
+        nearest = [conversions.hex2rgb(self.colors[i])
+                   for i in index.nearest_many(im)]
+
+        self.assertEqual(dither.remap(im, self.colors, 'none', 20), nearest)
+
+    def test_dither(self):
+        """Tests that dithering keeps the average color of an image."""
+
+        gray = [(96, 96, 96)] * 32
+
+        for method in ('floyd-steinberg', 'atkinson', 'sierra',
+                       'sierra-lite'):
+            rows = dither.dither_rows((row for row in [gray] * 32),
+                                      self.colors[:2], method, indices=True)
+            out = [i for row in rows for i in row]
+
+            self.assertEqual(set(out), {0, 1})
+
+            # Atkinson spreads only 3/4 of the error, losing some contrast
+            if method != 'atkinson':
+                self.assertAlmostEqual(255 * sum(out) / len(out), 96,
+                                       delta=4)
+
+    def test_dither_inputs(self):
+        """Tests dithering PixelBuffers and serpentine scanning."""
+
+        rand = random.Random(11)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(12 * 8)]
+        buf = pixels.PixelBuffer.from_pixels(im, width=12)
+
+        for serpentine in (False, True):
+            out = dither.remap(im, self.colors, 'sierra', 12, serpentine)
+            self.assertEqual(dither.remap(buf, self.colors, 'sierra',
+                                          serpentine=serpentine).tolist(),
+                             out)
+            self.assertTrue(set(out) <= set(conversions.hex2rgb_many(
+                self.colors)))
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_dither_tables(self):
+        """Tests that palette lookup tables give the same dithered colors."""
+
+        rand = random.Random(12)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(16 * 16)]
+        out = dither.remap(im, self.colors, width=16)
+
+        table = lut.PaletteLUT(self.colors, 5, cache_dir=False)
+        self.assertEqual(dither.remap(im, table, width=16), out)
+
+        # Switching from searches to a table partway through the image
+        build_after = dither._BUILD_AFTER
+        dither._BUILD_AFTER = 20
+        try:
+            dither._TABLES.clear()
+            self.assertEqual(dither.remap(im, self.colors, width=16), out)
+            self.assertEqual(len(dither._TABLES), 1)
+        finally:
+            dither._BUILD_AFTER = build_after
+            dither._TABLES.clear()
+
+    def test_dither_check(self):
+        """Tests the invalid arguments errors for the remapping functions."""
+
+        self.assertRaises(ValueError, dither.remap, [], self.colors)
+        self.assertRaises(ValueError, dither.remap, [(0, 0, 0)], [])
+        self.assertRaises(ValueError, dither.remap, [(0, 0, 0)], self.colors,
+                          'bayer')
+        self.assertRaises(ValueError, dither.remap, [(0, 0, 0)] * 3,
+                          self.colors, width=2)
+        self.assertRaises(ValueError, list, dither.dither_rows(
+            [[(0, 0, 0)] * 2, [(0, 0, 0)]], self.colors))
+
+
+class TestMetrics(unittest.TestCase):
+    """Tests color distance metrics."""
+
+    # Pairs of Lab colors and their CIEDE2000 color differences from Sharma,
+    # Wu and Dalal's test data
+    ciede2000_pairs = [((50, 2.6772, -79.7751), (50, 0, -82.7485), 2.0425),
+                       ((50, 0, 0), (50, -1, 2), 2.3669),
+                       ((50, 2.49, -0.001), (50, -2.49, 0.0009), 7.1792),
+                       ((50, 2.5, 0), (73, 25, -18), 27.1492),
+                       ((60.2574, -34.0099, 36.2677),
+                        (60.4626, -34.1751, 39.4387), 1.2644)]
+
+    def test_ciede2000(self):
+        """Tests the CIEDE2000 color difference."""
+
+        for lab1, lab2, delta_e in self.ciede2000_pairs:
+            self.assertAlmostEqual(metrics.ciede2000(lab1, lab2), delta_e, 4)
+            self.assertAlmostEqual(metrics.ciede2000(lab2, lab1), delta_e, 4)
+
+    def test_cie76_cie94(self):
+        """Tests the CIE76 and CIE94 color differences."""
+
+        self.assertEqual(metrics.cie76((50, 0, 0), (50, 3, 4)), 5)
+        self.assertAlmostEqual(metrics.cie94((50, 2.5, 0), (73, 25, -18)),
+                               34.6892, 4)
+        self.assertEqual(metrics.cie94((50, 0, 0), (60, 0, 0)), 10)
+
+    def test_redmean(self):
+        """Tests the redmean weighted RGB distance."""
+
+        self.assertEqual(metrics.redmean((0, 0, 0), (0, 0, 0)), 0)
+        self.assertEqual(metrics.sq_redmean((0, 0, 0), (0, 10, 0)), 400)
+        self.assertAlmostEqual(metrics.redmean((0, 0, 0), (255, 255, 255)),
+                               764.834, 3)
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_metric_arrays(self):
+        """Tests that the NumPy metrics match the scalar ones."""
+
+        rand = random.Random(1)
+        rgb = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+               for _ in range(200)]
+        lab = [tuple(px) for px in conversions.rgb2lab_many(rgb, prec=None)]
+
+        for one, many, pts in ((metrics.sq_redmean, metrics.sq_redmean_array,
+                                rgb),
+                               (metrics.sq_cie94, metrics.sq_cie94_array, lab),
+                               (metrics.sq_ciede2000,
+                                metrics.sq_ciede2000_array, lab)):
+            for c in pts[:5]:
+                for d1, d2 in zip(many(np.array(pts), c),
+                                  [one(c, pt) for pt in pts]):
+                    self.assertAlmostEqual(d1, d2, 6)
+
 
 class TestKMeans(unittest.TestCase):
     """Tests the k-means clustering class."""
@@ -229,6 +848,538 @@ class TestKMeans(unittest.TestCase):
         # centroids being randomly picked.
         self.assertEqual(sorted(im), sorted(im_colors))
 
+    def test_kmeans_backend_check(self):
+        """Tests the invalid backend error for the KMeans class."""
+
+        self.assertRaises(ValueError, kmeans.KMeans, [(0, 0, 0)], 2,
+                          backend='fortran')
+
+    def test_kmeans_algorithm_check(self):
+        """Tests the invalid algorithm error for the KMeans class."""
+
+        self.assertRaises(ValueError, kmeans.KMeans, [(0, 0, 0)], 2,
+                          algorithm='macqueen')
+
+    def test_kmeans_algorithms_match(self):
+        """Tests that Elkan and Hamerly give the same colors as Lloyd."""
+
+        rand = random.Random(2)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(500)]
+
+        for backend in ('python', 'numpy') if np else ('python',):
+            lloyd = kmeans.KMeans(im, 6, backend=backend, seed=7).get_colors()
+            for algorithm in ('elkan', 'hamerly'):
+                im_kmeans = kmeans.KMeans(im, 6, backend=backend,
+                                          algorithm=algorithm, seed=7)
+                self.assertEqual(lloyd, im_kmeans.get_colors())
+
+    def test_kmeans_init_check(self):
+        """Tests the invalid initialization error for the KMeans class."""
+
+        self.assertRaises(ValueError, kmeans.KMeans, [(0, 0, 0)], 2,
+                          init='forgy')
+
+    def test_kmeans_parallel_init(self):
+        """Tests k-means|| initialization for the KMeans class."""
+
+        im = [(0, 1, 1), (2, 3, 5), (8, 13, 21), (34, 55, 89)] * 10
+        for backend in ('python', 'numpy') if np else ('python',):
+            im_kmeans = kmeans.KMeans(im, 4, backend=backend, init='k-means||')
+            self.assertEqual(sorted(set(im)), sorted(im_kmeans.get_colors()))
+
+    def test_kmeans_wu_init(self):
+        """Tests Wu initialization for the KMeans class."""
+
+        im = [(0, 1, 1), (2, 3, 5), (80, 13, 21), (34, 155, 89)] * 10
+        for backend in ('python', 'numpy') if np else ('python',):
+            for space in ('rgb', 'lab'):
+                im_kmeans = kmeans.KMeans(im, 3, backend=backend, init='wu',
+                                          space=space)
+                self.assertEqual(sorted(im_kmeans.get_colors()),
+                                 [(1, 2, 3), (34, 155, 89), (80, 13, 21)])
+                self.assertEqual(im_kmeans.stats.n_iter, 1)
+
+            # Wu's quantizer is given the image rounded to 8-bit values
+            im_float = [tuple(x + 0.3 for x in px) for px in im]
+            im_kmeans = kmeans.KMeans(im_float, 3, backend=backend,
+                                      init='wu')
+            self.assertEqual(sorted(im_kmeans.get_colors()),
+                             [(1, 2, 3), (34, 155, 89), (80, 13, 21)])
+
+    def test_kmeans_palette(self):
+        """Tests getting a weighted Palette from the KMeans class."""
+
+        im = [(0, 1, 1)] * 5 + [(2, 3, 5), (80, 13, 21)] * 2 + [(34, 155, 89)]
+        for backend in ('python', 'numpy') if np else ('python',):
+            for histogram in (False, True):
+                pal = kmeans.KMeans(im, 3, backend=backend, seed=1,
+                                    histogram=histogram).get_palette()
+                self.assertEqual(pal.top(3).colors, [(1, 2, 2), (80, 13, 21),
+                                                     (34, 155, 89)])
+                self.assertEqual(pal.top(3).percentages(), [70, 20, 10])
+
+        # The palette reuses the last clustering rather than running again
+        rand = random.Random(3)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(400)]
+        for backend in ('python', 'numpy') if np else ('python',):
+            for n_init in (1, 3):
+                im_kmeans = kmeans.KMeans(im, 5, backend=backend, seed=5,
+                                          n_init=n_init)
+                colors = im_kmeans.get_colors()
+                pal = im_kmeans.get_palette()
+                self.assertEqual(pal.colors, colors)
+                self.assertAlmostEqual(sum(pal.weights), 1, places=5)
+
+    def test_kmeans_pp(self):
+        """Tests the kmeans_pp seeding function."""
+
+        pts = [(0, 0, 0), (0, 0, 0), (255, 255, 255), (0, 0, 0)]
+
+        self.assertEqual(kmeans.kmeans_pp(pts, 2, first=0), [0, 2])
+        self.assertEqual(kmeans.kmeans_pp(pts, 2, w=[1, 0, 1, 0], first=2),
+                         [2, 0])
+
+    def test_kmeans_seed(self):
+        """Tests that seeded KMeans runs are reproducible."""
+
+        rand = random.Random(3)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(300)]
+
+        colors = kmeans.KMeans(im, 5, seed=11).get_colors()
+        self.assertEqual(colors, kmeans.KMeans(im, 5, seed=11).get_colors())
+        self.assertEqual(colors, kmeans.KMeans(
+            im, 5, seed=random.Random(11)).get_colors())
+
+    def test_kmeans_n_init(self):
+        """Tests that KMeans restarts keep the lowest inertia run."""
+
+        rand = random.Random(4)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(300)]
+
+        single = kmeans.KMeans(im, 5, seed=5)
+        single.get_colors()
+        multi = kmeans.KMeans(im, 5, seed=5, n_init=4)
+        multi_colors = multi.get_colors()
+        parallel = kmeans.KMeans(im, 5, seed=5, n_init=4, n_jobs=2)
+
+        self.assertLessEqual(multi.inertia, single.inertia)
+        self.assertEqual(multi_colors, parallel.get_colors())
+        self.assertEqual(multi.inertia, parallel.inertia)
+
+    def test_kmeans_stats(self):
+        """Tests the run statistics of the KMeans class."""
+
+        im = [(0, 1, 1), (2, 3, 5), (8, 13, 21), (34, 55, 89)]
+        im_kmeans = kmeans.KMeans(im, 4)
+        im_kmeans.get_colors()
+
+        self.assertTrue(im_kmeans.stats.converged)
+        self.assertEqual(im_kmeans.stats.inertia, 0)
+        self.assertEqual(sorted(im_kmeans.stats.times),
+                         ['assign', 'inertia', 'init', 'update'])
+
+        rand = random.Random(6)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(300)]
+        im_kmeans = kmeans.KMeans(im, 5, seed=1, max_iter=2, tol=0)
+        im_kmeans.get_colors()
+
+        self.assertEqual(im_kmeans.stats.n_iter, 2)
+        self.assertFalse(im_kmeans.stats.converged)
+        self.assertRaises(ValueError, kmeans.KMeans, im, 5, max_iter=0)
+
+    def test_kmeans_empty_clusters(self):
+        """Tests that KMeans re-seeds empty clusters on flat images."""
+
+        im = [(10, 10, 10)] * 50 + [(200, 0, 0)] * 3
+        for backend in ('python', 'numpy') if np else ('python',):
+            im_kmeans = kmeans.KMeans(im, 4, backend=backend, seed=1)
+            colors = im_kmeans.get_colors()
+
+            self.assertEqual(set(colors), {(10, 10, 10), (200, 0, 0)})
+            self.assertTrue(all(isinstance(x, float)
+                                for color in colors for x in color))
+            self.assertGreater(im_kmeans.stats.n_empty, 0)
+            self.assertTrue(im_kmeans.stats.converged)
+
+    def test_kmeans_histogram(self):
+        """Tests clustering over the color histogram for the KMeans class."""
+
+        im = [(0, 1, 1), (2, 3, 5), (8, 13, 21), (34, 55, 89)] * 3
+        for backend in ('python', 'numpy') if np else ('python',):
+            im_kmeans = kmeans.KMeans(im, 4, backend=backend, histogram=True)
+            self.assertEqual(sorted(set(im)), sorted(im_kmeans.get_colors()))
+
+    def test_color_histogram(self):
+        """Tests the color_histogram function."""
+
+        im = [(8, 13, 21), (0, 1, 1), (8, 13, 21), (2, 3, 5)]
+
+        self.assertEqual(kmeans.color_histogram(im),
+                         ([(0, 1, 1), (2, 3, 5), (8, 13, 21)], [1, 1, 2]))
+        self.assertEqual(kmeans.color_histogram(im, bits=5),
+                         ([(1, 2, 3), (8, 13, 21)], [2, 2]))
+        self.assertRaises(ValueError, kmeans.color_histogram, im, bits=0)
+
+    def test_kmeans_space(self):
+        """Tests clustering in perceptual color spaces."""
+
+        rand = random.Random(1)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(500)]
+
+        for space in ('linear', 'xyz', 'lab', 'oklab'):
+            colors = [kmeans.KMeans(im, 5, backend=backend, seed=42,
+                                    space=space).get_colors()
+                      for backend in (('python', 'numpy') if np
+                                      else ('python',))]
+
+            self.assertEqual(len(colors[0]), 5)
+            self.assertTrue(all(0 <= x <= 255
+                                for c in colors[0] for x in c))
+            self.assertEqual(colors[0], colors[-1])
+
+        # Two clearly separated groups of colors are found in any space
+        im = [(250, 10, 10)] * 50 + [(10, 10, 250)] * 50
+        self.assertEqual(sorted(kmeans.KMeans(im, 2, seed=1,
+                                              space='oklab').get_colors()),
+                         [(10, 10, 250), (250, 10, 10)])
+
+    def test_kmeans_metric(self):
+        """Tests clustering with other distance metrics."""
+
+        rand = random.Random(1)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(300)]
+
+        for metric in ('redmean', 'cie76', 'cie94', 'ciede2000',
+                       metrics.sq_redmean):
+            colors = [kmeans.KMeans(im, 4, backend=backend, seed=42,
+                                    metric=metric).get_colors()
+                      for backend in (('python', 'numpy') if np
+                                      else ('python',))]
+
+            self.assertEqual(len(colors[0]), 4)
+            self.assertEqual(colors[0], colors[-1])
+
+        self.assertEqual(kmeans.KMeans(im, 4, metric='cie94').space, 'lab')
+        self.assertEqual(kmeans.KMeans(im, 4, seed=42,
+                                       metric=metrics.sq_redmean).get_colors(),
+                         kmeans.KMeans(im, 4, seed=42,
+                                       metric='redmean').get_colors())
+
+        # Lambdas cannot be pickled, so their restarts are run serially
+        self.assertEqual(kmeans.KMeans(im, 4, seed=42, n_init=2, n_jobs=2,
+                                       metric=lambda cc, pt: metrics
+                                       .sq_redmean(cc, pt)).get_colors(),
+                         kmeans.KMeans(im, 4, seed=42, n_init=2,
+                                       metric='redmean').get_colors())
+
+    def test_kmeans_metric_check(self):
+        """Tests the invalid metric errors for KMeans."""
+
+        self.assertRaises(ValueError, kmeans.KMeans, [(0, 0, 0)], 2,
+                          metric='manhattan')
+        self.assertRaises(ValueError, kmeans.KMeans, [(0, 0, 0)], 2,
+                          metric='ciede2000', space='rgb')
+        self.assertRaises(ValueError, kmeans.KMeans, [(0, 0, 0)], 2,
+                          metric='redmean', algorithm='elkan')
+
+    def test_kmeans_space_check(self):
+        """Tests the invalid color space error for KMeans."""
+
+        self.assertRaises(ValueError, kmeans.KMeans, [(0, 0, 0)], 2,
+                          space='lch')
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_kmeans_backends_match(self):
+        """Tests that the NumPy and Python backends give the same colors."""
+
+        rand = random.Random(1)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(500)]
+
+        py_colors = kmeans.KMeans(im, 5, backend='python',
+                                  seed=42).get_colors()
+        np_colors = kmeans.KMeans(im, 5, backend='numpy', seed=42).get_colors()
+
+        self.assertEqual(py_colors, np_colors)
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_kmeans_parallel_backends_match(self):
+        """Tests that both backends give the same colors with k-means||."""
+
+        rand = random.Random(2)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(300)]
+
+        for metric, space in (('sqeuclidean', 'rgb'), ('sqeuclidean', 'lab'),
+                              ('redmean', None), ('ciede2000', None)):
+            colors = [kmeans.KMeans(im, 5, backend=backend,
+                                    init='k-means||', seed=7, metric=metric,
+                                    space=space).get_colors()
+                      for backend in ('python', 'numpy')]
+            self.assertEqual(colors[0], colors[1])
+
+
+class TestMiniBatchKMeans(unittest.TestCase):
+    """Tests the mini-batch k-means clustering class."""
+
+    def test_minibatch_kmeans_check(self):
+        """Tests the invalid arguments errors for the MiniBatchKMeans class."""
+
+        self.assertRaises(ValueError, kmeans.MiniBatchKMeans, [], 3)
+        self.assertRaises(ValueError, kmeans.MiniBatchKMeans, [(0, 0, 0)], 1)
+        self.assertRaises(ValueError, kmeans.MiniBatchKMeans, [(0, 0, 0)], 2,
+                          batch_size=0)
+
+    def test_minibatch_kmeans_get_colors(self):
+        """Tests the get_colors method from the MiniBatchKMeans class."""
+
+        im = [(0, 1, 1), (2, 3, 5), (8, 13, 21), (34, 55, 89)] * 50
+        for backend in ('python', 'numpy') if np else ('python',):
+            im_kmeans = kmeans.MiniBatchKMeans(im, 4, batch_size=32,
+                                               max_iter=20, backend=backend)
+            self.assertEqual(sorted(set(im)), sorted(im_kmeans.get_colors()))
+            self.assertLessEqual(im_kmeans.n_iter, 20)
+
+
+class TestMedianCut(unittest.TestCase):
+    """Tests the median cut quantizer."""
+
+    def test_median_cut(self):
+        """Tests median cut colors on an image of clear clusters."""
+
+        im = [(0, 1, 1), (2, 3, 5), (8, 13, 21), (34, 55, 89),
+              (144, 233, 121), (98, 219, 61)] * 3 + [(0, 1, 1)]
+
+        for backend in ('python', 'numpy') if np else ('python',):
+            cut = quantize.MedianCut(im, 3, bits=8, backend=backend)
+            # The green median of 19 pixels splits off the 10 darkest, and
+            # the rest are split again along green
+            self.assertEqual(cut.get_colors(), [(3, 5, 8), (66, 137, 75),
+                                                (144, 233, 121)])
+            self.assertEqual(cut.get_colors(1)[0], (3, 5.2, 8.2))
+            self.assertEqual(len(quantize.MedianCut(im, 10, bits=8,
+                                                    backend=backend)
+                                 .get_colors()), 6)
+
+    def test_median_cut_deterministic(self):
+        """Tests that both backends give the same colors every time."""
+
+        rand = random.Random(12)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(2000)]
+        colors = quantize.MedianCut(im, 8).get_colors(None)
+
+        self.assertEqual(len(colors), 8)
+        for backend in ('python', 'numpy') if np else ('python',):
+            buf = pixels.PixelBuffer.from_pixels(im)
+            self.assertEqual(quantize.MedianCut(buf, 8, backend=backend)
+                             .get_colors(None), colors)
+
+    def test_median_cut_check(self):
+        """Tests the invalid arguments errors for MedianCut."""
+
+        self.assertRaises(ValueError, quantize.MedianCut, [], 2)
+        self.assertRaises(ValueError, quantize.MedianCut, [(0, 0, 0)], 1)
+        self.assertRaises(ValueError, quantize.MedianCut, [(0, 0, 0)], 2, 9)
+        self.assertRaises(ValueError, quantize.MedianCut, [(0, 0, 0)], 2,
+                          backend='fortran')
+        self.assertRaises(ValueError, quantize.MedianCut, [(0, 0, 256)], 2)
+
+
+class TestWuQuantizer(unittest.TestCase):
+    """Tests Wu's quantizer."""
+
+    def test_wu(self):
+        """Tests Wu's quantizer colors on an image of clear clusters."""
+
+        im = [(0, 1, 1), (2, 3, 5), (8, 13, 21), (34, 55, 89),
+              (144, 233, 121), (98, 219, 61)] * 3 + [(0, 1, 1)]
+
+        for backend in ('python', 'numpy') if np else ('python',):
+            wu = quantize.WuQuantizer(im, 3, backend=backend)
+            self.assertEqual(wu.get_colors(), [(3, 5, 8), (121, 226, 91),
+                                               (34, 55, 89)])
+
+            # (0, 1, 1) and (2, 3, 5) fall into the same bin
+            self.assertEqual(len(quantize.WuQuantizer(im, 6, backend=backend)
+                                 .get_colors()), 5)
+
+    def test_wu_deterministic(self):
+        """Tests that both backends give the same colors every time."""
+
+        rand = random.Random(14)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(2000)]
+        colors = quantize.WuQuantizer(im, 8).get_colors(2)
+
+        self.assertEqual(len(colors), 8)
+        for backend in ('python', 'numpy') if np else ('python',):
+            buf = pixels.PixelBuffer.from_pixels(im)
+            self.assertEqual(quantize.WuQuantizer(buf, 8, backend=backend)
+                             .get_colors(2), colors)
+
+    def test_wu_check(self):
+        """Tests the invalid arguments errors for WuQuantizer."""
+
+        self.assertRaises(ValueError, quantize.WuQuantizer, [], 2)
+        self.assertRaises(ValueError, quantize.WuQuantizer, [(0, 0, 0)], 1)
+        self.assertRaises(ValueError, quantize.WuQuantizer, [(0, 0, 0)], 2,
+                          backend='fortran')
+
+
+class TestOctreeQuantizer(unittest.TestCase):
+    """Tests the octree quantizer."""
+
+    def test_octree(self):
+        """Tests octree colors and pixel fractions."""
+
+        im = ([(250, 10, 10)] * 5 + [(255, 0, 0)] * 3 + [(0, 0, 250)] * 2 +
+              [(10, 250, 10)] * 6)
+        octree = quantize.OctreeQuantizer(iter(im), 3)
+
+        self.assertEqual(len(octree), 16)
+        # The two reds are merged into one color
+        self.assertEqual(octree.get_colors(fractions=True),
+                         [((252, 6, 6), 0.5), ((10, 250, 10), 0.375),
+                          ((0, 0, 250), 0.125)])
+        self.assertEqual(quantize.OctreeQuantizer(im, 4).get_colors(),
+                         [(10, 250, 10), (250, 10, 10), (255, 0, 0),
+                          (0, 0, 250)])
+
+    def test_octree_bounded(self):
+        """Tests that octrees stay bounded and merge like a single tree."""
+
+        rand = random.Random(13)
+        im = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(3000)]
+        whole = quantize.OctreeQuantizer(im, 6, max_leaves=64)
+        self.assertLessEqual(len(whole._leaves), 64)
+
+        tiles = quantize.OctreeQuantizer(im[:1500], 6, max_leaves=64)
+        tiles.merge(quantize.OctreeQuantizer(
+            pixels.PixelBuffer.from_pixels(im[1500:]), 6, max_leaves=64))
+        self.assertEqual(len(tiles), len(im))
+        self.assertLessEqual(len(tiles._leaves), 64)
+
+        colors = tiles.get_colors(fractions=True)
+        self.assertLessEqual(len(colors), 6)
+        self.assertAlmostEqual(sum(f for _, f in colors), 1)
+
+    def test_octree_check(self):
+        """Tests the invalid arguments errors for OctreeQuantizer."""
+
+        self.assertRaises(ValueError, quantize.OctreeQuantizer, None, 1)
+        self.assertRaises(ValueError, quantize.OctreeQuantizer, None, 8,
+                          max_leaves=4)
+        self.assertRaises(ValueError, quantize.OctreeQuantizer(
+            None, 2).get_colors)
+
+
+class TestPalette(unittest.TestCase):
+    """Tests the Palette class."""
+
+    def test_palette(self):
+        """Tests looking up colors and weights in a Palette."""
+
+        pal = palette.Palette(color_lists.css3)
+
+        self.assertEqual(len(pal), len(color_lists.css3))
+        self.assertEqual(pal['red'], (255, 0, 0))
+        self.assertEqual(pal[-1], conversions.hex2rgb(color_lists.css3[
+            'yellowgreen']))
+        self.assertEqual(pal.hex()[:2], ['#f0f8ff', '#faebd7'])
+        self.assertAlmostEqual(pal.weight('red'), 1 / len(pal))
+        self.assertIn('red', pal)
+        self.assertRaises(KeyError, pal.weight, 'octarine')
+        self.assertRaises(IndexError, pal.__getitem__, len(pal))
+
+        pal = palette.Palette([(255, 0, 0), (0, 0, 255)], [3, 1])
+        self.assertEqual(pal.percentages(), [75, 25])
+        self.assertEqual([tuple(hsl) for hsl in pal.convert('hsl')],
+                         [(0, 1, 0.5), (240, 1, 0.5)])
+        self.assertEqual(pal.convert('hex'), ['#ff0000', '#0000ff'])
+
+    def test_palette_operations(self):
+        """Tests sorting, taking the top colors of and merging Palettes."""
+
+        pal = palette.Palette([(0, 0, 255), (255, 0, 0), (0, 128, 0)],
+                              [0.2, 0.5, 0.3], ['blue', 'red', 'green'])
+
+        self.assertEqual(pal.sort().names, ['red', 'green', 'blue'])
+        self.assertEqual(pal.sort('hue').names, ['red', 'green', 'blue'])
+        self.assertEqual(pal.sort('name').names, ['blue', 'green', 'red'])
+        self.assertEqual(pal.top(2).colors, [(255, 0, 0), (0, 128, 0)])
+
+        merged = pal.merge(palette.Palette([(255, 0, 0), (9, 9, 9)],
+                                           [0.5, 1], ['scarlet', 'black']))
+        self.assertEqual(merged.names, ['blue', 'red', 'green', 'black'])
+        self.assertEqual(merged.percentages(), [8, 40, 12, 40])
+
+    def test_palette_check(self):
+        """Tests the invalid arguments errors for Palette."""
+
+        self.assertRaises(ValueError, palette.Palette, [(0, 0, 256)])
+        self.assertRaises(ValueError, palette.Palette, [(0, 0, 0)], [1, 2])
+        self.assertRaises(ValueError, palette.Palette, [(0, 0, 0)] * 2,
+                          names=['black', 'black'])
+        pal = palette.Palette([(0, 0, 0)])
+        self.assertRaises(ValueError, pal.sort, 'name')
+        self.assertRaises(ValueError, pal.convert, 'yuv')
+
+
+class TestPixelBuffer(unittest.TestCase):
+    """Tests the compact pixel buffer class."""
+
+    def test_pixel_buffer(self):
+        """Tests indexing and iterating over a PixelBuffer."""
+
+        im = [(0, 1, 1), (2, 3, 5), (8, 13, 21), (34, 55, 89)]
+        buf = pixels.PixelBuffer.from_pixels(im, width=2)
+
+        self.assertEqual((buf.width, buf.height, buf.channels), (2, 2, 3))
+        self.assertEqual(len(buf), 4)
+        self.assertEqual(buf[1], (2, 3, 5))
+        self.assertEqual(buf[-1], (34, 55, 89))
+        self.assertEqual(list(buf), im)
+        self.assertEqual(list(buf.channel(2)), [1, 5, 21, 89])
+
+    def test_pixel_buffer_no_copy(self):
+        """Tests that a PixelBuffer shares memory with its buffer."""
+
+        data = bytearray([0, 1, 1, 2, 3, 5])
+        buf = pixels.PixelBuffer(data)
+        data[0] = 255
+
+        self.assertEqual(buf[0], (255, 1, 1))
+
+    def test_pixel_buffer_check(self):
+        """Tests the invalid dimensions errors for PixelBuffer."""
+
+        self.assertRaises(ValueError, pixels.PixelBuffer, bytes(6), 3)
+        self.assertRaises(ValueError, pixels.PixelBuffer, bytes(5))
+        self.assertRaises(ValueError, pixels.PixelBuffer, bytes(6),
+                          channels=2)
+
+    def test_pixel_buffer_functions(self):
+        """Tests passing a PixelBuffer to functions that take images."""
+
+        im = [(0, 1, 1), (2, 3, 5), (8, 13, 21), (34, 55, 89)]
+        buf = pixels.PixelBuffer.from_pixels(im)
+
+        self.assertEqual(pypalette.average_color(buf), (11, 18, 29))
+        self.assertEqual(list(pypalette.grayscale(buf)),
+                         pypalette.grayscale(im))
+        for backend in ('python', 'numpy') if np else ('python',):
+            im_kmeans = kmeans.KMeans(buf, 4, backend=backend)
+            self.assertEqual(sorted(im), sorted(im_kmeans.get_colors()))
+
 
 class TestPyPalette(unittest.TestCase):
     """Tests main PyPalette functions."""
@@ -240,6 +1391,48 @@ class TestPyPalette(unittest.TestCase):
         im = [(0, 1, 1), (2, 3, 5), (8, 13, 21), (34, 55, 89)]
 
         self.assertEqual(pypalette.average_color(im), (11, 18, 29))
+        self.assertEqual(pypalette.average_color(px for px in im),
+                         (11, 18, 29))
+
+    def test_median_color(self):
+        """Tests the median_color and percentile_color functions."""
+
+        im = [(0, 1, 1), (2, 3, 5), (8, 13, 21), (34, 55, 89), (144, 233, 0)]
+
+        self.assertEqual(pypalette.median_color(im), (8, 13, 5))
+        self.assertEqual(pypalette.median_color(im[:4], 1), (5, 8, 13))
+        self.assertEqual(pypalette.percentile_color(im, 75), (34, 55, 21))
+        self.assertRaises(ValueError, pypalette.median_color, [])
+
+    def test_mode_color(self):
+        """Tests the mode_color and dominant_colors functions."""
+
+        im = [(9, 9, 9), (1, 2, 3), (9, 9, 9), (0, 0, 0), (1, 2, 3)]
+
+        self.assertEqual(pypalette.mode_color(im), (1, 2, 3))
+        self.assertEqual(pypalette.dominant_colors(im, 2),
+                         [((1, 2, 3), 2), ((9, 9, 9), 2)])
+        self.assertRaises(ValueError, pypalette.mode_color, [])
+        self.assertRaises(ValueError, pypalette.dominant_colors, im, 0)
+
+    def test_extract_palettes(self):
+        """Tests the extract_palettes function."""
+
+        ims = [[(0, 1, 1), (2, 3, 5), (8, 13, 21)],
+               [(34, 55, 89), (144, 233, 121), (98, 219, 61)],
+               [(24, 1, 25), (26, 51, 77), (128, 205, 77)]]
+
+        for workers in (1, 2):
+            palettes = pypalette.extract_palettes(ims, 3, workers=workers)
+            self.assertEqual([sorted(im) for im in ims],
+                             [sorted(palette) for palette in palettes])
+
+        # Workers run their KMeans restarts serially
+        self.assertEqual(pypalette.extract_palettes(ims, 3, workers=2,
+                                                    n_init=2, n_jobs=2,
+                                                    seed=1),
+                         pypalette.extract_palettes(ims, 3, workers=1,
+                                                    n_init=2, seed=1))
 
     def test_grayscale(self):
         """Tests the grayscale function."""
@@ -254,6 +1447,30 @@ class TestPyPalette(unittest.TestCase):
                           (109, 109, 109)])
         self.assertEqual(pypalette.grayscale(im), [(215, 215, 215),
                          (85, 85, 85), (162, 162, 162), (72, 72, 72)])
+        self.assertEqual(pypalette.grayscale(im, mode='rec601'),
+                         [(214, 214, 214), (81, 81, 81), (143, 143, 143),
+                          (94, 94, 94)])
+        self.assertEqual(pypalette.grayscale(im, 'rec709',
+                                             single_channel=True),
+                         [215, 85, 161, 72])
+
+    def test_grayscale_buffers(self):
+        """Tests single-channel and in-place grayscale on PixelBuffers."""
+
+        im = [(220, 215, 195, 255), (67, 93, 60, 0), (63, 202, 46, 9),
+              (255, 20, 52, 127)]
+        buf = pixels.PixelBuffer.from_pixels(im, width=2)
+        grays = pypalette.grayscale(buf, single_channel=True)
+
+        self.assertEqual((grays.width, grays.height, grays.channels),
+                         (2, 2, 1))
+        self.assertEqual(list(grays.data), [215, 85, 162, 72])
+
+        out = pypalette.grayscale(buf, 'lightness', in_place=True)
+        self.assertIs(out, buf)
+        self.assertEqual(list(buf), [(208, 208, 208, 255), (76, 76, 76, 0),
+                                     (124, 124, 124, 9),
+                                     (138, 138, 138, 127)])
 
     def test_grayscale_im_check(self):
         """Tests the empty image error for grayscale."""
@@ -265,6 +1482,8 @@ class TestPyPalette(unittest.TestCase):
 
         self.assertRaises(ValueError, pypalette.grayscale, [(34, 77, 104)],
                           mode='beast')
+        self.assertRaises(ValueError, pypalette.grayscale, [(34, 77, 104)],
+                          in_place=True)
 
 
 if __name__ == '__main__':